@@ -0,0 +1,9 @@
+#Production server: gunicorn -c gunicorn_config.py "stream_app:create_app()"
+
+#Event streams (/stream/<channel>/events) and live streams (/live/<channel>.ts) are long-lived requests.
+#The gevent worker monkey-patches the standard library when it boots, so each open stream is a greenlet
+#instead of an OS thread. Leave preload_app off, the app has to be imported after the patching.
+bind = "0.0.0.0:5001"
+worker_class = "gevent"
+worker_connections = 1000
+workers = 2
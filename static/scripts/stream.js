@@ -25,29 +25,83 @@
     fadeDelay: null
   });
 
-  let fetch_link = "/stream/nrk1"
-  function setChannelNRK1(){
-    fetch_link = "/stream/nrk1"
-    updateProgram();
-  }
-
-  function setChannelNRK2(){
-    fetch_link = "/stream/nrk2"
-    updateProgram();
+  //The channel buttons come from the channel registry, the first one is tuned in on load
+  const channelButtons = document.querySelectorAll('.channelSelector button[data-channel]');
+  let fetch_link = "/stream/" + (channelButtons.length ? channelButtons[0].dataset.channel : "nrk1")
+  function setChannel(channel){
+    fetch_link = "/stream/" + channel
+    connect();
   }
 
-  function setChannelCable(){
-    fetch_link = "/stream/cable"
-    updateProgram();
-  }
+  channelButtons.forEach((button) => {
+    button.addEventListener("click", () => setChannel(button.dataset.channel));
+  });
 
   const noProgramSource = { src: '/video/noprogram?t=' + Date.now(), type: 'video/mp4' }
   let currentProgram = null;
   let currentChannel = null;
 
+  let currentStreamUrl = null;
+
+  // Hidden video elements that pre-buffer the next program and the neighbouring channels,
+  // so the player finds the media in the browser cache when it switches source
+  const PRELOAD_LEAD_SECONDS = 60;
+  const standbyPlayers = {};
+  let nextPreloadTimer = null;
+
+  function prebuffer(key, url, offset){
+    let video = standbyPlayers[key];
+    if (!video){
+      video = document.createElement('video');
+      video.preload = 'auto';
+      video.muted = true;
+      standbyPlayers[key] = video;
+    }
+
+    const src = offset ? `${url}#t=${Math.floor(offset)}` : url;
+    if (video.getAttribute('src') !== src){
+      video.src = src;
+      video.load();
+    }
+  }
+
+  function preloadNext(program){
+    clearTimeout(nextPreloadTimer);
+    if (!program.next || !program.next.url){
+      return;
+    }
+
+    const delay = Math.max(program.next_in - PRELOAD_LEAD_SECONDS, 0) * 1000;
+    nextPreloadTimer = setTimeout(() => prebuffer('next', program.next.url, 0), delay);
+  }
+
+  function preloadNeighbours(channel){
+    fetch(`/stream/preload?channel=${channel}`)
+      .then(response => response.json())
+      .then(programs => programs.forEach(program => {
+        if (program.url){
+          prebuffer(program.channel, program.url, program.offset);
+        }
+      }));
+  }
+
+  let preloadedChannel = null;
+
   function onProgramChanged(program){
+    if (program.stream_url){
+      // The channel playlist already stitches programs and the test card, so the source only changes with the channel
+      if (program.stream_url !== currentStreamUrl){
+        currentStreamUrl = program.stream_url;
+        player.src({ src: program.stream_url, type: 'application/x-mpegURL' });
+      }
+    } else {
+      currentStreamUrl = null;
+    }
+
     if (program.status === "available"){
-      if (parseInt(program.offset) > parseInt(program.duration)){
+      if (program.stream_url){
+        // Playing the channel playlist
+      } else if (parseInt(program.offset) > parseInt(program.duration)){
         player.src(noProgramSource);
       } else {
         
@@ -63,17 +117,29 @@
       }
 
     } else {
-      player.src(noProgramSource);
+      if (!program.stream_url){
+        player.src(noProgramSource);
+      }
       document.getElementById('programTitle').innerText = program.title;
       document.getElementById('programTime').innerText = "";
       document.getElementById('programDescription').innerText = program.description;
     }
 
-    player.currentTime(program.offset)
+    if (!program.stream_url){
+      player.currentTime(program.offset)
+    }
 
     if (program.is_rerun){
         document.getElementById('programTitle').innerText += " (R)"
     }
+
+    if (!program.stream_url){
+      preloadNext(program);
+      if (program.channel !== preloadedChannel){
+        preloadedChannel = program.channel;
+        preloadNeighbours(program.channel);
+      }
+    }
   }
 
   function create_subtitles(subtitles){
@@ -87,18 +153,49 @@
     });
   }
   
+  let evtSource = null;
+  let pollingTimer = null;
+
   function SSE(){
-    const evtSource = new EventSource(fetch_link);
+    if (evtSource) {
+      evtSource.close();
+    }
+    evtSource = new EventSource(`${fetch_link}/events`);
 
     evtSource.onmessage = (e) => {
       const program = JSON.parse(e.data);
+      currentProgram = program.id;
+      currentChannel = program.channel;
       onProgramChanged(program);
     };
+
+    evtSource.onerror = () => {
+      // The browser reconnects by itself unless the server refused the stream
+      if (evtSource.readyState === EventSource.CLOSED) {
+        evtSource = null;
+        Polling();
+      }
+    };
+  }
+
+  // The polled program leaves out the fields that change every second, so it stays cacheable.
+  // They are derived here from the start times and the server clock.
+  function withClock(program, serverTime){
+    if (program.starts_at){
+      program.offset = Math.max((serverTime - Date.parse(program.starts_at)) / 1000, 0);
+    }
+    if (program.next && program.next.starts_at){
+      program.next_in = Math.max((Date.parse(program.next.starts_at) - serverTime) / 1000, 0);
+    }
+    return program;
   }
 
   function updateProgram() {
     fetch(fetch_link)
-      .then(response => response.json())
+      .then(response => {
+        const serverTime = Date.parse(response.headers.get('X-Server-Time')) || Date.now();
+        return response.json().then(program => withClock(program, serverTime));
+      })
       .then(program => {
         if (program.id !== currentProgram || currentChannel !== program.channel) {
           currentProgram = program.id;
@@ -109,12 +206,22 @@
 
   function Polling(){
     updateProgram();
-    setInterval(updateProgram, 5000);
+    if (!pollingTimer) {
+      pollingTimer = setInterval(updateProgram, 5000);
+    }
+  }
+
+  function connect(){
+    if (window.EventSource && !pollingTimer) {
+      SSE();
+    } else {
+      updateProgram();
+    }
   }
 
   addEventListener('DOMContentLoaded', (event) => {
     player.ready(function() {
-      Polling();
+      connect();
     });
   });
 
@@ -1,6 +1,11 @@
-from flask import Flask, jsonify, render_template, send_from_directory, request, Blueprint
+from flask import Flask, Response, jsonify, render_template, send_from_directory, request, Blueprint, abort, current_app
+from werkzeug.security import safe_join
+from urllib.parse import quote
+import mimetypes
+import hashlib
 import os 
-from datetime import datetime
+import json
+from datetime import datetime, timezone
 
 try:
     from .htmx_partials import htmx
@@ -8,16 +13,29 @@ try:
     from .tvcore.programmanager import ProgramManager
     from .tvcore.mediapathmanager import MediaPathManager
     from .tvcore.metadatafetcher import MetaDataFetcher
-    from .tvcore.broadcastmonitor import BroadcastMonitor
+    from .tvcore.broadcastmonitor import BroadcastMonitor, CLOCK_FIELDS
+    from .tvcore.hlsplayout import HLSPlayout
+    from .tvcore.livestream import LiveStreamer
+    from .tvcore.mediacache import HotMediaCache
+    from .tvcore.microcache import MicroCache
+    from .tvcore.querymetrics import QueryMetrics
+    from .tvcore.schemas import TVConfig
     from .templates.stream_html import *
     from .templates.html_base import base
     from .templates.admin_schedule import admin_schedule_body, form_status
 except ImportError:
+    from htmx_partials import htmx
     from tvcore.tvdatabase import TVDatabase
     from tvcore.programmanager import ProgramManager
     from tvcore.mediapathmanager import MediaPathManager
     from tvcore.metadatafetcher import MetaDataFetcher
-    from tvcore.broadcastmonitor import BroadcastMonitor
+    from tvcore.broadcastmonitor import BroadcastMonitor, CLOCK_FIELDS
+    from tvcore.hlsplayout import HLSPlayout
+    from tvcore.livestream import LiveStreamer
+    from tvcore.mediacache import HotMediaCache
+    from tvcore.microcache import MicroCache
+    from tvcore.querymetrics import QueryMetrics
+    from tvcore.schemas import TVConfig
     from templates.html_base import base
     from templates.stream_html import *
     from templates.admin_schedule import admin_schedule_body, form_status
@@ -32,17 +50,39 @@ stream_app = Blueprint(
 
 stream_app.register_blueprint(htmx)
 
+config = TVConfig.from_file()
 tv_db = TVDatabase()
 program_manager = ProgramManager()
 path_manager = MediaPathManager()
 metadata_fetcher = MetaDataFetcher()
 broadcast_monitor = BroadcastMonitor()
+hls_playout = HLSPlayout(
+    broadcast_monitor,
+    path_manager,
+    tv_db,
+    segment_seconds=config.streaming.hls_segment_seconds,
+    window_segments=config.streaming.hls_window_segments
+)
+live_streamer = LiveStreamer(broadcast_monitor, path_manager, max_clients=config.streaming.live_max_clients)
+media_cache = HotMediaCache(
+    budget_bytes=config.streaming.media_cache_mb * 1024 * 1024,
+    head_bytes=config.streaming.media_cache_head_mb * 1024 * 1024
+)
+response_cache = MicroCache(ttl=1)
+
+#Every TVDatabase on the same file shares tv_db's engine, so this instruments all of them
+query_metrics = QueryMetrics(slow_query_ms=config.database.slow_query_ms)
+if config.database.metrics or config.database.slow_query_ms is not None:
+    query_metrics.attach(tv_db.engine)
+
+SCHEDULE_TABLES = ("schedule", "episodes", "movies", "series")
+SCHEDULE_PROFILES = ("slim", "guide", "full")
 
 # ============ STREAMING PAGES ============
 
 @stream_app.route('/tvstream')
 def tvstream():
-    return render_template("tvstream.html")
+    return render_template("tvstream.html", channels=broadcast_monitor.channel_registry)
 
 
 # ============= ADMIN PAGES =============
@@ -53,6 +93,17 @@ def schedule():
     html.extend("body", admin_schedule_body())
     return html.dump()
 
+@stream_app.route('/admin/metrics/db', methods=['GET', 'POST'])
+def database_metrics():
+    """Statement counts and latency histograms; POST resets them"""
+    if not query_metrics.enabled:
+        return jsonify({"enabled": False})
+
+    if request.method == 'POST':
+        query_metrics.reset()
+
+    return jsonify({"enabled": True, **query_metrics.snapshot()})
+
 @stream_app.route('/admin/preparer')
 def prepare():
     return render_template("admin_preparer.html")
@@ -60,13 +111,127 @@ def prepare():
 
 # ============= FILE ROUTING =============
 
+def send_media(directory: os.PathLike, filename: str, **kwargs):
+    """
+    Sends a media file. With 'streaming.offload' configured the worker only resolves the path,
+    and the front proxy does the transfer from the X-Accel-Redirect/X-Sendfile header.
+    """
+    offload = config.streaming.offload
+    path = safe_join(str(directory), filename)
+    download_path = str(path_manager.download_path)
+
+    if path is None:
+        abort(404)
+
+    cached = send_cached(path)
+    if cached is not None:
+        return cached
+
+    if offload is None or os.path.commonpath([path, download_path]) != download_path:
+        return send_from_directory(directory, filename, **kwargs)
+
+    response = Response(mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream")
+    if offload == "x-sendfile":
+        response.headers["X-Sendfile"] = path
+    else:
+        relative = os.path.relpath(path, download_path).replace(os.sep, "/")
+        response.headers["X-Accel-Redirect"] = f"{config.streaming.offload_prefix.rstrip('/')}/{quote(relative)}"
+
+    if kwargs.get("max_age"):
+        response.headers["Cache-Control"] = f"public, max-age={kwargs['max_age']}"
+
+    return response
+
+def send_cached(path: str):
+    """Answers from the hot media cache when the request (or its start) is held in memory, else returns None"""
+    media_cache.start_warming(broadcast_monitor, path_manager)
+
+    entry = media_cache.get(path)
+    if entry is None:
+        return None
+
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    etag = media_cache.etag(path, entry)
+
+    if request.range is None:
+        if not entry.whole:
+            return None
+        response = Response(entry.data, mimetype=mimetype, headers={"Accept-Ranges": "bytes"})
+        response.set_etag(etag)
+        response.last_modified = entry.mtime
+        return response.make_conditional(request)
+
+    byte_range = request.range.range_for_length(entry.size)
+    if byte_range is None:
+        return None
+
+    #Open-ended requests (e.g. "bytes=0-") get what is cached; the player asks for the rest from disk
+    if request.range.ranges[0][1] is not None and byte_range[1] > len(entry.data):
+        return None
+
+    result = media_cache.read_range(path, *byte_range)
+    if result is None:
+        return None
+
+    data, size = result
+    start = byte_range[0]
+    response = Response(
+        data,
+        status=206,
+        mimetype=mimetype,
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{start + len(data) - 1}/{size}"
+        }
+    )
+    response.set_etag(etag)
+    response.last_modified = entry.mtime
+    return response
+
 @stream_app.route('/video/noprogram')
 def noprogram_video():
-    return send_from_directory(path_manager.download_path / "ads", "PM5544.mp4")
+    #The same file the media cache warms: the downloaded test card, or the one shipped in static/
+    media_cache.start_warming(broadcast_monitor, path_manager)
+    filler = media_cache.filler_path or path_manager.get_filler_path()
+    return send_media(filler.parent, filler.name)
 
 @stream_app.route('/video/<content_type>/<directory>/<filename>')
 def serve_video(content_type, directory, filename):
-    return send_from_directory(path_manager.get_program_dir(content_type, directory), filename)
+    return send_media(path_manager.get_program_dir(content_type, directory), filename)
+
+@stream_app.route('/hls/<channel>.m3u8')
+def hls_playlist(channel):
+    playlist = hls_playout.playlist(channel)
+    if playlist is None:
+        return Response("Test card is not segmented, run 'tvpreparer.py segment'", status=404)
+
+    return Response(
+        playlist,
+        mimetype="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": f"max-age={max(1, config.streaming.hls_segment_seconds // 2)}"}
+    )
+
+@stream_app.route('/live/<channel>.ts')
+def live_stream(channel):
+    """Continuous MPEG-TS of the channel for IPTV clients, read from the channel's shared ring buffer"""
+    try:
+        stream = live_streamer.stream(channel)
+    except KeyError:
+        abort(404)
+
+    if stream is None:
+        return Response("Too many live viewers", status=503, headers={"Retry-After": "30"})
+
+    return Response(
+        stream,
+        mimetype="video/mp2t",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@stream_app.route('/hls/segments/<path:segment>')
+def hls_segment(segment):
+    #Segments never change once written, so every viewer (and any proxy in front) can share them
+    return send_media(path_manager.download_path, segment, max_age=86400)
 
 
 # ============= ADMIN CRUD =============
@@ -143,9 +308,115 @@ def delete_schedule():
 
 #Stream
 
+def cached_json(key, compute, ttl: float = None, last_modified: datetime = None, validators=None) -> Response:
+    """
+    JSON response whose serialized body and ETag are shared by every request for the same key
+    within `ttl` seconds. Clients revalidate with If-None-Match/If-Modified-Since and get a 304
+    when nothing changed. The ETag is a hash of the body unless `validators` derives
+    (etag, last modified) from the computed value.
+    """
+    def serialize():
+        value = compute()
+        body = current_app.json.dumps(value).encode()
+        if validators:
+            return body, *validators(value)
+        return body, hashlib.sha1(body).hexdigest(), last_modified
+
+    body, etag, modified = response_cache.get_or_compute(key, serialize, ttl)
+
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    if modified:
+        response.last_modified = modified
+    response.cache_control.no_cache = True
+
+    return response.make_conditional(request)
+
+def _schedule_version() -> tuple[tuple[int, ...], datetime]:
+    """Write counters of the tables behind schedule responses, and when the last of them changed"""
+    versions = tuple(tv_db.get_table_version(table) for table in SCHEDULE_TABLES)
+    modified = max(tv_db.get_table_modified(table) for table in SCHEDULE_TABLES)
+    return versions, modified
+
+def _with_playout(program: dict) -> dict:
+    """Points the player at the channel playlist when HLS playout is enabled, otherwise at the media files to play and pre-buffer"""
+    if config.streaming.playout == "hls":
+        return dict(program, stream_url=f"/hls/{program['channel']}.m3u8")
+
+    program = dict(program, url=f"/video/{program['filepath']}" if program.get("filepath") else None)
+    if program.get("next"):
+        next_program = program["next"]
+        program["next"] = dict(next_program, url=f"/video/{next_program['filepath']}" if next_program["filepath"] else None)
+    return program
+
 @stream_app.route('/stream/<channel>')
 def current_program(channel):
-    return broadcast_monitor.get_current_program(channel)
+    """
+    What airs on the channel now. The per-second fields are left out of the body, the player derives them
+    from `starts_at` and the X-Server-Time header, so the validators only change with the schedule or the program.
+    """
+    version, modified = _schedule_version()
+
+    def compute():
+        program = broadcast_monitor.get_current_program(channel)
+        return _with_playout({key: value for key, value in program.items() if key not in CLOCK_FIELDS})
+
+    def validators(program):
+        next_id = program["next"]["id"] if program["next"] else None
+        etag = "-".join(str(part) for part in (*version, program["id"], next_id))
+        if program["starts_at"]:
+            modified_at = max(modified, datetime.fromisoformat(program["starts_at"]).astimezone(timezone.utc))
+        else:
+            modified_at = modified
+        return etag, modified_at
+
+    response = cached_json(("stream", channel, version), compute, validators=validators)
+    response.headers["X-Server-Time"] = broadcast_monitor.get_current_time().isoformat(timespec="seconds")
+    return response
+
+@stream_app.route('/stream/preload')
+def preload_neighbours():
+    """What airs now on the channels next to `channel`, so the player can pre-buffer them for zapping"""
+    channel = request.args.get("channel", None)
+    count = request.args.get("count", 1, type=int)
+
+    return jsonify([_with_playout(program) for program in broadcast_monitor.get_neighbour_programs(channel, count=min(count, 5))])
+
+@stream_app.route('/stream/<channel>/events')
+def program_events(channel):
+    """Server-Sent Events: one message when connecting, then one per program change on the channel"""
+    broadcast_monitor.start_monitoring()
+    last_sequence, _ = broadcast_monitor.events.latest(channel)
+
+    def event_stream():
+        yield "retry: 5000\n"
+        yield f"data: {json.dumps(_with_playout(broadcast_monitor.get_current_program(channel)))}\n\n"
+
+        for sequence, program in broadcast_monitor.events.listen(channel, last_sequence):
+            if program is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"id: {sequence}\ndata: {json.dumps(_with_playout(program))}\n\n"
+
+    return Response(
+        event_stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@stream_app.route('/api/now')
+def now_on_all_channels():
+    """Now and next on every channel in one request, for the guide and the channel selector"""
+    def compute():
+        now = broadcast_monitor.get_all_current_programs()
+        now["channels"] = [_with_playout(program) for program in now["channels"]]
+        return now
+
+    return cached_json(("now",), compute)
+
+@stream_app.route('/api/channels')
+def get_channels():
+    return jsonify([channel.model_dump() for channel in broadcast_monitor.channel_registry])
 
 @stream_app.route('/api/schedule', methods=['GET'])
 def get_schedule():
@@ -154,8 +425,25 @@ def get_schedule():
     date = request.args.get("date", None)
     full_week = request.args.get("full_week", False)
     full_week_bool = True if full_week in ["true", "True", "1"] else False
+    profile = request.args.get("profile", "full") #slim, guide or full
+
+    if profile not in SCHEDULE_PROFILES:
+        abort(400)
 
-    return jsonify([obj.model_dump() for obj in tv_db.get_current_week_schedule(channel=channel, date=date, full_week=full_week_bool)])
+    #The schedule only changes on writes, so the body is reused until a write (by any process, see TVDatabase.get_table_version) or a new day
+    version, modified = _schedule_version()
+    today = datetime.today().date()
+    key = ("schedule", channel, date, full_week_bool, profile, version, today)
+
+    #The body also changes at midnight, so a client that only sends If-Modified-Since must not get yesterday's week
+    start_of_today = datetime.combine(today, datetime.min.time()).astimezone(timezone.utc)
+
+    return cached_json(
+        key,
+        lambda: [obj.model_dump() for obj in tv_db.get_current_week_schedule(channel=channel, date=date, full_week=full_week_bool, profile=profile)],
+        ttl=10,
+        last_modified=max(modified, start_of_today)
+    )
 
 @stream_app.route('/api/pending')
 def get_pending_episodes():
@@ -178,9 +466,14 @@ def fetch_metadata(program_type,tmdb_id):
 
 # ============= TEST RUN =============
 
-def test_run():
+def create_app() -> Flask:
+    """Standalone app serving the streamer, see gunicorn_config.py"""
     app = Flask(__name__)
     app.register_blueprint(stream_app)
+    return app
+
+def test_run():
+    app = create_app()
 
     test_time = None
     test_acc = 1
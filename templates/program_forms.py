@@ -18,7 +18,7 @@ tvdb = TVDatabase()
 SERIES = tvdb.get_series()
 MOVIES = tvdb.get_movies()
 GENRES = config.genres
-CHANNELS = tvdb.get_channels()
+CHANNELS = [channel.name for channel in tvdb.get_registered_channels()]
 
 class FormBase():
     def __init__(self, entry=None):
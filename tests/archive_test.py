@@ -0,0 +1,36 @@
+from tvcore.tvdatabase import TVDatabase, Series, Episode, Movie, Schedule
+from datetime import date, datetime, timedelta
+
+def week_start(weeks_ago=0):
+    today = datetime.combine(date.today(), datetime.min.time())
+    return today - timedelta(days=today.weekday(), weeks=weeks_ago)
+
+def test_archive_moves_old_weeks_and_keeps_queries_correct(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    old_series, new_series = db.add_many([Series(title="Gammel"), Series(title="Ny")])
+    old_episode, new_episode = db.add_many([Episode(series_id=old_series, program_id="A", title="a"), Episode(series_id=new_series, program_id="B", title="b")])
+
+    def airing(start, episode_id, **kwargs):
+        return Schedule(title="x", channel="nrk1", start=start, end=start + timedelta(hours=1), episode_id=episode_id, **kwargs)
+
+    ids = db.add_many([
+        airing(week_start(10) + timedelta(hours=20), old_episode),
+        airing(week_start(10) + timedelta(days=2), old_episode, rerun=True),
+        airing(week_start(10), old_episode, filepath="series/gammel/a.mp4"), #Still has a file
+        airing(week_start(1) + timedelta(hours=20), old_episode),
+        airing(week_start() + timedelta(hours=20), old_episode),
+        airing(week_start() + timedelta(hours=21), new_episode),
+    ])
+
+    assert db.archive_schedule(keep_weeks=0) == 3
+    assert len(db.get_schedule()) == 3
+
+    #Archiving the same week again merges into its aggregate
+    db.update_many(Schedule, [{"id": ids[2], "filepath": None}])
+    assert db.archive_schedule(keep_weeks=0) == 1
+
+    airings = {row["episode_id"]: row for row in db.get_airings(week_start(10).date(), date.today() + timedelta(days=7))}
+    assert airings[old_episode]["airings"] == 5
+    assert airings[old_episode]["reruns"] == 1
+
+    assert [entry.episode_id for entry in db.get_new_this_week(lookback_weeks=1)] == [new_episode]
@@ -0,0 +1,68 @@
+from tvcore.tvdatabase import TVDatabase, Series, Episode, Schedule, Channels
+from tvcore.asyncdatabase import AsyncTVDatabase
+from datetime import datetime, timedelta
+import asyncio
+import threading
+import time
+
+def test_async_reads_match_sync(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    series_id = db.add(Series(title="Serie"))
+    episode_id = db.add(Episode(series_id=series_id, program_id="EP1", title="Episode", duration=1800))
+
+    now = datetime.now()
+    db.add_many([
+        Schedule(title="Now", episode_id=episode_id, channel="nrk1", start=now - timedelta(minutes=10), end=now + timedelta(minutes=20), status="available"),
+        Schedule(title="Next", episode_id=episode_id, channel="nrk1", start=now + timedelta(minutes=20), end=now + timedelta(minutes=50), status="available"),
+    ])
+
+    aired_id = db.add(Episode(series_id=series_id, program_id="EP2", title="Aired", duration=1800))
+    db.add_many([
+        Schedule(title="Aired", episode_id=aired_id, channel="nrk1", start=now - timedelta(days=1), end=now - timedelta(days=1), status="available", filepath="series/serie/ep.mp4"),
+        Channels(name="local", display_name="Local", position=9, enabled=True),
+    ])
+
+    async def read():
+        async with AsyncTVDatabase(db_path=tmp_path / "tv.db") as async_db:
+            return (
+                await async_db.get_current_program_by_channel("nrk1", now),
+                await async_db.get_next_program_by_channel("nrk1", now),
+                await async_db.get_programs_in_window(now - timedelta(hours=1), now + timedelta(hours=1)),
+                await async_db.get_schedule(date=now.date(), profile="guide"),
+                await async_db.get_registered_channels(),
+                await async_db.get_obsolete_programs(),
+            )
+
+    current, upcoming, window, guide, channels, obsolete = asyncio.run(read())
+
+    assert current == db.get_current_program_by_channel("nrk1", now)
+    assert upcoming == db.get_next_program_by_channel("nrk1", now)
+    assert window == db.get_programs_in_window(now - timedelta(hours=1), now + timedelta(hours=1))
+    assert guide == db.get_schedule(date=now.date(), profile="guide")
+    assert channels == db.get_registered_channels() and channels[-1].name == "local"
+    assert obsolete == db.get_obsolete_programs() and [program.title for program in obsolete] == ["Aired"]
+
+def test_each_event_loop_gets_its_own_engine(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    db.add(Series(title="Serie"))
+    async_db = AsyncTVDatabase(db_path=tmp_path / "tv.db")
+
+    async def read():
+        TVDatabase._version_snapshots.clear()
+        try:
+            return await async_db.get_table_version("series"), await async_db.get_channels()
+        finally:
+            await async_db.dispose()
+
+    threads = threading.active_count()
+
+    #The second loop must not reuse the first loop's engine
+    assert asyncio.run(read()) == (db.get_table_version("series"), [])
+    assert asyncio.run(read()) == (db.get_table_version("series"), [])
+
+    #Disposing closed both loops' connections, and their worker threads
+    for _ in range(50):
+        if threading.active_count() <= threads:
+            break
+        time.sleep(0.01)
+    assert threading.active_count() <= threads
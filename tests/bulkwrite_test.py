@@ -0,0 +1,48 @@
+from tvcore.tvdatabase import TVDatabase, Series, Schedule
+from datetime import datetime, timezone
+from sqlalchemy import text
+
+def test_add_many_returns_ids_in_order(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    ids = db.add_many([Series(title="a"), Series(title="b", description="has more columns"), Series(title="c")])
+
+    titles = {series.id: series.title for series in db.get_series()}
+    assert [titles[id] for id in ids] == ["a", "b", "c"]
+
+def test_upsert_many_updates_on_conflict_key(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    first, second = db.add_many([Series(title="old", tmdb_id=1), Series(title="other", tmdb_id=2)])
+
+    ids = db.upsert_many([Series(title="new", tmdb_id=3), Series(title="renamed", tmdb_id=1)], index_elements=["tmdb_id"])
+
+    assert ids[1] == first
+    titles = {series.tmdb_id: series.title for series in db.get_series()}
+    assert titles == {1: "renamed", 2: "other", 3: "new"}
+
+def test_upsert_many_keys_on_stored_values(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    with db.engine.begin() as connection:
+        #Schedule rows are identified by start and channel, as in add_missing, but the schema has no such constraint
+        connection.execute(text("CREATE UNIQUE INDEX ux_test_schedule_slot ON schedule (start, channel)"))
+
+    start = datetime(2026, 3, 2, 20, tzinfo=timezone.utc)
+    existing, = db.add_many([Schedule(title="old", channel="nrk1", start=start, end=start)])
+
+    #Timezone-aware keys match the naive values SQLite returns, and the last of two objects with the same key wins
+    ids = db.upsert_many([
+        Schedule(title="first", channel="nrk1", start=start, end=start),
+        Schedule(title="new", channel="nrk2", start=start, end=start),
+        Schedule(title="last", channel="nrk1", start=start, end=start),
+    ], index_elements=["start", "channel"])
+
+    assert ids[0] == ids[2] == existing
+    assert ids[1] not in (None, existing)
+    assert {program.channel: program.title for program in db.get_schedule()} == {"nrk1": "last", "nrk2": "new"}
+
+def test_update_many_by_primary_key(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    ids = db.add_many([Series(title="a"), Series(title="b")])
+
+    db.update_many(Series, [{"id": ids[0], "title": "x"}, {"id": ids[1], "title": "y"}])
+
+    assert sorted(series.title for series in db.get_series()) == ["x", "y"]
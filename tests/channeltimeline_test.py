@@ -0,0 +1,54 @@
+from tvcore.channeltimeline import ChannelTimeline
+from datetime import datetime, timedelta
+
+day = datetime(2026, 3, 2)
+
+def program(id, channel, start_hour, minutes):
+    start = day + timedelta(hours=start_hour)
+    return {
+        "id": id,
+        "channel": channel,
+        "title": f"Program {id}",
+        "start": start,
+        "end": start + timedelta(minutes=minutes),
+        "status": "available",
+    }
+
+programs = [
+    program(3, "nrk1", 21, 30),
+    program(1, "nrk1", 19, 60),
+    program(2, "nrk1", 20, 30),
+    program(4, "nrk2", 18, 90),
+]
+
+timeline = ChannelTimeline(programs, day, day + timedelta(days=2), version=7)
+
+def test_current_program():
+    assert timeline.current("nrk1", day + timedelta(hours=19, minutes=30))["id"] == 1
+    assert timeline.current("nrk1", day + timedelta(hours=20, minutes=10))["id"] == 2
+    assert timeline.current("nrk2", day + timedelta(hours=19))["id"] == 4
+
+def test_gap_and_unknown_channel():
+    assert timeline.current("nrk1", day + timedelta(hours=20, minutes=45)) is None
+    assert timeline.current("nrk1", day + timedelta(hours=12)) is None
+    assert timeline.current("cable", day + timedelta(hours=20)) is None
+
+def test_next_program():
+    assert timeline.next("nrk1", day + timedelta(hours=20, minutes=45))["id"] == 3
+    assert timeline.next("nrk1", day + timedelta(hours=22)) is None
+    assert timeline.next("nrk1", day - timedelta(days=2)) is None
+
+def test_previous_program():
+    assert timeline.previous("nrk1", day + timedelta(hours=20, minutes=45))["id"] == 2
+    assert timeline.previous("nrk1", day + timedelta(hours=20, minutes=10))["id"] == 1
+    assert timeline.previous("nrk1", day + timedelta(hours=19, minutes=30)) is None
+
+def test_lookups_return_copies():
+    current = timeline.current("nrk1", day + timedelta(hours=19, minutes=30))
+    current["start"] = "19:00"
+    assert timeline.current("nrk1", day + timedelta(hours=19, minutes=30))["start"] == day + timedelta(hours=19)
+
+def test_covers():
+    assert timeline.covers(day + timedelta(hours=12))
+    assert not timeline.covers(day - timedelta(minutes=1))
+    assert not timeline.covers(day + timedelta(days=2))
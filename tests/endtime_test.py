@@ -0,0 +1,27 @@
+from tvcore.tvdatabase import TVDatabase, Series, Episode, Movie, Schedule
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+def test_update_end_time_only_touches_changed_durations(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    series_id, = db.add_many([Series(title="Serie")])
+    episode_id, = db.add_many([Episode(series_id=series_id, program_id="A", duration=1801)])
+    movie_id, = db.add_many([Movie(title="Film")])
+
+    start = datetime(2026, 10, 19, 20, 0)
+    episode_entry, movie_entry = db.add_many([
+        Schedule(title="Episode", channel="nrk1", start=start, end=start, episode_id=episode_id),
+        Schedule(title="Film", channel="nrk1", start=start, end=start + timedelta(hours=1), movie_id=movie_id),
+    ])
+
+    assert db.update_end_time() == 2
+    assert db.get_schedule(schedule_id=episode_entry).end == start + timedelta(minutes=31)
+    assert db.get_schedule(schedule_id=movie_entry).end == start + timedelta(hours=1) #No duration yet
+    with db.engine.connect() as connection:
+        assert connection.execute(text("SELECT \"end\" FROM schedule WHERE id = :id"), {"id": episode_entry}).scalar() == "2026-10-19 20:31:00.000000"
+
+    assert db.update_end_time() == 0
+
+    db.update_many(Movie, [{"id": movie_id, "duration": 5400}])
+    assert db.update_end_time() == 1
+    assert db.get_schedule(schedule_id=movie_entry).end == start + timedelta(minutes=90)
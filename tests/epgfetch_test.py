@@ -0,0 +1,109 @@
+from tvcore.nrkmanager import fetch_epg_async
+from tvcore.ratelimiter import TokenBucket
+from tvcore.epgcache import EPGCache
+from tvcore.schemas import EPGConfig
+from aiohttp import web
+from datetime import date
+import asyncio
+import time
+
+def epg_entry(program_id):
+    return {
+        "programId": program_id,
+        "seriesId": None,
+        "title": program_id,
+        "seriesTitle": None,
+        "plannedStart": "/Date(1002556800000+0200)/",
+        "reRun": False,
+        "duration": "PT30M",
+        "description": None,
+        "category": {"displayValue": "Drama"},
+        "availability": {"status": "available"},
+    }
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get("/epg/{channel}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/epg/{{channel}}"
+
+def test_fetches_all_pairs_and_retries_server_errors():
+    requests = []
+
+    async def handler(request):
+        key = (request.match_info["channel"], request.query["date"])
+        requests.append(key)
+        if requests.count(key) == 1 and key[1] == "2001-10-09":
+            return web.Response(status=503)
+        return web.json_response([{"entries": [{"epgEntries": [epg_entry(f"{key[0]}-{key[1]}")]}]}])
+
+    async def run():
+        runner, url = await serve(handler)
+        try:
+            config = EPGConfig(requests_per_second=100, burst=10, backoff_seconds=0.01, cache_dir=None)
+            return await fetch_epg_async(["nrk1", "nrk2"], [date(2001, 10, 8), date(2001, 10, 9)], config, url)
+        finally:
+            await runner.cleanup()
+
+    programs = asyncio.run(run())
+
+    assert [program.program_id for program in programs["nrk1"]] == ["nrk1-2001-10-08", "nrk1-2001-10-09"]
+    assert [program.channel for program in programs["nrk2"]] == ["nrk2", "nrk2"]
+    assert len(requests) == 6
+
+def test_cache_revalidates_and_replays_offline(tmp_path):
+    requests = []
+
+    async def handler(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"'})
+        return web.json_response([{"entries": [epg_entry("A")]}], headers={"ETag": '"v1"'})
+
+    async def run(config):
+        runner, url = await serve(handler)
+        try:
+            return await fetch_epg_async(["nrk1"], [date(2001, 10, 8)], config, url, EPGCache(tmp_path, config.cache_max_age_days))
+        finally:
+            await runner.cleanup()
+
+    fresh = EPGConfig(cache_dir=None)
+    stale = EPGConfig(cache_dir=None, cache_max_age_days=0)
+
+    assert asyncio.run(run(fresh))["nrk1"][0].program_id == "A"
+    assert asyncio.run(run(fresh))["nrk1"][0].program_id == "A" #Fresh, read from the cache
+    assert asyncio.run(run(stale))["nrk1"][0].program_id == "A" #Revalidated
+    assert requests == [None, '"v1"']
+
+    assert (tmp_path / "nrk1" / "2001-10-08.json.gz").exists()
+    offline = asyncio.run(fetch_epg_async(["nrk1"], [date(2001, 10, 8), date(2001, 10, 9)], EPGConfig(offline=True), cache=EPGCache(tmp_path)))
+    assert [program.program_id for program in offline["nrk1"]] == ["A"]
+
+def test_invalid_responses_are_not_cached(tmp_path):
+    async def handler(request):
+        return web.json_response({"error": "Service unavailable"})
+
+    async def run():
+        runner, url = await serve(handler)
+        try:
+            return await fetch_epg_async(["nrk1"], [date(2001, 10, 8)], EPGConfig(cache_dir=None), url, EPGCache(tmp_path))
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(run()) == {"nrk1": []}
+    assert EPGCache(tmp_path).lookup("nrk1", date(2001, 10, 8)) is None
+
+def test_token_bucket_spreads_requests():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=2)
+        started = time.monotonic()
+        for _ in range(7):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    #Two from the burst, then five at 50 per second
+    assert asyncio.run(run()) >= 0.09
@@ -0,0 +1,75 @@
+from tvcore.tvdatabase import TVDatabase
+from tvcore.epgsources import EPGSource, EPG_SOURCES, NRKSource, register_source, fetch_all_async
+from tvcore.epgcache import EPGCache
+from tvcore.schemas import EPGConfig
+from pydantic import ValidationError
+from datetime import date
+import asyncio
+import json
+import pytest
+import time
+
+def test_registry_is_seeded_in_display_order(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    channels = db.get_registered_channels()
+
+    assert [channel.name for channel in channels] == ["nrk1", "nrk2", "cable"]
+    assert [channel.epg_source for channel in channels] == ["nrk", "nrk", None]
+
+def test_sources_are_fetched_in_parallel_with_their_own_limits(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    channels = [
+        channel.model_copy(update={"epg_source": "slow", "name": f"slow{i}", "source_channel": f"s{i}"})
+        for i, channel in enumerate(db.get_registered_channels()[:2])
+    ] + [db.get_registered_channels()[2].model_copy(update={"epg_source": "other"})]
+
+    @register_source
+    class SlowSource(EPGSource):
+        name = "slow"
+
+        async def fetch(self, channels, dates):
+            await asyncio.sleep(0.2)
+            return {channel.name: [self.config.concurrency] for channel in channels}
+
+        def ingest(self, programs):
+            pass
+
+    @register_source
+    class OtherSource(SlowSource):
+        name = "other"
+
+    try:
+        config = EPGConfig(sources={"slow": {"concurrency": 2}})
+        started = time.monotonic()
+        fetched = asyncio.run(fetch_all_async(channels, [date(2001, 10, 8)], config))
+        elapsed = time.monotonic() - started
+    finally:
+        EPG_SOURCES.pop("slow")
+        EPG_SOURCES.pop("other")
+
+    assert fetched == {"slow": {"slow0": [2], "slow1": [2]}, "other": {"cable": [8]}}
+    assert elapsed < 0.35
+
+def test_source_settings_are_validated():
+    with pytest.raises(ValidationError):
+        EPGConfig(sources={"nrk": {"concurency": 2}})
+
+    with pytest.raises(ValidationError):
+        EPGConfig(sources={"nrk": {"concurrency": "many"}}).for_source("nrk")
+
+    assert EPGConfig(sources={"nrk": {"concurrency": "2"}}).for_source("nrk").concurrency == 2
+
+def test_nrk_replays_responses_cached_before_sources(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    entry = {
+        "programId": "A", "seriesId": None, "title": "A", "seriesTitle": None,
+        "plannedStart": "/Date(1002556800000+0200)/", "reRun": False, "duration": "PT30M",
+        "description": None, "category": {"displayValue": "Drama"}, "availability": {"status": "available"},
+    }
+    #The layout from before there were several sources: cache_dir/<channel>/<date>
+    EPGCache(tmp_path / "epg").store("nrk1", date(2001, 10, 8), json.dumps([{"entries": [entry]}]).encode(), {})
+
+    config = EPGConfig(cache_dir=str(tmp_path / "epg"), offline=True)
+    fetched = asyncio.run(NRKSource(config).fetch(db.get_registered_channels()[:1], [date(2001, 10, 8)]))
+
+    assert [program.program_id for program in fetched["nrk1"]] == ["A"]
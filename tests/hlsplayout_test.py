@@ -0,0 +1,121 @@
+from tvcore.hlsplayout import HLSPlayout, SEGMENT_PLAYLIST
+from tvcore.channeltimeline import ChannelTimeline
+from tvcore.mediapathmanager import MediaPathManager
+from tvcore.tvdatabase import TVDatabase
+from datetime import datetime, timedelta
+
+SEGMENT = 6
+
+class FakeMonitor:
+    def __init__(self, programs):
+        self.now = None
+        self.timeline = ChannelTimeline(programs, datetime(2026, 3, 1), datetime(2026, 3, 4))
+
+    def get_current_time(self):
+        return self.now
+
+    def get_timeline(self, now):
+        return self.timeline
+
+def write_segments(hls_dir, names, durations):
+    hls_dir.mkdir(parents=True)
+    lines = ["#EXTM3U"]
+    for name, duration in zip(names, durations):
+        lines += [f"#EXTINF:{duration},", name]
+    (hls_dir / SEGMENT_PLAYLIST).write_text("\n".join(lines) + "\n")
+
+def setup(tmp_path):
+    paths = MediaPathManager(download_path=tmp_path / "downloads")
+    write_segments(paths.get_filler_hls_dir(), ["card0.ts", "card1.ts", "card2.ts"], [6, 6, 6])
+    write_segments(paths.download_path / "series" / "show" / "ep_hls", [f"seg{i}.ts" for i in range(5)], [6, 6, 6, 6, 4])
+
+    #A program starting on a slot that is a multiple of the test card length, so the card's loop points are known
+    start = datetime(2026, 3, 2, 20)
+    while int(start.timestamp() // SEGMENT) % 3:
+        start += timedelta(seconds=SEGMENT)
+
+    program = {"id": 1, "channel": "nrk1", "start": start, "end": start + timedelta(seconds=30), "filepath": "series/show/ep.mp4"}
+    monitor = FakeMonitor([program])
+    return playout(tmp_path, monitor), monitor, start
+
+def playout(tmp_path, monitor):
+    paths = MediaPathManager(download_path=tmp_path / "downloads")
+    return HLSPlayout(monitor, paths, TVDatabase(db_path=tmp_path / "tv.db"), segment_seconds=SEGMENT, window_segments=4)
+
+def at_slot(start, slots):
+    return start + timedelta(seconds=slots * SEGMENT + 1)
+
+def test_window_starts_with_a_discontinuity_at_the_program(tmp_path):
+    playout, monitor, start = setup(tmp_path)
+    first = int(start.timestamp() // SEGMENT) - 1
+    monitor.now = at_slot(start, 2)
+
+    assert playout.playlist("nrk1", "/") == "\n".join([
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        "#EXT-X-TARGETDURATION:6",
+        f"#EXT-X-MEDIA-SEQUENCE:{first}",
+        "#EXT-X-DISCONTINUITY-SEQUENCE:0",
+        "#EXTINF:6.000,", "/ads/PM5544_hls/card2.ts",
+        "#EXT-X-DISCONTINUITY",
+        "#EXTINF:6.000,", "/series/show/ep_hls/seg0.ts",
+        "#EXTINF:6.000,", "/series/show/ep_hls/seg1.ts",
+        "#EXTINF:6.000,", "/series/show/ep_hls/seg2.ts",
+    ]) + "\n"
+
+def test_sliding_window_counts_discontinuities_that_left_it(tmp_path):
+    playout, monitor, start = setup(tmp_path)
+    slot = int(start.timestamp() // SEGMENT)
+
+    monitor.now = at_slot(start, 2)
+    playout.playlist("nrk1", "/")
+
+    #Four slots later the boundary into the program has slid out, and the program has ended
+    monitor.now = at_slot(start, 6)
+    playlist = playout.playlist("nrk1", "/")
+    assert playlist == "\n".join([
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        "#EXT-X-TARGETDURATION:6",
+        f"#EXT-X-MEDIA-SEQUENCE:{slot + 3}",
+        "#EXT-X-DISCONTINUITY-SEQUENCE:1",
+        "#EXTINF:6.000,", "/series/show/ep_hls/seg3.ts",
+        "#EXTINF:4.000,", "/series/show/ep_hls/seg4.ts",
+        "#EXT-X-DISCONTINUITY",
+        "#EXTINF:6.000,", "/ads/PM5544_hls/card2.ts",
+        "#EXT-X-DISCONTINUITY", #The test card loops
+        "#EXTINF:6.000,", "/ads/PM5544_hls/card0.ts",
+    ]) + "\n"
+
+    #Viewers polling within the same slot get the same playlist
+    assert playout.playlist("nrk1", "/") == playlist
+
+def test_every_process_serves_the_same_sequence(tmp_path):
+    first_worker, monitor, start = setup(tmp_path)
+    monitor.now = at_slot(start, 2)
+    first_worker.playlist("nrk1", "/")
+
+    #A worker started later, or another worker behind the same proxy, continues the same sequence
+    monitor.now = at_slot(start, 6)
+    second_worker = playout(tmp_path, monitor)
+    playlist = second_worker.playlist("nrk1", "/")
+    assert "#EXT-X-DISCONTINUITY-SEQUENCE:1" in playlist
+    assert first_worker.playlist("nrk1", "/") == playlist
+
+    #A worker whose clock lags a slot behind counts back from the stored position, to what a single worker served
+    (tmp_path / "reference").mkdir()
+    reference, reference_monitor, _ = setup(tmp_path / "reference")
+    for slots in (2, 4, 5):
+        reference_monitor.now = at_slot(start, slots)
+        expected = reference.playlist("nrk1", "/")
+
+    monitor.now = at_slot(start, 5)
+    assert playout(tmp_path, monitor).playlist("nrk1", "/") == expected
+    assert first_worker.playlist("nrk1", "/") == expected
+
+def test_no_playlist_without_a_segmented_test_card(tmp_path):
+    playout, monitor, start = setup(tmp_path)
+    (playout.paths.get_filler_hls_dir() / SEGMENT_PLAYLIST).unlink()
+
+    monitor.now = at_slot(start, 2)
+    assert playout.playlist("nrk1") is None
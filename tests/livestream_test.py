@@ -0,0 +1,110 @@
+from tvcore.livestream import RingBuffer, ChannelProducer, LiveStreamer
+from tvcore.channeltimeline import ChannelTimeline
+from tvcore.mediapathmanager import MediaPathManager
+from datetime import datetime, timedelta
+import pytest
+import sys
+import time
+
+day = datetime(2026, 3, 2)
+
+class FakeMonitor:
+    channels = ["nrk1"]
+
+    def __init__(self, programs, times):
+        self.timeline = ChannelTimeline(programs, day, day + timedelta(days=1))
+        self.times = list(times)
+
+    def get_current_time(self):
+        #The last time repeats, so the clock stops there
+        return self.times.pop(0) if len(self.times) > 1 else self.times[0]
+
+    def get_timeline(self, now):
+        return self.timeline
+
+class EchoProducer(ChannelProducer):
+    """Writes the name of the file it would encode instead of running ffmpeg"""
+    def _ffmpeg_command(self, source, offset, duration, loop):
+        return [sys.executable, "-c", f"import sys; sys.stdout.write({source.name + chr(10)!r})"]
+
+def test_ring_buffer_readers_follow_wraparound():
+    buffer = RingBuffer(capacity_bytes=8)
+    cursor = buffer.oldest()
+
+    read = []
+    for i in range(10):
+        buffer.write(bytes([i]) * 4)
+        cursor, chunks = buffer.read(cursor, timeout=0)
+        read += chunks
+
+    #Only two chunks fit, but a reader that keeps up sees every one of them in order
+    assert read == [bytes([i]) * 4 for i in range(10)]
+    assert buffer.oldest() == 8
+    assert buffer.read(cursor, timeout=0) == (cursor, [])
+
+def test_ring_buffer_overrun_skips_to_oldest():
+    buffer = RingBuffer(capacity_bytes=8)
+    for i in range(5):
+        buffer.write(bytes([i]) * 4)
+
+    cursor, chunks = buffer.read(0, timeout=0)
+    assert cursor == 5
+    assert chunks == [bytes([3]) * 4, bytes([4]) * 4]
+
+    buffer.close()
+    assert buffer.read(cursor, timeout=1) == (5, [])
+
+def test_producer_switches_to_filler_at_schedule_boundary(tmp_path):
+    paths = MediaPathManager(download_path=tmp_path / "downloads")
+    (paths.download_path / "ads").mkdir()
+    (paths.download_path / "ads" / "PM5544.mp4").write_bytes(b"")
+    (paths.series_path / "program.mp4").write_bytes(b"")
+
+    start = day + timedelta(hours=20)
+    program = {"id": 1, "channel": "nrk1", "start": start, "end": start + timedelta(minutes=30), "duration": 1800, "filepath": "series/program.mp4"}
+    later = {**program, "id": 2, "start": start + timedelta(hours=1), "end": start + timedelta(hours=2)}
+    monitor = FakeMonitor([program, later], [start + timedelta(minutes=29, seconds=50), start + timedelta(minutes=30)])
+
+    producer = EchoProducer("nrk1", monitor, paths, buffer_bytes=1024, idle_timeout=60)
+    assert producer._next_segment() == (paths.series_path / "program.mp4", 1790, 10, False)
+    assert producer._next_segment() == (paths.download_path / "ads" / "PM5544.mp4", 0, 1800, True)
+
+    monitor.times = [start + timedelta(minutes=29, seconds=50), start + timedelta(minutes=30)]
+    producer.readers = 1
+    producer.start()
+
+    output, cursor = b"", 0
+    deadline = time.monotonic() + 5
+    while output.count(b"\n") < 2 and time.monotonic() < deadline:
+        cursor, chunks = producer.buffer.read(cursor, timeout=0.5)
+        output += b"".join(chunks)
+    producer.stop()
+
+    assert output.split(b"\n")[:2] == [b"program.mp4", b"PM5544.mp4"]
+
+def test_unknown_channels_start_no_producer():
+    streamer = LiveStreamer(FakeMonitor([], []), paths=object(), max_clients=0)
+
+    with pytest.raises(KeyError):
+        streamer.stream("made-up")
+    assert streamer.stream("nrk1") is None #No free client slot
+    assert streamer._producers == {}
+
+def test_unread_streams_release_their_slot(monkeypatch):
+    from flask import Flask, Response
+    monkeypatch.setattr(ChannelProducer, "start", lambda self: setattr(self, "is_running", True))
+    streamer = LiveStreamer(FakeMonitor([], []), paths=object(), max_clients=2)
+
+    app = Flask(__name__)
+    app.add_url_rule("/live/<channel>.ts", view_func=lambda channel: Response(streamer.stream(channel), mimetype="video/mp2t"))
+    client = app.test_client()
+
+    #HEAD never iterates the body, and neither does a client that leaves before the first chunk
+    for _ in range(3):
+        response = client.head("/live/nrk1.ts")
+        assert response.status_code == 200
+        response.close() #What the WSGI server does once the response is sent
+    streamer.stream("nrk1").close()
+
+    assert streamer._clients == 0
+    assert streamer._producers["nrk1"].readers == 0
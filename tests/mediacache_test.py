@@ -0,0 +1,65 @@
+from tvcore.mediacache import HotMediaCache
+from datetime import datetime, timedelta
+import os
+
+def media(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(bytes(range(256)) * (size // 256))
+    return path
+
+def test_heads_fit_the_budget_and_far_programs_go_first(tmp_path):
+    cache = HotMediaCache(budget_bytes=512 + 2 * 1024, head_bytes=1024)
+    now = datetime(2026, 3, 2, 20)
+
+    card = media(tmp_path, "card.mp4", 512)
+    soon = media(tmp_path, "soon.mp4", 4096)
+    later = media(tmp_path, "later.mp4", 4096)
+    latest = media(tmp_path, "latest.mp4", 4096)
+
+    cache.warm(card, whole=True)
+    cache.warm(later, air_time=now + timedelta(hours=2))
+    cache.warm(soon, air_time=now)
+    for entry in cache._entries.values():
+        entry.last_wanted = 0 #All asked for in the same warm cycle
+    cache.warm(latest, air_time=now + timedelta(hours=3))
+
+    assert cache.get(card).whole
+    assert cache.get(later) is None #Airs furthest away among those not asked for again
+    assert len(cache.get(soon).data) == 1024
+    assert cache.get(latest) is not None
+    assert cache._size == 512 + 2 * 1024
+
+def test_read_range_serves_the_cached_head(tmp_path):
+    cache = HotMediaCache(budget_bytes=4096, head_bytes=1024)
+    path = media(tmp_path, "program.mp4", 4096)
+    cache.warm(path)
+
+    assert cache.read_range(path, 0, 100) == (path.read_bytes()[:100], 4096)
+    assert cache.read_range(path, 1000, 2000) == (path.read_bytes()[1000:1024], 4096)
+    assert cache.read_range(path, 1024, 2000) is None
+
+def test_hits_do_not_touch_the_disk(tmp_path, monkeypatch):
+    cache = HotMediaCache(budget_bytes=4096, head_bytes=1024)
+    path = media(tmp_path, "card.mp4", 1024)
+    cache.warm(path, whole=True)
+
+    def stat(*args, **kwargs):
+        raise AssertionError("stat on a cache hit")
+    monkeypatch.setattr(os, "stat", stat)
+
+    assert cache.get(path).data == path.read_bytes()
+    assert cache.read_range(path, 0, 10)[1] == 1024
+
+def test_rewritten_files_are_not_served_stale(tmp_path):
+    cache = HotMediaCache(budget_bytes=4096, head_bytes=1024)
+    path = media(tmp_path, "program.mp4", 1024)
+    cache.warm(path, whole=True)
+
+    path.write_bytes(b"new download")
+    os.utime(path, (0, 0))
+
+    #Requests don't stat the file, the warm loop's revalidation catches the change
+    assert cache.get(path) is not None
+    cache.revalidate()
+    assert cache.get(path) is None
+    assert cache._size == 0
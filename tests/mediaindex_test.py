@@ -0,0 +1,44 @@
+from tvcore.mediaindex import MediaIndex
+from tvcore import filehandler
+from tvcore.filehandler import TVFileHandler
+from tvcore.broadcastmonitor import BroadcastMonitor
+from datetime import datetime, timedelta
+import subprocess
+
+index = MediaIndex(120.5, [(0.0, 48), (2.0, 9000), (4.04, 18000)])
+
+def test_keyframe_before():
+    assert index.keyframe_before(0) == (0.0, 48)
+    assert index.keyframe_before(3.9) == (2.0, 9000)
+    assert index.keyframe_before(4.04) == (4.04, 18000)
+    assert index.keyframe_before(100) == (4.04, 18000)
+    assert MediaIndex(10).keyframe_before(5) is None
+
+class IndexedMonitor:
+    get_media_index = lambda self, filepath: index
+    calculate_offset = BroadcastMonitor.calculate_offset
+    calculate_keyframe_offset = BroadcastMonitor.calculate_keyframe_offset
+
+def test_offset_past_the_end_of_the_file_is_not_snapped():
+    start = datetime(2026, 3, 2, 20)
+    program = {"filepath": "series/serie/ep.mp4", "start": start}
+
+    assert IndexedMonitor().calculate_keyframe_offset(program, start + timedelta(seconds=3)) == (2.0, 9000)
+    #The schedule slot is rounded up past the file's end, where the player has to switch to the test card
+    assert IndexedMonitor().calculate_keyframe_offset(program, start + timedelta(seconds=125)) == (125, None)
+
+def test_sidecar_round_trip(tmp_path):
+    media = tmp_path / "seriesid1_episodeid2.mp4"
+    index.save(media)
+
+    assert MediaIndex.sidecar_path(media).name == "seriesid1_episodeid2.index.json"
+    assert MediaIndex.load(media) == index
+    assert MediaIndex.load(tmp_path / "other.mp4") is None
+
+def test_unknown_duration_is_not_indexed(tmp_path, monkeypatch):
+    outputs = iter(["N/A\n", "0.000000,48,K__\n"])
+    monkeypatch.setattr(filehandler.subprocess, "run", lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, next(outputs), ""))
+
+    media = tmp_path / "truncated.mp4"
+    assert TVFileHandler.__new__(TVFileHandler).build_media_index(media) is None
+    assert not MediaIndex.sidecar_path(media).exists()
@@ -0,0 +1,53 @@
+from tvcore.microcache import MicroCache
+import threading
+import time
+
+def test_concurrent_misses_compute_once():
+    cache = MicroCache(ttl=5)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return "body"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("nrk1", compute))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["body"] * 20
+
+def test_entries_expire():
+    cache = MicroCache(ttl=0.01)
+    cache.get_or_compute("nrk1", lambda: "old")
+    time.sleep(0.02)
+
+    assert cache.get("nrk1") is None
+    assert cache.get_or_compute("nrk1", lambda: "new") == "new"
+
+def test_prune_keeps_size_bounded():
+    cache = MicroCache(ttl=5, max_entries=3)
+    for i in range(10):
+        cache.get_or_compute(i, lambda: i)
+
+    assert len(cache._entries) <= 3
+    assert cache.get(9) == 9
+
+def test_failed_computations_leave_no_lock():
+    cache = MicroCache(ttl=5)
+
+    def fail():
+        raise RuntimeError("database is locked")
+
+    for _ in range(3):
+        try:
+            cache.get_or_compute("nrk1", fail)
+        except RuntimeError:
+            pass
+
+    assert cache._key_locks == {}
+    assert cache.get_or_compute("nrk1", lambda: "body") == "body"
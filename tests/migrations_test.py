@@ -0,0 +1,27 @@
+from pathlib import Path
+import subprocess
+import sqlite3
+import sys
+
+def test_workers_starting_together_migrate_once(tmp_path):
+    db_path = tmp_path / "tv.db"
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", f"from tvcore.tvdatabase import TVDatabase; TVDatabase(db_path={str(db_path)!r})"],
+            cwd=Path(__file__).parent.parent,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        for _ in range(4)
+    ]
+    for worker in workers:
+        _, errors = worker.communicate(timeout=60)
+        assert worker.returncode == 0, errors
+
+    connection = sqlite3.connect(db_path)
+    revisions = connection.execute("SELECT version_num FROM alembic_version").fetchall()
+    channels = connection.execute("SELECT count(*) FROM channels").fetchone()
+    connection.close()
+
+    assert len(revisions) == 1
+    assert channels == (3,)
@@ -0,0 +1,81 @@
+from tvcore.tvdatabase import TVDatabase, Series
+from tvcore.nrkmanager import NRKManager
+from tvcore.schemas import NRKInput
+from sqlalchemy import event, text
+
+def program(program_id, series_id=None, day=8, hour=20, status="available", title=None):
+    return NRKInput.model_validate({
+        "programId": program_id,
+        "seriesId": series_id,
+        "title": title or program_id,
+        "seriesTitle": series_id,
+        "plannedStart": f"/Date({1001959200000 + ((day - 1) * 24 + hour) * 3600000}+0200)/",
+        "reRun": False,
+        "duration": "PT30M",
+        "description": None,
+        "category": {"displayValue": "Drama"},
+        "availability": {"status": status},
+    })
+
+def manager(db):
+    nrk = NRKManager.__new__(NRKManager)
+    nrk.db = db
+    nrk.channel = "nrk1"
+    return nrk
+
+def table_rows(db):
+    with db.engine.connect() as connection:
+        return {
+            table: connection.execute(text(f"SELECT * FROM {table} ORDER BY id")).all()
+            for table in ("series", "episodes", "movies", "schedule")
+        }
+
+def test_bulk_ingest_matches_per_program_inserts(tmp_path):
+    programs = [
+        program("EP1", "serie", hour=18),
+        program("EP2", "serie", hour=19),
+        program("EP1", "serie", day=9), #Rerun of an episode
+        program("FILM", hour=21),
+        program("FILM", hour=21), #Same slot twice
+        program("GONE", hour=22, status="unavailable"),
+    ]
+
+    one_by_one = TVDatabase(db_path=tmp_path / "one.db")
+    one_by_one.add(Series(title="Existing", slug="serie"), ["slug"])
+    for entry in programs:
+        manager(one_by_one).insert_database(entry)
+
+    bulk = TVDatabase(db_path=tmp_path / "bulk.db")
+    bulk.add(Series(title="Existing", slug="serie"), ["slug"])
+
+    statements = []
+    event.listen(bulk.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    manager(bulk).insert_programs(programs)
+
+    assert len(statements) <= 10 #A lookup and an insert per table, the originals the unavailable program could rerun, and the version bump
+    assert table_rows(bulk) == table_rows(one_by_one)
+
+    manager(bulk).insert_programs(programs)
+    assert table_rows(bulk) == table_rows(one_by_one)
+
+def test_reruns_are_linked_to_their_original(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    manager(db).insert_programs([program("EP1", "serie", day=8), program("FILM", day=8, hour=22)])
+
+    rerun = program("EP1", "serie", day=10, status="unavailable")
+    rerun.channel = "nrk2"
+    manager(db).insert_programs([
+        rerun,
+        program("FILM", day=9, hour=22, status="unavailable"),
+        program("FILM", day=20, status="unavailable"), #Too long after
+        program("OTHER", day=9, status="unavailable"),
+        program("EP2", "serie", day=11, status="unavailable", title="EP1"), #Another episode with the same title
+        program("FILM2", day=10, hour=22, status="unavailable", title="FILM"),
+    ])
+
+    episode, movie, movie_rerun, episode_rerun = db.get_schedule()
+    assert episode_rerun.channel == "nrk2"
+    assert episode_rerun.rerun_of == episode.id
+    assert episode_rerun.episode_id == episode.episode_id
+    assert movie_rerun.rerun_of == movie.id
+    assert movie_rerun.movie_id == movie.movie_id
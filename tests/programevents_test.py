@@ -0,0 +1,32 @@
+from tvcore.programevents import ProgramEventHub
+import threading
+import time
+
+def test_listeners_get_events_of_their_channel():
+    hub = ProgramEventHub(keepalive=5)
+    listener = hub.listen("nrk1")
+
+    timer = threading.Timer(0.05, lambda: (hub.publish("nrk2", {"title": "Other"}), hub.publish("nrk1", {"title": "News"})))
+    timer.start()
+    started = time.monotonic()
+
+    assert next(listener) == (1, {"title": "News"})
+    assert time.monotonic() - started < 1
+
+def test_keepalive_when_nothing_happens():
+    hub = ProgramEventHub(keepalive=0.05)
+    hub.publish("nrk1", {"title": "News"})
+
+    assert next(hub.listen("nrk1")) == (1, None)
+
+def test_resumes_from_last_sequence():
+    hub = ProgramEventHub(keepalive=0.05)
+    hub.publish("nrk1", {"title": "News"})
+    hub.publish("nrk1", {"title": "Weather"})
+
+    #A client that saw the first event gets the latest one at once, and then waits for the next
+    listener = hub.listen("nrk1", last_sequence=1)
+    assert next(listener) == (2, {"title": "Weather"})
+    assert next(listener) == (2, None)
+
+    assert next(hub.listen("nrk1", last_sequence=2)) == (2, None)
@@ -0,0 +1,63 @@
+from tvcore import tvdatabase
+from tvcore.tvdatabase import TVDatabase, Series, Episode
+from sqlalchemy import event
+from pathlib import Path
+import subprocess
+import sys
+
+def count_statements(db):
+    statements = []
+    event.listen(db.engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+def test_repeated_reads_are_cached(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    db.add(Series(title="a"))
+    db.get_series()
+
+    statements = count_statements(db)
+    db.get_series()
+    db.get_series()
+
+    assert not [statement for statement in statements if "FROM series" in statement]
+
+def test_writes_invalidate(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    db.add(Series(title="a"))
+    assert len(db.get_series()) == 1
+
+    db.add(Series(title="b"))
+    assert len(db.get_series()) == 2
+
+def test_writes_from_other_processes_invalidate(tmp_path, monkeypatch):
+    monkeypatch.setattr(tvdatabase, "VERSION_CHECK_INTERVAL", 0)
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    db.add(Series(title="a"))
+    assert len(db.get_series()) == 1
+
+    subprocess.run(
+        [sys.executable, "-c", f"from tvcore.tvdatabase import TVDatabase, Series; TVDatabase(db_path={str(tmp_path / 'tv.db')!r}).add(Series(title='b'))"],
+        cwd=Path(__file__).parent.parent,
+        check=True
+    )
+
+    assert len(db.get_series()) == 2
+
+def test_versions_are_bumped_once_per_transaction(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    before = db.get_table_version("series"), db.get_table_version("episodes")
+
+    statements = count_statements(db)
+    series_ids = db.add_many([Series(title=str(i)) for i in range(50)])
+    db.add_many([Episode(series_id=series_id) for series_id in series_ids])
+
+    assert len([statement for statement in statements if "table_versions" in statement and statement.startswith("UPDATE")]) == 2
+    assert (db.get_table_version("series"), db.get_table_version("episodes")) == (before[0] + 1, before[1] + 1)
+
+def test_cached_results_are_copies(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    channels = db.get_registered_channels()
+    channels[0].name = "changed"
+    channels.pop()
+
+    assert [channel.name for channel in db.get_registered_channels()] == ["nrk1", "nrk2", "cable"]
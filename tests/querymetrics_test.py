@@ -0,0 +1,24 @@
+from tvcore.querymetrics import QueryMetrics, normalize_sql
+from tvcore.tvdatabase import TVDatabase, Series
+
+def test_normalize_collapses_parameter_lists():
+    assert normalize_sql("SELECT * FROM schedule\n WHERE status IN (?, ?, ?)") == "SELECT * FROM schedule WHERE status IN (?...)"
+    assert normalize_sql("INSERT INTO series (title) VALUES (?), (?), (?)") == normalize_sql("INSERT INTO series (title) VALUES (?), (?)")
+
+def test_records_statements_and_callers(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    metrics = QueryMetrics()
+    metrics.attach(db.engine)
+    try:
+        db.add(Series(title="a"))
+        db.get_movies()
+    finally:
+        metrics.detach(db.engine)
+
+    statements = metrics.snapshot()["statements"]
+    insert = next(stats for stats in statements if stats["sql"].startswith("INSERT INTO series"))
+
+    assert insert["count"] == 1
+    assert insert["rows"] == 1
+    assert insert["callers"] == {"add": 1}
+    assert any(stats["callers"].get("get_movies") for stats in statements)
@@ -0,0 +1,55 @@
+from tvcore.tvdatabase import TVDatabase
+from sqlalchemy import event
+from datetime import date, datetime
+import pytest
+
+@pytest.fixture
+def db(tmp_path):
+    return TVDatabase(db_path=tmp_path / "tv.db")
+
+def query_plan(db, query, *args, **kwargs) -> str:
+    """Runs a TVDatabase query method and returns the EXPLAIN QUERY PLAN of the first statement it executed, skipping version checks"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        query(*args, **kwargs)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+
+    statement, parameters = next((statement, parameters) for statement, parameters in statements if "table_versions" not in statement)
+    with db.engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+
+    return "\n".join(row[-1] for row in rows)
+
+def test_current_program_uses_channel_index(db):
+    plan = query_plan(db, db.get_current_program_by_channel, "nrk1", datetime(2026, 3, 2, 20))
+    assert "ix_schedule_channel_status_start" in plan
+
+def test_next_program_uses_channel_index(db):
+    plan = query_plan(db, db.get_next_program_by_channel, "nrk1", datetime(2026, 3, 2, 20))
+    assert "ix_schedule_channel_status_start" in plan
+
+def test_schedule_conflict_uses_channel_index(db):
+    plan = query_plan(db, db.get_schedule_conflict, "nrk1", datetime(2026, 3, 2, 20))
+    assert "ix_schedule_channel_status_start" in plan
+
+def test_pending_programs_use_status_index(db):
+    plan = query_plan(db, db.get_pending_programs, strict=True, date=date(2026, 3, 2))
+    assert "ix_schedule_status_start" in plan
+
+def test_schedule_by_day_uses_start_index(db):
+    plan = query_plan(db, db.get_schedule, date=date(2026, 3, 2))
+    assert "ix_schedule_start" in plan
+
+def test_week_schedule_uses_status_index(db):
+    plan = query_plan(db, db.get_current_week_schedule, date=datetime(2026, 3, 2))
+    assert "ix_schedule_status_start" in plan
+
+def test_episodes_by_series_use_series_index(db):
+    plan = query_plan(db, db.get_episodes, series_id=1)
+    assert "ix_episodes_series_id" in plan
@@ -0,0 +1,87 @@
+from tvcore.tvdatabase import TVDatabase, Series, Episode, Movie, Schedule
+from tvcore.mediapathmanager import MediaPathManager
+from tvcore.reconciler import ScheduleReconciler
+from tvcore.tvconstants import *
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from pathlib import Path
+
+def setup(tmp_path):
+    db = TVDatabase(db_path=tmp_path / "tv.db")
+    paths = MediaPathManager(download_path=tmp_path / "downloads")
+
+    series_id, = db.add_many([Series(title="Serie", slug="serie")])
+    episode_id, = db.add_many([Episode(series_id=series_id, title="Episode", program_id="EP1")])
+    movie_id, = db.add_many([Movie(title="Film", slug="film")])
+
+    start = datetime.now() + timedelta(hours=1)
+    ids = db.add_many([
+        Schedule(title="Episode", channel="nrk1", start=start, end=start, episode_id=episode_id),
+        Schedule(title="Film", channel="nrk1", start=start, end=start, movie_id=movie_id, status=STATUS_AVAILABLE, filepath="movies/film/movieid1.mp4", file_size=3),
+    ])
+
+    episode_file = paths.series_path / "serie" / f"seriesid{series_id}_episodeid{episode_id}.mp4"
+    episode_file.parent.mkdir(parents=True)
+    episode_file.write_bytes(b"12345")
+
+    return db, paths, ids
+
+def test_verify_applies_changes_in_one_statement(tmp_path):
+    db, paths, (episode_entry, movie_entry) = setup(tmp_path)
+    reconciler = ScheduleReconciler(db, paths)
+
+    updates = []
+    event.listen(db.engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statement.startswith("UPDATE schedule") and updates.append(statement))
+    report = reconciler.verify()
+
+    assert report.available == [episode_entry]
+    assert report.missing == [movie_entry]
+    assert len(updates) == 1
+
+    episode = db.get_schedule(schedule_id=episode_entry)
+    assert episode.status == STATUS_AVAILABLE
+    assert episode.file_size == 5
+    assert db.get_schedule(schedule_id=movie_entry).filepath is None
+
+    assert not reconciler.verify().updated
+
+def test_cleanup_deletes_files_and_marks_rows(tmp_path):
+    db, paths, (episode_entry, _) = setup(tmp_path)
+    reconciler = ScheduleReconciler(db, paths)
+    reconciler.verify()
+
+    report = reconciler.cleanup([db.get_schedule(schedule_id=episode_entry)])
+
+    assert report.deleted == [episode_entry]
+    assert not any(paths.series_path.rglob("*.mp4"))
+    assert db.get_schedule(schedule_id=episode_entry).status == STATUS_DELETED
+
+def test_snapshot_lists_only_media_files(tmp_path):
+    db, paths, _ = setup(tmp_path)
+    program = paths.series_path / "serie"
+    (program / "seriesid1_episodeid1.index.json").write_text("{}")
+    (program / "seriesid1_episodeid1_hls").mkdir()
+    (program / "seriesid1_episodeid1_hls" / "00001.ts").write_bytes(b"")
+    (paths.download_path / "notes.txt").write_text("")
+
+    assert list(ScheduleReconciler(db, paths).snapshot()) == [str(Path("series") / "serie" / "seriesid1_episodeid1.mp4")]
+
+def test_reruns_share_their_originals_file(tmp_path):
+    db, paths, (episode_entry, movie_entry) = setup(tmp_path)
+    original = db.get_schedule(schedule_id=episode_entry)
+
+    later = original.start + timedelta(days=1)
+    rerun, = db.add_many([Schedule(title="Episode", channel="nrk2", start=later, end=later, episode_id=original.episode_id, rerun=True, rerun_of=episode_entry)])
+
+    #Only the original is downloaded
+    assert [program.id for program in db.get_pending_programs()] == [episode_entry]
+
+    ScheduleReconciler(db, paths).verify()
+    assert db.get_schedule(schedule_id=rerun).filepath == db.get_schedule(schedule_id=episode_entry).filepath
+
+    #The original has aired, but its file is kept for the rerun
+    db.update_many(Schedule, [{"id": episode_entry, "start": datetime.now() - timedelta(days=1)}])
+    assert episode_entry not in [program.id for program in db.get_obsolete_programs()]
+
+    db.update_many(Schedule, [{"id": rerun, "start": datetime.now() - timedelta(hours=1)}])
+    assert {program.id for program in db.get_obsolete_programs()} == {episode_entry, rerun}
@@ -0,0 +1,86 @@
+"""
+Compares the schedule output profiles on a seeded full week, doing what /api/schedule?full_week=true
+does on a cache miss: query, model_dump and JSON serialization.
+
+Run from the repository root:
+    python -m tests.schedule_benchmark [--channels 3] [--programs-per-day 30] [--repeat 20]
+"""
+from tvcore.tvdatabase import TVDatabase, Series, Episode, Movie, Schedule
+from tvcore.tvconstants import STATUS_AVAILABLE
+from datetime import datetime, timedelta
+from sqlalchemy import event
+import argparse
+import tempfile
+import time
+import json
+import os
+
+
+def seed(db: TVDatabase, channels: int, programs_per_day: int):
+    week_start = datetime.combine(datetime.today().date(), datetime.min.time())
+    week_start -= timedelta(days=week_start.weekday())
+
+    series_ids = db.add_many([Series(title=f"Serie {i}", description="Beskrivelse " * 20) for i in range(20)])
+    movie_ids = db.add_many([Movie(title=f"Film {i}", description="Beskrivelse " * 20, duration=5400) for i in range(20)])
+    episode_ids = db.add_many([
+        Episode(series_id=series_ids[i % 20], program_id=f"EP{i}", title=f"Episode {i}", season_number=1, episode_number=i, description="Beskrivelse " * 20, duration=1800)
+        for i in range(400)
+    ])
+
+    minutes = 24 * 60 // programs_per_day
+    entries = []
+    for channel in range(channels):
+        for day in range(7):
+            for slot in range(programs_per_day):
+                start = week_start + timedelta(days=day, hours=6, minutes=slot * minutes)
+                i = len(entries)
+                entries.append(Schedule(
+                    title=f"Program {i}",
+                    channel=f"ch{channel}",
+                    start=start,
+                    end=start + timedelta(minutes=minutes),
+                    status=STATUS_AVAILABLE,
+                    episode_id=episode_ids[i % 400] if i % 5 else None,
+                    movie_id=movie_ids[i % 20] if not i % 5 else None,
+                ))
+    db.add_many(entries)
+
+
+def run(db: TVDatabase, profile: str, repeat: int) -> tuple[float, int, int, int]:
+    """Returns (ms per call, rows, statements per call, response bytes)"""
+    statements = 0
+
+    def count(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        rows = db.get_current_week_schedule(full_week=True, profile=profile)
+        body = json.dumps([row.model_dump() for row in rows], default=str)
+    elapsed = time.perf_counter() - started
+    event.remove(db.engine, "before_cursor_execute", count)
+
+    return elapsed / repeat * 1000, len(rows), statements // repeat, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--programs-per-day", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = TVDatabase(db_path=os.path.join(tmp, "tv.db"))
+        seed(db, args.channels, args.programs_per_day)
+
+        print(f"{'profile':<8}{'ms/call':>10}{'rows':>8}{'queries':>9}{'bytes':>10}")
+        for profile in ("full", "guide", "slim"):
+            ms, rows, statements, size = run(db, profile, args.repeat)
+            print(f"{profile:<8}{ms:>10.1f}{rows:>8}{statements:>9}{size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+from .tvdatabase import TVDatabase, TableVersion, Schedule, VERSION_CHECK_INTERVAL, _apply_pragmas
+from .schemas import ChannelOutput, ScheduleOutput, ScheduleSlim, ScheduleGuide, ScheduleProfile
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, Dict
+from weakref import WeakKeyDictionary
+import asyncio
+import logging
+import time
+
+
+class AsyncTVDatabase:
+    """
+    asyncio counterpart of TVDatabase's read methods, on aiosqlite, for the streaming and API endpoints.
+
+    Builds the same queries (TVDatabase's _*_query builders) and returns the same schemas, so both
+    can be used side by side. Writes, schema setup and migrations stay with TVDatabase.
+
+    The engine is opened on first use in a loop and belongs to the caller: await dispose(), or use
+    `async with`, before the loop finishes. Each pooled aiosqlite connection holds a worker thread
+    that is only stopped by disposing.
+    """
+    # One async engine per event loop and database file, shared by every AsyncTVDatabase. Keyed weakly on the
+    # loop itself, so a new loop never gets an engine bound to a finished one.
+    _engines: WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Path, tuple[AsyncEngine, async_sessionmaker]]] = WeakKeyDictionary()
+
+    def __init__(self, db_path=""):
+        #The sync database creates the file and applies migrations, and owns the table versions
+        self.sync_db = TVDatabase(db_path=db_path)
+        self.db_path = self.sync_db.db_path
+
+    def _get_engine(self) -> tuple[AsyncEngine, async_sessionmaker]:
+        engines = self._engines.setdefault(asyncio.get_running_loop(), {})
+        key = self.db_path.resolve()
+
+        if key not in engines:
+            engine = create_async_engine(f"sqlite+aiosqlite:///{key}", echo=False)
+            event.listen(engine.sync_engine, "connect", _apply_pragmas)
+            engines[key] = (engine, async_sessionmaker(engine, expire_on_commit=False))
+
+        return engines[key]
+
+    def get_session(self) -> AsyncSession:
+        return self._get_engine()[1]()
+
+    async def dispose(self):
+        """Closes the pooled connections of this database on the running event loop, before the loop shuts down"""
+        engines = self._engines.get(asyncio.get_running_loop(), {})
+        entry = engines.pop(self.db_path.resolve(), None)
+        if entry:
+            await entry[0].dispose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.dispose()
+
+    # VERSIONING
+
+    async def get_table_version(self, table: str) -> int:
+        """Returns the number of committed transactions that wrote to a table, by any process"""
+        return (await self._get_versions()).get(table, (0, None))[0]
+
+    async def get_table_modified(self, table: str) -> datetime:
+        """Returns when a table was last written (UTC)"""
+        modified = (await self._get_versions()).get(table, (0, None))[1]
+        if modified is None:
+            return datetime.fromtimestamp(0, timezone.utc)
+        return modified.replace(tzinfo=timezone.utc)
+
+    async def _get_versions(self) -> Dict[str, tuple[int, datetime]]:
+        """Reads table_versions without blocking the loop, sharing TVDatabase's snapshot so both see the same versions"""
+        key = self.sync_db._db_key
+        snapshot = TVDatabase._version_snapshots.get(key)
+        if snapshot is not None and time.monotonic() - snapshot[0] < VERSION_CHECK_INTERVAL:
+            return snapshot[1]
+
+        async with self.get_session() as session:
+            rows = (await session.execute(select(TableVersion.table_name, TableVersion.version, TableVersion.modified))).all()
+
+        versions = {table: (version, modified) for table, version, modified in rows}
+        TVDatabase._version_snapshots[key] = (time.monotonic(), versions)
+        return versions
+
+    # QUERIES
+
+    async def _execute(self, query, model=None, first=False):
+        async with self.get_session() as session:
+            try:
+                result = await session.execute(query)
+                if first:
+                    return result.scalars().first()
+                results = result.scalars().all()
+            except Exception as e:
+                logging.error(f"Database query failed: {e}")
+                return []
+
+            if model is None:
+                return results
+
+            return TVDatabase._validate(results, model)
+
+    async def _execute_profile(self, query, profile: ScheduleProfile) -> List[ScheduleOutput] | List[ScheduleSlim] | List[ScheduleGuide]:
+        if profile == "full":
+            return await self._execute(query, ScheduleOutput)
+
+        async with self.get_session() as session:
+            try:
+                rows = (await session.execute(query)).mappings().all()
+            except Exception as e:
+                logging.error(f"Database query failed: {e}")
+                return []
+
+        return TVDatabase._validate_profile(rows, profile)
+
+    async def _first_mapping(self, query) -> dict | None:
+        async with self.get_session() as session:
+            result = (await session.execute(query)).mappings().first()
+            return dict(result) if result else None
+
+    # SCHEDULE OPERATIONS
+
+    async def get_obsolete_programs(self) -> list[ScheduleOutput]:
+        """Returns available episodes and movies that have aired and are not planned again"""
+        episodes = await self._execute(TVDatabase._obsolete_query(Schedule.episode_id), ScheduleOutput)
+        movies = await self._execute(TVDatabase._obsolete_query(Schedule.movie_id), ScheduleOutput)
+        return episodes + movies
+
+    async def get_pending_programs(self, strict: bool = False, date: date = None) -> List[ScheduleOutput]:
+        return await self._execute(TVDatabase._pending_programs_query(strict, date), ScheduleOutput)
+
+    async def get_current_week_schedule(self, channel: str = None, date: datetime = None, full_week: bool = False, profile: ScheduleProfile = "full") -> List[ScheduleOutput] | List[ScheduleSlim] | List[ScheduleGuide]:
+        return await self._execute_profile(TVDatabase._current_week_query(channel, date, full_week, profile), profile)
+
+    async def get_schedule(self, schedule_id=None, date: datetime = None, channel: str = None, profile: ScheduleProfile = "full") -> List[ScheduleOutput] | List[ScheduleSlim] | List[ScheduleGuide]:
+        q = TVDatabase._schedule_query(schedule_id, date, channel, profile)
+
+        if schedule_id:
+            if profile == "full":
+                return await self._execute(q, ScheduleOutput, first=True)
+            return next(iter(await self._execute_profile(q, profile)), None)
+
+        return await self._execute_profile(q, profile)
+
+    async def get_current_program_by_channel(self, channel: str, time=None) -> dict | None:
+        return await self._first_mapping(TVDatabase._current_program_query(channel, time))
+
+    async def get_next_program_by_channel(self, channel: str, time: datetime = None, limit=1) -> dict | None:
+        return await self._first_mapping(TVDatabase._next_program_query(channel, time, limit))
+
+    async def get_programs_in_window(self, start: datetime, end: datetime) -> list[dict]:
+        """Returns available programs on all channels that overlap the window, ordered by channel and start"""
+        async with self.get_session() as session:
+            return [dict(row) for row in (await session.execute(TVDatabase._programs_in_window_query(start, end))).mappings().all()]
+
+    async def get_channels(self):
+        return await self._execute(TVDatabase._channels_query())
+
+    async def get_registered_channels(self, enabled_only=True) -> List[ChannelOutput]:
+        """Returns the channel registry in display order"""
+        return await self._execute(TVDatabase._registered_channels_query(enabled_only), ChannelOutput)
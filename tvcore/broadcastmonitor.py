@@ -1,11 +1,18 @@
 
 from .tvdatabase import TVDatabase, Schedule
 from .schemas import ScheduleOutput
+from .channeltimeline import ChannelTimeline
+from .programevents import ProgramEventHub
+from .mediaindex import MediaIndex
+from .mediapathmanager import MediaPathManager
 from .tvconstants import *
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import threading
 import time
 
+#Program fields that change every second. They are left out wherever a program is compared or validated.
+CLOCK_FIELDS = ("offset", "byte_offset", "next_in")
+
 class BroadcastMonitor:
     _instance = None
     _lock = threading.Lock()
@@ -17,7 +24,7 @@ class BroadcastMonitor:
                     cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self, time=None, time_acceleration=1, time_freeze=False, debug=False, loop_interval=1):
+    def __init__(self, time=None, time_acceleration=1, time_freeze=False, debug=False, loop_interval=1, timeline_days=2, timeline_refresh=60):
         self.debug = debug
         self.loop_interval = loop_interval
 
@@ -30,14 +37,30 @@ class BroadcastMonitor:
         
         self.is_broadcasting = False
 
-        self.channels = ["nrk1", "nrk2", "cable"] #TODO:Shouldn't be hardcoded
-        
         self.database = TVDatabase()
+        self.paths = MediaPathManager()
+
+        #Loaded once from the channel registry, in display order
+        self.channel_registry = self.database.get_registered_channels()
+        self.channels = [channel.name for channel in self.channel_registry]
+
+        #Timeline of upcoming programs, so now/next lookups don't hit the database
+        self.timeline_days = timeline_days #How many days ahead the timeline covers
+        self.timeline_refresh = timeline_refresh #Seconds between forced rebuilds, a safety net besides the schedule table version
+        self._timeline: ChannelTimeline | None = None
+        self._timeline_built = None
+        self._timeline_lock = threading.Lock()
+        self._media_indexes: dict[str, MediaIndex | None] = {}
+
+        #Push channel for program changes, fed by the monitor loop
+        self.events = ProgramEventHub()
+        self._published: dict[str, dict] = {}
 
     def start_monitoring(self):
-        if not self.is_broadcasting:
-            self.is_broadcasting = True
-            threading.Thread(target=self._monitor_loop, daemon=True).start()
+        with self._lock:
+            if not self.is_broadcasting:
+                self.is_broadcasting = True
+                threading.Thread(target=self._monitor_loop, daemon=True).start()
     
     def stop_monitoring(self):
         if self.is_broadcasting:
@@ -46,12 +69,26 @@ class BroadcastMonitor:
     def _monitor_loop(self):
         while self.is_broadcasting:
             self.current_time = self.get_current_time()
-            if self.debug:
-                for channel in self.channels:
-                    current = self.get_current_program(channel)
+
+            if self._timeline_built is None or (datetime.now() - self._timeline_built).total_seconds() >= self.timeline_refresh:
+                self.rebuild_timeline(self.current_time)
+
+            for channel in self.channels:
+                current = self.get_current_program(channel)
+                self._publish_if_changed(channel, current)
+
+                if self.debug:
                     print(f"Monitoring: {current['title']} at {current['channel']} at {self.current_time.strftime('%Y-%m-%d %H:%M:%S')}")
 
-            time.sleep(1)
+            time.sleep(self.loop_interval)
+
+    def _publish_if_changed(self, channel, program: dict):
+        """Publishes an event when the program on a channel changes, either at a boundary or by a schedule edit"""
+        signature = {key: value for key, value in program.items() if key not in CLOCK_FIELDS}
+
+        if self._published.get(channel) != signature:
+            self._published[channel] = signature
+            self.events.publish(channel, program)
 
     def get_current_time(self):
         """
@@ -76,22 +113,90 @@ class BroadcastMonitor:
         return self.test_time + simulated_time_elapsed
 
     
+    def get_timeline(self, now: datetime = None) -> ChannelTimeline:
+        """
+        Returns the in-memory timeline, rebuilding it only when the schedule has changed
+        or the current time has moved past the window it covers.
+        """
+        if now is None:
+            now = self.get_current_time()
+
+        timeline = self._timeline
+        if timeline is None or not self._timeline_valid(timeline, now):
+            timeline = self.rebuild_timeline(now, force=False)
+
+        return timeline
+
+    def rebuild_timeline(self, now: datetime = None, force=True) -> ChannelTimeline:
+        if now is None:
+            now = self.get_current_time()
+
+        with self._timeline_lock:
+            # Another thread may have rebuilt the timeline while we waited for the lock
+            if not force and self._timeline is not None and self._timeline_valid(self._timeline, now):
+                return self._timeline
+
+            version = self.database.get_table_version(Schedule.__tablename__)
+            window_start = now - timedelta(days=1)
+            window_end = now + timedelta(days=self.timeline_days)
+
+            programs = self.database.get_programs_in_window(window_start, window_end)
+            self._timeline = ChannelTimeline(programs, window_start, window_end, version)
+            self._timeline_built = datetime.now()
+            self._media_indexes = {}
+
+            return self._timeline
+
+    def _timeline_valid(self, timeline: ChannelTimeline, now: datetime) -> bool:
+        return timeline.covers(now) and timeline.version == self.database.get_table_version(Schedule.__tablename__)
+    
     def calculate_offset(self, start_time:datetime, current_time:datetime, buffer_seconds:int=10):
         offset = (current_time - start_time).seconds - buffer_seconds
         return max(0, offset)
+
+    def get_media_index(self, filepath: str) -> MediaIndex | None:
+        """Returns the keyframe index of a program file, loaded once per timeline"""
+        if filepath not in self._media_indexes:
+            self._media_indexes[filepath] = MediaIndex.load(self.paths.get_full_path(filepath))
+        return self._media_indexes[filepath]
+
+    def calculate_keyframe_offset(self, program: dict, current_time: datetime) -> tuple[float, int | None]:
+        """
+        Returns (offset, byte offset) of the last keyframe before the current position in the program,
+        so a joining player starts on a keyframe. Falls back to calculate_offset for files without an index.
+        Past the end of the file the raw elapsed time is returned, so the player sees offset > duration and shows the test card.
+        """
+        index = self.get_media_index(program["filepath"]) if program["filepath"] else None
+        elapsed = (current_time - program["start"]).total_seconds()
+
+        if index and elapsed > index.duration:
+            return elapsed, None
+
+        keyframe = index.keyframe_before(elapsed) if index else None
+
+        if keyframe is None:
+            return self.calculate_offset(program["start"], current_time), None
+
+        return keyframe
     
-    def get_current_program(self, channel):
-        now = self.get_current_time()
-        current_program = self.database.get_current_program_by_channel(channel, time=now)
+    def get_current_program(self, channel, now: datetime = None):
+        now = now or self.get_current_time()
+        timeline = self.get_timeline(now)
+        current_program = timeline.current(channel, now)
+
+        next_program = timeline.next(channel, now)
 
         if current_program:
-            current_program["offset"] = self.calculate_offset(current_program["start"], now)
+            current_program["offset"], current_program["byte_offset"] = self.calculate_keyframe_offset(current_program, now)
+            current_program["starts_at"] = current_program["start"].isoformat()
             current_program["start"] = current_program["start"].strftime("%H:%M")
             current_program["end"] = current_program["end"].strftime("%H:%M") 
+            self._add_next_hint(current_program, next_program, now)
 
             return current_program
 
         else:
+            previous_program = timeline.previous(channel, now)
             no_program = {
                 "id": STREAM_ID_NO_PROGRAM,
                 "status": "no_program",
@@ -99,15 +204,58 @@ class BroadcastMonitor:
                 "description": "Det er en stund til neste program starter. Sjekk TV-guide",
                 "filepath": None,
                 "channel": channel,
+                "starts_at": previous_program["end"].isoformat() if previous_program else None,
             }
 
-            next_program = self.database.get_next_program_by_channel(channel, time=now)
             if next_program:
                 start = next_program["start"].strftime("%H:%M")
                 no_program["description"] = f"Neste program starter {start}:\n {next_program["title"]}"
+            self._add_next_hint(no_program, next_program, now)
 
             return no_program
 
+    @staticmethod
+    def _add_next_hint(program: dict, next_program: dict | None, now: datetime):
+        """Tells the player what airs next and in how many seconds, so it can pre-buffer it before the boundary"""
+        if next_program is None:
+            program["next"] = None
+            program["next_in"] = None
+            return
+
+        program["next"] = {
+            "id": next_program["id"],
+            "title": next_program["title"],
+            "filepath": next_program["filepath"],
+            "start": next_program["start"].strftime("%H:%M"),
+            "starts_at": next_program["start"].isoformat(),
+        }
+        program["next_in"] = max(int((next_program["start"] - now).total_seconds()), 0)
+
+    def get_all_current_programs(self) -> dict:
+        """Returns now and next on every channel, all read from the timeline at the same instant of the monitor clock"""
+        now = self.get_current_time()
+        timeline = self.get_timeline(now)
+        channels = self.channels + [channel for channel in timeline.channels if channel not in self.channels]
+
+        return {
+            "time": now.isoformat(timespec="seconds"),
+            "channels": [self.get_current_program(channel, now) for channel in channels],
+        }
+
+    def get_neighbour_programs(self, channel: str, count: int = 1) -> list[dict]:
+        """Returns what airs now on the `count` channels on either side of a channel, nearest first"""
+        if channel not in self.channels:
+            return []
+
+        i = self.channels.index(channel)
+        neighbours = []
+        for distance in range(1, count + 1):
+            for neighbour in (self.channels[(i + distance) % len(self.channels)], self.channels[(i - distance) % len(self.channels)]):
+                if neighbour != channel and neighbour not in neighbours:
+                    neighbours.append(neighbour)
+
+        return [self.get_current_program(neighbour) for neighbour in neighbours]
+
     def update_air_date(self, program: ScheduleOutput):
         if program.last_aired != self.current_time.date().strftime("%Y-%m-%d"):
             self.database.upsert(
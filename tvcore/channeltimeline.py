@@ -0,0 +1,70 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+
+class ChannelTimeline:
+    """
+    Immutable in-memory index of the programs airing on every channel within a time window.
+
+    Built from a single query and kept per channel as a list of programs sorted by start time,
+    so "what is on now" and "what is on next" are answered with a bisect instead of a database query.
+    """
+    def __init__(self, programs: list[dict], window_start: datetime, window_end: datetime, version=None):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.version = version
+
+        self._programs: dict[str, list[dict]] = {}
+        for program in sorted(programs, key=lambda p: p["start"]):
+            self._programs.setdefault(program["channel"], []).append(program)
+
+        self._starts = {
+            channel: [program["start"] for program in programs]
+            for channel, programs in self._programs.items()
+        }
+
+    @property
+    def channels(self) -> list[str]:
+        return list(self._programs)
+
+    def covers(self, time: datetime, margin: timedelta = timedelta(hours=1)) -> bool:
+        """Whether lookups at the given time (and shortly after) can be answered from this timeline"""
+        return self.window_start <= time and time + margin < self.window_end
+
+    def current(self, channel: str, time: datetime) -> dict | None:
+        """Returns a copy of the program airing on the channel at the given time"""
+        starts = self._starts.get(channel)
+        if not starts:
+            return None
+
+        i = bisect_right(starts, time) - 1
+        if i >= 0:
+            program = self._programs[channel][i]
+            if program["end"] >= time:
+                return dict(program)
+
+        return None
+
+    def previous(self, channel: str, time: datetime) -> dict | None:
+        """Returns a copy of the last program on the channel that ended before the given time"""
+        starts = self._starts.get(channel)
+        if not starts:
+            return None
+
+        for program in reversed(self._programs[channel][:bisect_right(starts, time)]):
+            if program["end"] < time:
+                return dict(program)
+
+        return None
+
+    def next(self, channel: str, time: datetime, within: timedelta = timedelta(days=1)) -> dict | None:
+        """Returns a copy of the first program starting on the channel at or after the given time"""
+        starts = self._starts.get(channel)
+        if not starts:
+            return None
+
+        i = bisect_left(starts, time)
+        if i < len(starts) and starts[i] < time + within:
+            return dict(self._programs[channel][i])
+
+        return None
@@ -0,0 +1,89 @@
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+import gzip
+import json
+import time
+import os
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    fetched: float #Unix time the response was last fetched or revalidated
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class EPGCache:
+    """
+    On-disk cache of raw EPG responses per channel and date, gzipped, with the validators the upstream
+    sent (ETag, Last-Modified) in a sidecar so stale entries can be revalidated with a conditional request.
+    """
+    def __init__(self, cache_dir, max_age_days: float = 30):
+        cache_dir = Path(cache_dir)
+        if not cache_dir.is_absolute():
+            cache_dir = Path(__file__).parent.parent.absolute() / cache_dir
+
+        self.cache_dir = cache_dir
+        self.max_age = max_age_days * 24 * 60 * 60
+
+    def _paths(self, channel: str, day: date) -> tuple[Path, Path]:
+        directory = self.cache_dir / channel
+        return directory / f"{day}.json.gz", directory / f"{day}.meta.json"
+
+    def lookup(self, channel: str, day: date) -> CachedResponse | None:
+        body_path, meta_path = self._paths(channel, day)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            body = gzip.decompress(body_path.read_bytes())
+        except (OSError, ValueError):
+            return None
+
+        return CachedResponse(body, meta.get("etag"), meta.get("last_modified"), meta["fetched"])
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return time.time() - entry.fetched < self.max_age
+
+    @staticmethod
+    def conditional_headers(entry: CachedResponse | None) -> dict:
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store(self, channel: str, day: date, body: bytes, headers) -> CachedResponse:
+        entry = CachedResponse(body, headers.get("ETag"), headers.get("Last-Modified"), time.time())
+        body_path, _ = self._paths(channel, day)
+        body_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._write(body_path, gzip.compress(body))
+        self._write_meta(channel, day, entry)
+        return entry
+
+    def revalidated(self, channel: str, day: date, entry: CachedResponse, headers) -> CachedResponse:
+        """Marks an entry fresh again after a 304, taking any new validators"""
+        entry.etag = headers.get("ETag") or entry.etag
+        entry.last_modified = headers.get("Last-Modified") or entry.last_modified
+        entry.fetched = time.time()
+
+        self._write_meta(channel, day, entry)
+        return entry
+
+    def _write_meta(self, channel: str, day: date, entry: CachedResponse):
+        _, meta_path = self._paths(channel, day)
+        meta = {"etag": entry.etag, "last_modified": entry.last_modified, "fetched": entry.fetched}
+        self._write(meta_path, json.dumps(meta).encode())
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        #Written aside and renamed, so a crash never leaves a half-written entry
+        temporary = path.with_name(f"{path.name}.tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
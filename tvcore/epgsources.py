@@ -0,0 +1,100 @@
+from .nrkmanager import NRKManager, fetch_epg_async
+from .schemas import ChannelOutput, EPGConfig, NRKInput
+from abc import ABC, abstractmethod
+from datetime import date
+import asyncio
+import logging
+import time
+
+
+class EPGSource(ABC):
+    """
+    Adapter for one EPG provider. Subclasses fetch the programs of their channels and store them, and
+    are registered by name with register_source so channels in the registry can refer to them.
+    """
+    name: str = ""
+
+    def __init__(self, config: EPGConfig = None):
+        self.config = (config or EPGConfig()).for_source(self.name)
+
+    @abstractmethod
+    async def fetch(self, channels: list[ChannelOutput], dates: list[date]) -> dict[str, list[NRKInput]]:
+        """Returns the programs per channel name"""
+
+    @abstractmethod
+    def ingest(self, programs: list[NRKInput]):
+        """Stores the programs of all the source's channels, in one batch"""
+
+
+EPG_SOURCES: dict[str, type[EPGSource]] = {}
+
+def register_source(source: type[EPGSource]) -> type[EPGSource]:
+    EPG_SOURCES[source.name] = source
+    return source
+
+
+@register_source
+class NRKSource(EPGSource):
+    name = "nrk"
+
+    async def fetch(self, channels: list[ChannelOutput], dates: list[date]) -> dict[str, list[NRKInput]]:
+        by_source_channel = {channel.source_channel or channel.name: channel.name for channel in channels}
+
+        #NRK responses stay directly under cache_dir, where they were cached before there were other sources
+        fetched = await fetch_epg_async(list(by_source_channel), dates, self.config)
+
+        programs = {}
+        for source_channel, channel_programs in fetched.items():
+            for program in channel_programs:
+                program.channel = by_source_channel[source_channel]
+            programs[by_source_channel[source_channel]] = channel_programs
+        return programs
+
+    def ingest(self, programs: list[NRKInput]):
+        #One batch for all NRK channels, so reruns are linked across them
+        NRKManager().insert_programs(programs)
+
+
+async def fetch_all_async(channels: list[ChannelOutput], dates: list[date], config: EPGConfig = None) -> dict[str, dict[str, list[NRKInput]]]:
+    """
+    Fetches every channel with an EPG source, all sources at the same time, each with its own limits.
+    Returns the programs per source and channel name. A failing source is logged and left out.
+    """
+    by_source: dict[str, list[ChannelOutput]] = {}
+    for channel in channels:
+        if channel.epg_source is None:
+            continue
+        if channel.epg_source not in EPG_SOURCES:
+            logging.warning("Channel %s has unknown EPG source %s", channel.name, channel.epg_source)
+            continue
+        by_source.setdefault(channel.epg_source, []).append(channel)
+
+    sources = {name: EPG_SOURCES[name](config) for name in by_source}
+    results = await asyncio.gather(
+        *(source.fetch(by_source[name], dates) for name, source in sources.items()),
+        return_exceptions=True
+    )
+
+    fetched = {}
+    for name, result in zip(sources, results):
+        if isinstance(result, BaseException):
+            logging.error("Fetching EPG source %s failed: %s", name, result)
+            continue
+        fetched[name] = result
+    return fetched
+
+def ingest_all(channels: list[ChannelOutput], dates: list[date], config: EPGConfig = None) -> dict[str, list[NRKInput]]:
+    """Fetches all sources in parallel and stores each source's programs in one batch. Returns the programs per channel name."""
+    started = time.perf_counter()
+    fetched = asyncio.run(fetch_all_async(channels, dates, config))
+
+    programs = {}
+    for name, source_programs in fetched.items():
+        EPG_SOURCES[name](config).ingest([program for channel_programs in source_programs.values() for program in channel_programs])
+        programs |= source_programs
+
+    logging.info(
+        "Ingested %d programs on %d channels from %d sources in %.1f s",
+        sum(len(channel_programs) for channel_programs in programs.values()), len(programs), len(fetched), time.perf_counter() - started
+    )
+    return programs
@@ -1,9 +1,11 @@
 from .tvdatabase import TVDatabase, Schedule
 from .tvconstants import *
 from .mediapathmanager import MediaPathManager
+from .mediaindex import MediaIndex
 from datetime import datetime
 from pathlib import Path
 import subprocess
+import logging
 
 class TVFileHandler:
     """
@@ -39,8 +41,17 @@ class TVFileHandler:
             )
 
     def update_file_info(self, schedule_id, file_path):
+        """Stores the file of a program on its schedule entry and on the reruns that share it"""
         file_info = self.get_file_info(file_path)
-        self.tv_db.upsert(Schedule(id=schedule_id, **file_info))
+        rerun_status = STATUS_AVAILABLE if file_info["filepath"] else STATUS_MISSING
+
+        self.tv_db.update_many(
+            Schedule,
+            [{"id": schedule_id, **file_info}] + [
+                {"id": rerun_id, "status": rerun_status, **file_info}
+                for rerun_id in self.tv_db.get_rerun_ids(schedule_id)
+            ]
+        )
         return file_info
 
     def verify_local_file(self, schedule_id, filepath):
@@ -59,6 +70,83 @@ class TVFileHandler:
             text=True
         )
 
+    def segment_hls(self, input_path, output_dir=None, segment_seconds=6):
+        """
+        Segments a media file into a VOD HLS playlist (index.m3u8) with fixed-length segments.
+
+        Keyframes are forced on every segment boundary so each segment is exactly `segment_seconds`
+        long (except the last), which lets channel playlists map wall-clock time to a segment.
+
+        Returns:
+            Path to the playlist, or None if segmenting failed
+        """
+        input_path = Path(input_path)
+        output_dir = Path(output_dir) if output_dir else self.paths.get_hls_dir(input_path)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        playlist = output_dir / "index.m3u8"
+
+        result = subprocess.run(
+            [
+                "ffmpeg", "-v", "error", "-y", "-i", str(input_path),
+                "-c:v", "libx264", "-preset", "veryfast",
+                "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})", "-sc_threshold", "0",
+                "-c:a", "aac", "-ac", "2", "-ar", "48000",
+                "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "vod",
+                "-hls_segment_filename", str(output_dir / "seg_%05d.ts"),
+                str(playlist)
+            ],
+            stderr=subprocess.PIPE,
+            text=True
+        )
+
+        if result.returncode != 0:
+            logging.error("Segmenting %s failed: %s", input_path, result.stderr)
+            return None
+
+        return playlist
+
+    def build_media_index(self, input_path) -> MediaIndex | None:
+        """
+        Probes the real duration and the keyframe positions of a media file and stores them in a sidecar.
+        Reads packet headers only, so it doesn't decode the video.
+        """
+        input_path = Path(input_path)
+
+        duration = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(input_path)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        packets = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,pos,flags", "-of", "csv=p=0", str(input_path)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+
+        if duration.returncode != 0 or packets.returncode != 0:
+            logging.error("Probing %s failed: %s", input_path, duration.stderr or packets.stderr)
+            return None
+
+        try:
+            probed_duration = float(duration.stdout.strip())
+        except ValueError:
+            #ffprobe prints "N/A" or nothing for truncated downloads
+            logging.error("Probing %s found no duration: %r", input_path, duration.stdout.strip())
+            return None
+
+        keyframes = []
+        for line in packets.stdout.splitlines():
+            pts_time, pos, flags = (line.split(",") + ["", "", ""])[:3]
+            if "K" in flags and pts_time not in ("", "N/A") and pos not in ("", "N/A"):
+                keyframes.append((float(pts_time), int(pos)))
+
+        index = MediaIndex(probed_duration, sorted(keyframes))
+        index.save(input_path)
+
+        return index
+
     def get_file_info(self, input_path):
         path = Path(input_path) 
         
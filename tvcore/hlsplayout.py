@@ -0,0 +1,161 @@
+from .mediapathmanager import MediaPathManager
+from .channeltimeline import ChannelTimeline
+from .tvdatabase import TVDatabase
+from .tvconstants import *
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+import threading
+import math
+
+SEGMENT_PLAYLIST = "index.m3u8"
+
+@lru_cache(maxsize=1024)
+def _parse_segments(playlist: Path, mtime: float) -> tuple[tuple[float, str], ...]:
+    segments = []
+    duration = None
+    for line in playlist.read_text().splitlines():
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append((duration, line))
+            duration = None
+
+    return tuple(segments)
+
+def read_segments(hls_dir: Path) -> tuple[tuple[float, str], ...]:
+    """Returns (duration, filename) for each segment of a segmented media file, or () if it isn't segmented"""
+    playlist = Path(hls_dir) / SEGMENT_PLAYLIST
+    try:
+        mtime = playlist.stat().st_mtime
+    except FileNotFoundError:
+        return ()
+
+    return _parse_segments(playlist, mtime)
+
+
+class HLSPlayout:
+    """
+    Live HLS playlist per channel, stitched from the segments made at preparation time.
+
+    Wall-clock time is divided into slots of `segment_seconds`. Slot n is media sequence number n,
+    and maps to the segment of whatever is airing on the channel at that time, or to the test card
+    when nothing is. Every viewer of a channel therefore gets the same playlist and the same
+    (cacheable) segment URLs.
+
+    The discontinuity sequence depends on every playlist served before, so it is kept in the database:
+    all streaming processes, and a restarted one, continue the same sequence.
+    """
+    def __init__(self, monitor, paths: MediaPathManager = None, database: TVDatabase = None, segment_seconds=6, window_segments=6):
+        self.monitor = monitor
+        self.paths = paths or MediaPathManager()
+        self.database = database or TVDatabase()
+        self.segment_seconds = segment_seconds
+        self.window_segments = window_segments
+
+        self._state: dict[str, tuple[int, int]] = {} #channel -> (first slot, discontinuity sequence), the last one this process served
+        self._lock = threading.Lock()
+
+    def playlist(self, channel: str, segment_prefix="/hls/segments/") -> str | None:
+        """Returns the current live playlist for a channel, or None if the test card isn't segmented"""
+        now = self.monitor.get_current_time()
+        timeline = self.monitor.get_timeline(now)
+
+        last = int(now.timestamp() // self.segment_seconds)
+        first = last - self.window_segments + 1
+
+        slots = [self._slot_source(channel, timeline, slot) for slot in range(first - 1, last + 1)]
+        if any(slot is None for slot in slots[1:]):
+            return None
+
+        discontinuity_sequence = self._advance(channel, timeline, first, slots[0], slots[1])
+        target_duration = max(self.segment_seconds, math.ceil(max(slot[2] for slot in slots[1:])))
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{target_duration}",
+            f"#EXT-X-MEDIA-SEQUENCE:{first}",
+            f"#EXT-X-DISCONTINUITY-SEQUENCE:{discontinuity_sequence}",
+        ]
+
+        for i, (previous, current) in enumerate(zip(slots, slots[1:])):
+            if i > 0 and self._is_discontinuous(previous, current):
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXTINF:{current[2]:.3f},")
+            lines.append(f"{segment_prefix}{current[3]}")
+
+        return "\n".join(lines) + "\n"
+
+    def _slot_source(self, channel: str, timeline: ChannelTimeline, slot: int) -> tuple | None:
+        """Returns (source id, segment index, duration, relative uri) of the segment airing in a slot"""
+        time = datetime.fromtimestamp(slot * self.segment_seconds)
+        program = timeline.current(channel, time)
+
+        if program and program["filepath"]:
+            hls_dir = self.paths.get_hls_dir(program["filepath"])
+            segments = read_segments(self.paths.download_path / hls_dir)
+            index = int((time - program["start"]).total_seconds() // self.segment_seconds)
+
+            if index < len(segments):
+                duration, filename = segments[index]
+                return program["id"], index, duration, f"{hls_dir.as_posix()}/{filename}"
+
+        filler_dir = self.paths.get_filler_hls_dir()
+        segments = read_segments(filler_dir)
+        if not segments:
+            return None
+
+        index = slot % len(segments)
+        duration, filename = segments[index]
+        return STREAM_ID_NO_PROGRAM, index, duration, f"{filler_dir.relative_to(self.paths.download_path).as_posix()}/{filename}"
+
+    @staticmethod
+    def _is_discontinuous(previous: tuple | None, current: tuple) -> bool:
+        return previous is None or previous[0] != current[0] or current[1] != previous[1] + 1
+
+    def _advance(self, channel: str, timeline: ChannelTimeline, first: int, before_first: tuple, first_source: tuple) -> int:
+        """
+        Returns the discontinuity sequence for a playlist starting at slot `first`: the number of
+        discontinuities that have slid out of the window, counting one in front of the first segment.
+        It continues from the position stored by whichever process served the channel last.
+        """
+        with self._lock:
+            state = self._state.get(channel)
+            if state is not None and state[0] == first:
+                return state[1]
+
+            stored = self.database.get_playout_state(channel)
+
+            if stored is None:
+                sequence = 1 if self._is_discontinuous(before_first, first_source) else 0
+            elif first <= stored[0]:
+                #Another process is ahead, count back the discontinuities between there and here
+                sequence = stored[1] - self._count_discontinuities(channel, timeline, first + 1, stored[0])
+            else:
+                previous_first, sequence = stored
+
+                #After a long idle period nobody holds the old playlist, so only the recent slots need counting
+                start = max(previous_first + 1, first - 2 * self.window_segments)
+                if start > previous_first + 1:
+                    sequence += 1
+
+                sequence += self._count_discontinuities(channel, timeline, start, first)
+
+            if stored is None or first > stored[0]:
+                self.database.save_playout_state(channel, first, sequence)
+
+            self._state[channel] = (first, sequence)
+            return sequence
+
+    def _count_discontinuities(self, channel: str, timeline: ChannelTimeline, start: int, end: int) -> int:
+        """Number of discontinuities in front of the slots from `start` to `end`, both included"""
+        count = 0
+        previous = self._slot_source(channel, timeline, start - 1)
+        for slot in range(start, end + 1):
+            current = self._slot_source(channel, timeline, slot)
+            if current is not None and self._is_discontinuous(previous, current):
+                count += 1
+            previous = current
+
+        return count
@@ -0,0 +1,255 @@
+from .mediapathmanager import MediaPathManager
+from collections import deque
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterator
+import subprocess
+import threading
+import logging
+import time
+
+TS_PACKET_SIZE = 188
+
+
+class RingBuffer:
+    """
+    Fixed-capacity buffer of byte chunks shared by one writer and any number of readers.
+
+    Every chunk gets a sequence number and each reader keeps its own cursor, so reading never
+    copies or removes data. A reader that falls behind the oldest chunk skips ahead to it.
+    """
+    def __init__(self, capacity_bytes: int):
+        self.capacity_bytes = capacity_bytes
+        self.closed = False
+
+        self._chunks: deque[bytes] = deque()
+        self._first_sequence = 0 #Sequence number of self._chunks[0]
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def write(self, chunk: bytes):
+        with self._condition:
+            self._chunks.append(chunk)
+            self._size += len(chunk)
+
+            while self._size > self.capacity_bytes and len(self._chunks) > 1:
+                self._size -= len(self._chunks.popleft())
+                self._first_sequence += 1
+
+            self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def oldest(self) -> int:
+        """Cursor of the oldest buffered chunk, where new readers start"""
+        with self._condition:
+            return self._first_sequence
+
+    def read(self, cursor: int, timeout: float = None) -> tuple[int, list[bytes]]:
+        """
+        Waits until there are chunks at or after the cursor, then returns them with the new cursor.
+        Returns no chunks on timeout or when the buffer is closed.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.closed or self._first_sequence + len(self._chunks) > cursor,
+                timeout=timeout
+            )
+
+            cursor = max(cursor, self._first_sequence)
+            end = self._first_sequence + len(self._chunks)
+            chunks = [self._chunks[i - self._first_sequence] for i in range(cursor, end)]
+
+            return end, chunks
+
+
+class ChannelProducer:
+    """
+    The single encoder of a channel. Follows the schedule through the BroadcastMonitor timeline,
+    encodes whatever is airing (or the test card) in real time to MPEG-TS and writes it into a ring buffer.
+    """
+    def __init__(self, channel: str, monitor, paths: MediaPathManager, buffer_bytes: int, idle_timeout: float, chunk_packets=348):
+        self.channel = channel
+        self.monitor = monitor
+        self.paths = paths
+        self.buffer = RingBuffer(buffer_bytes)
+        self.chunk_size = TS_PACKET_SIZE * chunk_packets
+        self.idle_timeout = idle_timeout #Seconds without readers before the producer stops
+
+        self.readers = 0
+        self.last_reader_left = time.monotonic()
+        self.is_running = False
+
+        self._process: subprocess.Popen | None = None
+        self._started = None
+
+    def start(self):
+        self.is_running = True
+        self._started = time.monotonic()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self.is_running = False
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+        self.buffer.close()
+
+    def _run(self):
+        while self.is_running and not self.is_idle():
+            source, offset, duration, loop = self._next_segment()
+
+            self._process = subprocess.Popen(
+                self._ffmpeg_command(source, offset, duration, loop),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+
+            wrote = False
+            while self.is_running:
+                chunk = self._process.stdout.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.buffer.write(chunk)
+                wrote = True
+
+                if self.is_idle():
+                    self.stop()
+
+            if self._process.wait() != 0 and not wrote and self.is_running:
+                logging.error("Live encoder for %s failed on %s", self.channel, source)
+                time.sleep(1)
+
+        self.is_running = False
+        self.buffer.close()
+
+    def is_idle(self) -> bool:
+        return self.readers == 0 and time.monotonic() - self.last_reader_left > self.idle_timeout
+
+    def _next_segment(self) -> tuple[Path, float, float, bool]:
+        """Returns (source, offset, seconds until the next schedule boundary, loop source) for what airs now"""
+        now = self.monitor.get_current_time()
+        timeline = self.monitor.get_timeline(now)
+        program = timeline.current(self.channel, now)
+
+        if program and program["filepath"]:
+            offset = (now - program["start"]).total_seconds()
+            source = self.paths.get_full_path(program["filepath"])
+
+            if source.exists() and (not program["duration"] or offset < program["duration"]):
+                remaining = (program["end"] - now).total_seconds()
+                if program["duration"]:
+                    remaining = min(remaining, program["duration"] - offset)
+                return source, offset, max(remaining, 1), False
+
+        upcoming = timeline.next(self.channel, now + timedelta(seconds=1))
+        until = (upcoming["start"] - now).total_seconds() if upcoming else 60
+
+        return self.paths.get_filler_path(), 0, max(until, 1), True
+
+    def _ffmpeg_command(self, source: Path, offset: float, duration: float, loop: bool) -> list[str]:
+        #Keep timestamps increasing across encoder restarts so clients see one continuous stream
+        elapsed = time.monotonic() - self._started
+
+        command = ["ffmpeg", "-v", "error", "-re"]
+        if loop:
+            command += ["-stream_loop", "-1"]
+        command += ["-ss", f"{offset:.3f}", "-i", str(source), "-t", f"{duration:.3f}"]
+        command += [
+            "-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency", "-g", "50",
+            "-c:a", "aac", "-ac", "2", "-ar", "48000",
+            "-output_ts_offset", f"{elapsed:.3f}",
+            "-f", "mpegts", "pipe:1"
+        ]
+        return command
+
+
+class LiveStreamer:
+    """
+    MPEG-TS fan-out: one ChannelProducer per watched channel, read by any number of HTTP clients.
+    A producer is started by the first viewer and stops itself once the channel has been unwatched for `idle_timeout` seconds.
+    Every client holds a thread while it reads, so at most `max_clients` are served at once.
+    """
+    def __init__(self, monitor, paths: MediaPathManager = None, buffer_bytes=4 * 1024 * 1024, idle_timeout=30, max_clients=32):
+        self.monitor = monitor
+        self.paths = paths or MediaPathManager()
+        self.buffer_bytes = buffer_bytes
+        self.idle_timeout = idle_timeout
+        self.max_clients = max_clients
+
+        self._producers: dict[str, ChannelProducer] = {}
+        self._clients = 0
+        self._lock = threading.Lock()
+
+    def stream(self, channel: str) -> "ClientStream | None":
+        """
+        Attaches a client to the channel and returns its byte stream. Returns None when all client slots are taken.
+        Raises KeyError for channels that are not in the monitor's channel list, so no encoder is started for them.
+        The client keeps its slot until the stream is closed.
+        """
+        if channel not in self.monitor.channels:
+            raise KeyError(channel)
+
+        producer = self._attach(channel)
+        if producer is None:
+            return None
+
+        return ClientStream(self, producer)
+
+    def _read(self, producer: ChannelProducer) -> Iterator[bytes]:
+        cursor = producer.buffer.oldest()
+        while True:
+            cursor, chunks = producer.buffer.read(cursor, timeout=self.idle_timeout)
+            if chunks:
+                yield b"".join(chunks)
+            elif producer.buffer.closed:
+                break
+
+    def _attach(self, channel: str) -> ChannelProducer | None:
+        with self._lock:
+            if self._clients >= self.max_clients:
+                return None
+
+            producer = self._producers.get(channel)
+            if producer is None or not producer.is_running:
+                producer = ChannelProducer(channel, self.monitor, self.paths, self.buffer_bytes, self.idle_timeout)
+                producer.start()
+                self._producers[channel] = producer
+
+            producer.readers += 1
+            self._clients += 1
+            return producer
+
+    def _detach(self, producer: ChannelProducer):
+        with self._lock:
+            producer.readers -= 1
+            self._clients -= 1
+            if producer.readers == 0:
+                producer.last_reader_left = time.monotonic()
+
+
+class ClientStream:
+    """
+    Byte stream of one live client. Its slot is released in close(), which the WSGI server calls once the
+    response is done, even when the body was never iterated (HEAD requests, clients that leave before the first chunk).
+    """
+    def __init__(self, streamer: LiveStreamer, producer: ChannelProducer):
+        self.streamer = streamer
+        self.producer = producer
+        self.closed = False
+
+        self._chunks = streamer._read(producer)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        return next(self._chunks)
+
+    def close(self):
+        self._chunks.close()
+        if not self.closed:
+            self.closed = True
+            self.streamer._detach(self.producer)
@@ -0,0 +1,154 @@
+from .mediapathmanager import MediaPathManager
+from dataclasses import dataclass
+from datetime import datetime
+from zlib import adler32
+import threading
+import logging
+import time
+import os
+
+
+@dataclass
+class CachedMedia:
+    data: bytes
+    size: int #Size of the whole file on disk
+    mtime: float
+    air_time: datetime | None #When the program airs, used to decide what to evict
+    last_wanted: float #Monotonic time of the last warm cycle that asked for this file
+    pinned: bool = False
+
+    @property
+    def whole(self) -> bool:
+        return len(self.data) == self.size
+
+
+class HotMediaCache:
+    """
+    In-process cache, bounded by a byte budget, for the media every channel switch touches:
+    the whole test card and the first megabytes (moov atom and first keyframes) of the programs
+    airing now and next on each channel.
+
+    A background thread follows the BroadcastMonitor timeline to keep the cache warm. When over
+    budget, files no warm cycle asks for any more go first, then the ones airing furthest in the future.
+    """
+    def __init__(self, budget_bytes=256 * 1024 * 1024, head_bytes=8 * 1024 * 1024, warm_interval=5):
+        self.budget_bytes = budget_bytes
+        self.head_bytes = head_bytes
+        self.warm_interval = warm_interval
+
+        self._entries: dict[str, CachedMedia] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._warming = False
+        self.filler_path = None #The test card the warm loop last loaded, so requests don't have to look for it on disk
+
+    @staticmethod
+    def _key(path) -> str:
+        return os.path.normpath(str(path))
+
+    def get(self, path) -> CachedMedia | None:
+        """
+        Returns the cached file without touching the disk. Files that changed (or went) on disk are
+        dropped by the warm loop's revalidate(), so they can be served for up to one warm interval.
+        """
+        return self._entries.get(self._key(path))
+
+    def revalidate(self):
+        """Drops the entries whose file on disk no longer has the size and mtime it was cached with"""
+        for key, entry in list(self._entries.items()):
+            try:
+                stats = os.stat(key)
+                current = (stats.st_mtime, stats.st_size) == (entry.mtime, entry.size)
+            except OSError:
+                current = False
+
+            if not current:
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        self._size -= len(self._entries.pop(key).data)
+
+    @staticmethod
+    def etag(path, entry: CachedMedia) -> str:
+        """The ETag send_file gives the file on disk, so cached and uncached responses revalidate alike"""
+        check = adler32(str(path).encode()) & 0xFFFFFFFF
+        return f"{entry.mtime}-{entry.size}-{check}"
+
+    def read_range(self, path, start: int, stop: int) -> tuple[bytes, int] | None:
+        """
+        Returns the cached bytes from `start` up to `stop` (or as many as are cached) and the file size,
+        or None if the range doesn't start inside the cached part of the file.
+        """
+        entry = self.get(path)
+        if entry is None or start >= len(entry.data):
+            return None
+        return entry.data[start:min(stop, len(entry.data))], entry.size
+
+    def warm(self, path, air_time: datetime = None, whole=False):
+        """Loads the head (or the whole) of a file into memory if it isn't cached already"""
+        if self.budget_bytes <= 0:
+            return
+
+        key = self._key(path)
+        now = time.monotonic()
+
+        try:
+            stats = os.stat(key)
+
+            entry = self._entries.get(key)
+            if entry is not None and (entry.mtime, entry.size) == (stats.st_mtime, stats.st_size):
+                entry.last_wanted = now
+                entry.air_time = air_time
+                return
+
+            with open(key, "rb") as f:
+                data = f.read() if whole else f.read(self.head_bytes)
+        except OSError as e:
+            logging.warning("Could not cache %s: %s", key, e)
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key).data)
+            self._entries[key] = CachedMedia(data, stats.st_size, stats.st_mtime, air_time, now, pinned=whole)
+            self._size += len(data)
+            self._evict()
+
+    def _evict(self):
+        candidates = sorted(
+            (entry.last_wanted, -entry.air_time.timestamp() if entry.air_time else float("-inf"), key)
+            for key, entry in self._entries.items()
+            if not entry.pinned
+        )
+
+        for _, _, key in candidates:
+            if self._size <= self.budget_bytes:
+                break
+            self._size -= len(self._entries.pop(key).data)
+
+    def start_warming(self, monitor, paths: MediaPathManager):
+        """Keeps the test card and the now/next programs of every channel in memory"""
+        with self._lock:
+            if self._warming or self.budget_bytes <= 0:
+                return
+            self._warming = True
+
+        threading.Thread(target=self._warm_loop, args=(monitor, paths), daemon=True).start()
+
+    def _warm_loop(self, monitor, paths: MediaPathManager):
+        while self._warming:
+            try:
+                self.revalidate()
+                self.filler_path = paths.get_filler_path()
+                self.warm(self.filler_path, whole=True)
+
+                now = monitor.get_current_time()
+                timeline = monitor.get_timeline(now)
+                for channel in monitor.channels:
+                    for program in (timeline.current(channel, now), timeline.next(channel, now)):
+                        if program and program["filepath"]:
+                            self.warm(paths.get_full_path(program["filepath"]), air_time=program["start"])
+
+            except Exception as e:
+                logging.error("Media cache warming failed: %s", e)
+
+            time.sleep(self.warm_interval)
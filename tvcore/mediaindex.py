@@ -0,0 +1,40 @@
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+import json
+
+
+@dataclass
+class MediaIndex:
+    """
+    Probed facts about a media file, stored in a sidecar next to it: the real duration and
+    the timestamp and byte position of every video keyframe.
+    """
+    duration: float
+    keyframes: list[tuple[float, int]] = field(default_factory=list) #(seconds, byte offset)
+
+    @staticmethod
+    def sidecar_path(media_path) -> Path:
+        media_path = Path(media_path)
+        return media_path.with_name(f"{media_path.stem}.index.json")
+
+    @classmethod
+    def load(cls, media_path) -> "MediaIndex | None":
+        try:
+            with open(cls.sidecar_path(media_path)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        return cls(data["duration"], [tuple(keyframe) for keyframe in data["keyframes"]])
+
+    def save(self, media_path):
+        with open(self.sidecar_path(media_path), "w") as f:
+            json.dump({"duration": self.duration, "keyframes": self.keyframes}, f)
+
+    def keyframe_before(self, offset: float) -> tuple[float, int] | None:
+        """Returns the last keyframe at or before the offset, which is where a joining player should start"""
+        i = bisect_right(self.keyframes, (offset, float("inf"))) - 1
+        if i < 0:
+            return None
+        return self.keyframes[i]
@@ -63,6 +63,22 @@ class MediaPathManager:
     def get_full_path(self, relative_path) -> Path:
         """Convert a relative path to a full path"""
         return self.download_path / relative_path
+
+    def get_filler_path(self) -> Path:
+        """Get the test card shown when nothing is airing"""
+        filler = self.download_path / "ads" / "PM5544.mp4"
+        if filler.exists():
+            return filler
+        return self.base_dir / "static" / "PM5544.mp4"
+
+    def get_hls_dir(self, media_path) -> Path:
+        """Get the directory holding the HLS segments of a media file"""
+        media_path = Path(media_path)
+        return media_path.parent / f"{media_path.stem}_hls"
+
+    def get_filler_hls_dir(self) -> Path:
+        """Get the directory holding the HLS segments of the test card"""
+        return self.get_hls_dir(self.download_path / "ads" / "PM5544.mp4")
     
 
     #========= FILE NAME GENEREATION =========
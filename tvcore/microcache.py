@@ -0,0 +1,73 @@
+from typing import Any, Callable, Hashable
+import threading
+import time
+
+
+class MicroCache:
+    """
+    Short-lived cache for computed responses. Entries live for `ttl` seconds, and concurrent
+    requests for a missing key wait for the first one to compute it instead of computing it again,
+    so a burst of identical polls within one tick costs a single computation.
+    """
+    def __init__(self, ttl: float = 1, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: dict[Hashable, tuple[float, Any]] = {} #key -> (expires, value)
+        self._key_locks: dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], ttl: float = None) -> Any:
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            #Someone else may have computed it while we waited
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            stored = False
+            try:
+                value = compute()
+                expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+                with self._lock:
+                    self._entries[key] = (expires, value)
+                    stored = True
+                    if len(self._entries) > self.max_entries:
+                        self._prune()
+            finally:
+                #A failed computation leaves no entry, and its lock would otherwise never be pruned
+                if not stored:
+                    with self._lock:
+                        if self._key_locks.get(key) is key_lock:
+                            del self._key_locks[key]
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+            self._key_locks.pop(key, None)
+
+        #Still full of live entries: drop the ones closest to expiring
+        if len(self._entries) > self.max_entries:
+            for key in sorted(self._entries, key=lambda key: self._entries[key][0])[:len(self._entries) - self.max_entries]:
+                del self._entries[key]
+                self._key_locks.pop(key, None)
@@ -0,0 +1,34 @@
+from alembic import context
+from sqlalchemy import create_engine
+
+config = context.config
+
+# TVDatabase passes its own connection and metadata; the alembic CLI (see alembic.ini) does not
+connection = config.attributes.get("connection")
+target_metadata = config.attributes.get("target_metadata")
+
+if target_metadata is None:
+    from tvcore.tvdatabase import Base
+    target_metadata = Base.metadata
+
+
+def run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=True #SQLite can't alter most things in place
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    context.configure(url=config.get_main_option("sqlalchemy.url"), target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+elif connection is None:
+    with create_engine(config.get_main_option("sqlalchemy.url")).connect() as connection:
+        run_migrations(connection)
+else:
+    run_migrations(connection)
@@ -0,0 +1,97 @@
+"""Baseline: the schema as created by create_all before migrations were introduced
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "series",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("tmdb_id", sa.Integer, unique=True),
+        sa.Column("title", sa.Text, nullable=False),
+        sa.Column("description", sa.Text),
+        sa.Column("genre", sa.Text),
+        sa.Column("release", sa.Date),
+        sa.Column("slug", sa.Text),
+        sa.Column("source_url", sa.Text),
+        sa.Column("reverse_order", sa.Boolean),
+        sa.Column("start_season", sa.Integer),
+        sa.Column("start_episode", sa.Integer),
+    )
+
+    op.create_table(
+        "movies",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("tmdb_id", sa.Integer, unique=True),
+        sa.Column("title", sa.Text, nullable=False),
+        sa.Column("description", sa.Text),
+        sa.Column("genre", sa.Text),
+        sa.Column("release", sa.Date),
+        sa.Column("slug", sa.Text),
+        sa.Column("source_url", sa.Text),
+        sa.Column("program_id", sa.Text, unique=True),
+        sa.Column("duration", sa.Float),
+    )
+
+    op.create_table(
+        "episodes",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("series_id", sa.Integer, sa.ForeignKey("series.id"), nullable=False),
+        sa.Column("program_id", sa.Text, unique=True),
+        sa.Column("tmdb_id", sa.Integer, unique=True),
+        sa.Column("title", sa.Text),
+        sa.Column("season_number", sa.Integer),
+        sa.Column("episode_number", sa.Integer),
+        sa.Column("description", sa.Text),
+        sa.Column("duration", sa.Float),
+        sa.Column("source_url", sa.Text),
+    )
+
+    op.create_table(
+        "schedule",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("episode_id", sa.Integer, sa.ForeignKey("episodes.id")),
+        sa.Column("movie_id", sa.Integer, sa.ForeignKey("movies.id")),
+        sa.Column("title", sa.Text, nullable=False),
+        sa.Column("original_start", sa.DateTime),
+        sa.Column("start", sa.DateTime, nullable=False),
+        sa.Column("end", sa.DateTime, nullable=False),
+        sa.Column("rerun", sa.Boolean, nullable=False),
+        sa.Column("channel", sa.Text),
+        sa.Column("filepath", sa.Text),
+        sa.Column("download_date", sa.Date),
+        sa.Column("file_size", sa.Integer),
+        sa.Column("status", sa.Text, nullable=False),
+        sa.Column("last_aired", sa.Date),
+        sa.Column("views", sa.Integer),
+    )
+
+    op.create_table(
+        "channels",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("name", sa.Text, nullable=False),
+        sa.Column("display_name", sa.Text, nullable=False),
+    )
+
+    op.create_table(
+        "genres",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("name", sa.Text, nullable=False),
+        sa.Column("display_name", sa.Text, nullable=False),
+    )
+
+
+def downgrade():
+    for table in ("genres", "channels", "schedule", "episodes", "movies", "series"):
+        op.drop_table(table)
@@ -0,0 +1,30 @@
+"""Indexes for the schedule lookups by channel, status and start, and for episodes by series
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    #Now/next on a channel and schedule conflicts
+    op.create_index("ix_schedule_channel_status_start", "schedule", ["channel", "status", "start"])
+    #Pending programs, the weekly guide and the playout window, all filtered on status and a time range
+    op.create_index("ix_schedule_status_start", "schedule", ["status", "start"])
+    #Lookups by day, and obsolete programs
+    op.create_index("ix_schedule_start", "schedule", ["start"])
+    op.create_index("ix_episodes_series_id", "episodes", ["series_id"])
+
+
+def downgrade():
+    op.drop_index("ix_episodes_series_id", "episodes")
+    op.drop_index("ix_schedule_start", "schedule")
+    op.drop_index("ix_schedule_status_start", "schedule")
+    op.drop_index("ix_schedule_channel_status_start", "schedule")
@@ -0,0 +1,33 @@
+"""Table write counters for cache invalidation across processes, bumped once per transaction by TVDatabase
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ("series", "movies", "episodes", "schedule", "channels", "genres")
+
+
+def upgrade():
+    op.create_table(
+        "table_versions",
+        sa.Column("table_name", sa.Text, primary_key=True),
+        sa.Column("version", sa.Integer, nullable=False),
+        sa.Column("modified", sa.DateTime, nullable=False),
+    )
+
+    #No triggers: SQLite only has FOR EACH ROW triggers, which would make every bulk write pay one extra UPDATE per row
+    for table in VERSIONED_TABLES:
+        op.execute(f"INSERT INTO table_versions (table_name, version, modified) VALUES ('{table}', 0, CURRENT_TIMESTAMP)")
+
+
+def downgrade():
+    op.drop_table("table_versions")
@@ -0,0 +1,43 @@
+"""Weekly aggregates of archived schedule rows, so the schedule table only holds recent and upcoming weeks
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "schedule_archive",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("week", sa.Date, nullable=False),
+        sa.Column("channel", sa.Text),
+        sa.Column("title", sa.Text, nullable=False),
+        sa.Column("series_id", sa.Integer),
+        sa.Column("episode_id", sa.Integer),
+        sa.Column("movie_id", sa.Integer),
+        sa.Column("airings", sa.Integer, nullable=False),
+        sa.Column("reruns", sa.Integer, nullable=False),
+        sa.Column("first_start", sa.DateTime, nullable=False),
+        sa.Column("last_start", sa.DateTime, nullable=False),
+    )
+    #One row per program, channel and week. NULL ids are coalesced since a unique index treats NULLs as distinct.
+    op.execute("""
+        CREATE UNIQUE INDEX ux_schedule_archive_program
+        ON schedule_archive (week, channel, title, coalesce(episode_id, 0), coalesce(movie_id, 0))
+    """)
+
+    op.execute("INSERT INTO table_versions (table_name, version, modified) VALUES ('schedule_archive', 0, CURRENT_TIMESTAMP)")
+
+
+def downgrade():
+    op.execute("DELETE FROM table_versions WHERE table_name = 'schedule_archive'")
+    op.drop_table("schedule_archive")
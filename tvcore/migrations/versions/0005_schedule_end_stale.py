@@ -0,0 +1,55 @@
+"""Marks schedule rows whose end time needs recomputing, set by triggers when a linked duration changes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+MARK_TRIGGERS = {
+    #A probed or enriched duration changes the end of every airing of the episode or movie
+    "episodes_duration_end_stale": """
+        AFTER UPDATE OF duration ON episodes WHEN OLD.duration IS NOT NEW.duration
+        BEGIN
+            UPDATE schedule SET end_stale = 1 WHERE episode_id = NEW.id;
+        END
+    """,
+    "movies_duration_end_stale": """
+        AFTER UPDATE OF duration ON movies WHEN OLD.duration IS NOT NEW.duration
+        BEGIN
+            UPDATE schedule SET end_stale = 1 WHERE movie_id = NEW.id;
+        END
+    """,
+    #So does moving an airing or linking it to another program. New rows are stale by default.
+    "schedule_link_end_stale": """
+        AFTER UPDATE OF start, episode_id, movie_id ON schedule
+        BEGIN
+            UPDATE schedule SET end_stale = 1 WHERE id = NEW.id;
+        END
+    """,
+}
+
+
+def upgrade():
+    #Existing rows start out stale, so the first run recomputes them all once
+    op.add_column("schedule", sa.Column("end_stale", sa.Boolean, nullable=False, server_default=sa.text("1")))
+    op.create_index("ix_schedule_end_stale", "schedule", ["id"], sqlite_where=sa.text("end_stale"))
+
+    for name, body in MARK_TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade():
+    for name in MARK_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    op.drop_index("ix_schedule_end_stale", "schedule")
+    with op.batch_alter_table("schedule") as batch:
+        batch.drop_column("end_stale")
@@ -0,0 +1,25 @@
+"""Links rerun airings to the airing they repeat
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    #SQLite can add a column with a REFERENCES clause in place, as long as it defaults to NULL
+    op.execute("ALTER TABLE schedule ADD COLUMN rerun_of INTEGER REFERENCES schedule (id) ON DELETE SET NULL")
+    op.create_index("ix_schedule_rerun_of", "schedule", ["rerun_of"])
+
+
+def downgrade():
+    op.drop_index("ix_schedule_rerun_of", "schedule")
+    with op.batch_alter_table("schedule") as batch:
+        batch.drop_column("rerun_of")
@@ -0,0 +1,46 @@
+"""Channel registry: every channel with its EPG source, seeded with the channels that used to be hardcoded
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+#name, display name, EPG source, channel id at the source, position
+DEFAULT_CHANNELS = (
+    ("nrk1", "NRK1", "nrk", "nrk1", 1),
+    ("nrk2", "NRK2", "nrk", "nrk2", 2),
+    ("cable", "Kabel-TV", None, None, 3), #Scheduled by hand
+)
+
+
+def upgrade():
+    with op.batch_alter_table("channels") as batch:
+        batch.add_column(sa.Column("epg_source", sa.Text))
+        batch.add_column(sa.Column("source_channel", sa.Text))
+        batch.add_column(sa.Column("position", sa.Integer, nullable=False, server_default="0"))
+        batch.add_column(sa.Column("enabled", sa.Boolean, nullable=False, server_default=sa.text("1")))
+        batch.create_index("ux_channels_name", ["name"], unique=True)
+
+    for name, display_name, source, source_channel, position in DEFAULT_CHANNELS:
+        op.execute(sa.text(
+            "INSERT INTO channels (name, display_name, epg_source, source_channel, position) "
+            "SELECT :name, :display_name, :source, :source_channel, :position "
+            "WHERE NOT EXISTS (SELECT 1 FROM channels WHERE name = :name)"
+        ).bindparams(name=name, display_name=display_name, source=source, source_channel=source_channel, position=position))
+
+
+def downgrade():
+    with op.batch_alter_table("channels") as batch:
+        batch.drop_index("ux_channels_name")
+        batch.drop_column("enabled")
+        batch.drop_column("position")
+        batch.drop_column("source_channel")
+        batch.drop_column("epg_source")
@@ -0,0 +1,27 @@
+"""Live HLS playlist position per channel, shared by every streaming process
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "playout_state",
+        sa.Column("channel", sa.Text, primary_key=True),
+        sa.Column("first_slot", sa.Integer, nullable=False),
+        sa.Column("discontinuity_sequence", sa.Integer, nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("playout_state")
@@ -3,15 +3,26 @@ from .metadatafetcher import MetaDataFetcher
 from .programmanager import ProgramManager
 from .tvdatabase import TVDatabase, Series, Movie, Episode, Schedule
 from .tvconstants import *
-from .schemas import NRKInput
+from .schemas import NRKInput, EPGConfig
+from .ratelimiter import HostRateLimiter
+from .epgcache import EPGCache
 
 from slugify import slugify
 import requests
+import aiohttp
+import asyncio
+import json
+import logging
+import random
 from pydantic_core import ValidationError
-from datetime import timedelta
+from datetime import date, datetime, timedelta
+from typing import Any, Hashable, Iterable
+
+EPG_URL = "https://psapi.nrk.no/epg/{channel}"
+RERUN_WINDOW = timedelta(days=7)
 
 class NRKManager():
-    def __init__(self, channel:str, debug:bool = False):
+    def __init__(self, channel:str = None, debug:bool = False):
         self.metadata = MetaDataFetcher()
         self.programmanager = ProgramManager()
         self.db = TVDatabase()
@@ -74,51 +85,251 @@ class NRKManager():
                 )
             
     def insert_programs(self, programs: list[NRKInput]):
-        for program in programs:
-            self.insert_database(program)
+        """
+        Bulk version of insert_database, in one transaction: series are matched on slug, episodes and
+        movies on program_id and schedule entries on start and channel, with a few IN queries per table.
+        """
+        unavailable = [program for program in programs if program.availability.status != "available"]
+        programs = [program for program in programs if program.availability.status == "available"]
+        episodes = [i for i, program in enumerate(programs) if program.series_id]
+        movies = [i for i, program in enumerate(programs) if not program.series_id]
+
+        with self.db.transaction() as session:
+            series_ids = self.db.add_missing(
+                [
+                    Series(
+                        slug = programs[i].series_id,
+                        title = programs[i].series_title,
+                        genre = programs[i].category.display_value
+                    )
+                    for i in episodes
+                ],
+                ["slug"],
+                session
+            )
+
+            episode_ids = self.db.add_missing(
+                [
+                    Episode(
+                        series_id = series_id,
+                        title = programs[i].title,
+                        description = programs[i].description,
+                        duration = programs[i].duration,
+                        program_id = programs[i].program_id,
+                        source_url = programs[i].source_url
+                    )
+                    for i, series_id in zip(episodes, series_ids)
+                ],
+                ["program_id"],
+                session
+            )
+
+            movie_ids = self.db.add_missing(
+                [
+                    Movie(
+                        title = programs[i].title,
+                        program_id = programs[i].program_id,
+                        genre = programs[i].category.display_value,
+                        duration = programs[i].duration,
+                        description = programs[i].description,
+                        source_url = programs[i].source_url,
+                        slug = slugify(programs[i].title)
+                    )
+                    for i in movies
+                ],
+                ["program_id"],
+                session
+            )
+
+            episode_ids = dict(zip(episodes, episode_ids))
+            movie_ids = dict(zip(movies, movie_ids))
+
+            schedule_ids = self.db.add_missing(
+                [
+                    Schedule(
+                        title = program.title,
+                        episode_id = episode_ids.get(i),
+                        movie_id = movie_ids.get(i),
+                        original_start = program.original_start,
+                        start = program.start,
+                        end = program.end,
+                        rerun = program.rerun,
+                        channel = program.channel or self.channel
+                    )
+                    for i, program in enumerate(programs)
+                ],
+                ["start", "channel"],
+                session
+            )
+
+            #Unavailable airings are only scheduled as reruns of an available airing, whose file they share
+            originals = {
+                i: {"id": schedule_id, "episode_id": episode_ids.get(i), "movie_id": movie_ids.get(i)}
+                for i, schedule_id in enumerate(schedule_ids)
+            }
+            self.db.add_missing(
+                [
+                    Schedule(
+                        title = rerun.title,
+                        episode_id = original["episode_id"],
+                        movie_id = original["movie_id"],
+                        original_start = rerun.original_start,
+                        start = rerun.start,
+                        end = rerun.end,
+                        rerun = True,
+                        rerun_of = original["id"],
+                        channel = rerun.channel or self.channel
+                    )
+                    for original, rerun in self._find_reruns(programs, originals, unavailable)
+                ],
+                ["start", "channel"],
+                session
+            )
+
+    def _find_reruns(self, programs: list[NRKInput], originals: dict[int, dict], unavailable: list[NRKInput]) -> list[tuple[dict, NRKInput]]:
+        """Pairs unavailable programs with an original airing from this batch, or from the database in the window before it"""
+        if not unavailable:
+            return []
+
+        first = min(program.start for program in unavailable).replace(tzinfo=None)
+        last = max(program.start for program in unavailable).replace(tzinfo=None)
+        stored = self.db.get_rerun_originals(first - RERUN_WINDOW, last)
+
+        airings = [(row["start"], (row["series_slug"], row["program_id"]), True, row) for row in stored]
+        airings += [(program.start.replace(tzinfo=None), rerun_key(program), True, originals[i]) for i, program in enumerate(programs)]
+        airings += [(program.start.replace(tzinfo=None), rerun_key(program), False, program) for program in unavailable]
+
+        return find_reruns(airings)
         
     def api_request(self, channel, date):
-        return requests.get(f"https://psapi.nrk.no/epg/{channel}?date={date}")
+        return requests.get(EPG_URL.format(channel=channel), params={"date": str(date)})
     
     def fetch_programs_by_date(self, date):
-        data = self.api_request(self.channel, date).json()
-
-        entries = data[0]["entries"]
-        programs = []
+        return parse_epg(self.api_request(self.channel, date).json(), self.channel)
 
-        for entry in entries:
-            epgentries = entry.get("epgEntries")
+def parse_epg(data, channel) -> list[NRKInput]:
+    """Validates the programs of one psapi EPG response"""
+    entries = data[0]["entries"]
+    programs = []
 
-            if epgentries:
-                for epgentry in epgentries:
-                    data = self._validate_input(epgentry)
-                    data.channel = self.channel
-                    programs.append(data)
+    for entry in entries:
+        for epgentry in entry.get("epgEntries") or [entry]:
+            program = NRKInput.model_validate(epgentry)
+            program.channel = channel
+            programs.append(program)
 
-            else:
-                data = self._validate_input(entry)
-                data.channel = self.channel
-                programs.append(data)
+    return programs
 
-        return programs
+class RetryableStatus(Exception):
+    def __init__(self, status: int, retry_after: float = None):
+        super().__init__(f"HTTP {status}")
+        self.retry_after = retry_after
 
-    def _validate_input(self, data:dict):
+async def _get(session: aiohttp.ClientSession, url: str, params: dict, headers: dict, limiter: HostRateLimiter, semaphore: asyncio.Semaphore, config: EPGConfig):
+    """
+    GET with rate limiting, retrying timeouts, connection errors, 429 and 5xx with exponential backoff.
+    Returns the status, body and headers of the response.
+    """
+    for attempt in range(config.retries + 1):
+        await limiter.acquire(url)
         try:
-            return NRKInput.model_validate(data)
-        except ValidationError as e:
-            raise
+            async with semaphore, session.get(url, params=params, headers=headers) as response:
+                if response.status == 429 or response.status >= 500:
+                    retry_after = response.headers.get("Retry-After")
+                    raise RetryableStatus(response.status, float(retry_after) if retry_after and retry_after.isdigit() else None)
+                response.raise_for_status()
+                return response.status, await response.read(), response.headers
 
-def check_for_duplicate_titles(programs:list[NRKInput]) -> list[tuple[NRKInput, NRKInput]]:
-    duplicates = []
-    programs.sort(key=lambda p: p.start)
-    
-    for i, program in enumerate(programs):
-        if program.availability.status == "available":
-            for other in programs[i+1:]:
-                if other.start - program.start > timedelta(days=7):
-                    break
+        except (RetryableStatus, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if attempt == config.retries:
+                raise
 
-                if other.availability.status != "available" and program.title == other.title:
-                    duplicates.append((program, other))
-    
-    return duplicates
+            delay = getattr(e, "retry_after", None) or config.backoff_seconds * 2 ** attempt * (1 + random.random())
+            logging.warning("Retrying %s %s in %.1f s: %s", url, params, delay, str(e) or type(e).__name__)
+            await asyncio.sleep(delay)
+
+async def _fetch_day(session: aiohttp.ClientSession, url: str, channel: str, day: date, cache: EPGCache | None, limiter: HostRateLimiter, semaphore: asyncio.Semaphore, config: EPGConfig) -> list[NRKInput]:
+    """The EPG of one channel and date: from the cache while fresh (or offline), else fetched, conditionally if it was cached"""
+    entry = cache.lookup(channel, day) if cache else None
+
+    if entry is not None and (config.offline or cache.is_fresh(entry)):
+        return parse_epg(entry.json(), channel)
+    if config.offline:
+        raise LookupError("not in the EPG cache, and offline")
+
+    status, body, headers = await _get(session, url, {"date": str(day)}, EPGCache.conditional_headers(entry), limiter, semaphore, config)
+
+    if status == 304 and entry is not None:
+        return parse_epg(cache.revalidated(channel, day, entry, headers).json(), channel)
+
+    #Parsed before it is cached, so an error payload or a malformed EPG is never replayed
+    programs = parse_epg(json.loads(body), channel)
+    if cache:
+        cache.store(channel, day, body, headers)
+    return programs
+
+async def fetch_epg_async(channels: list[str], dates: list[date], config: EPGConfig = None, url=EPG_URL, cache: EPGCache = None) -> dict[str, list[NRKInput]]:
+    """
+    Fetches and validates the EPG of every channel on every date concurrently, throttled per host.
+    Returns the programs per channel in date order. Dates that fail after all retries are logged and left out.
+
+    Responses are kept in the EPG cache of the config unless another `cache` is given. In offline mode
+    only the cache is read.
+    """
+    config = config or EPGConfig()
+    if cache is None and config.cache_dir:
+        cache = EPGCache(config.cache_dir, config.cache_max_age_days)
+
+    limiter = HostRateLimiter(config.requests_per_second, config.burst)
+    semaphore = asyncio.Semaphore(config.concurrency)
+    pairs = [(channel, day) for channel in channels for day in dates]
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=config.timeout_seconds)) as session:
+        responses = await asyncio.gather(
+            *(_fetch_day(session, url.format(channel=channel), channel, day, cache, limiter, semaphore, config) for channel, day in pairs),
+            return_exceptions=True
+        )
+
+    programs = {channel: [] for channel in channels}
+    for (channel, day), day_programs in zip(pairs, responses):
+        if isinstance(day_programs, BaseException):
+            logging.error("Failed to fetch %s programs for %s: %s", channel, day, day_programs)
+            continue
+        programs[channel] += day_programs
+
+    return programs
+
+def fetch_epg(channels: list[str], dates: list[date], config: EPGConfig = None, url=EPG_URL, cache: EPGCache = None) -> dict[str, list[NRKInput]]:
+    return asyncio.run(fetch_epg_async(channels, dates, config, url, cache))
+
+def rerun_key(program: NRKInput) -> tuple[str | None, str]:
+    """
+    What a rerun has in common with its original: the NRK series and the program's own id.
+    Titles aren't enough, different episodes of a daily show often share one.
+    """
+    return program.series_id, program.program_id
+
+def find_reruns(airings: Iterable[tuple[datetime, Hashable, bool, Any]], window: timedelta = RERUN_WINDOW) -> list[tuple[Any, Any]]:
+    """
+    Links every unavailable airing to the latest available airing with the same key at most `window`
+    before it. Takes (start, key, available, item) tuples and returns (original item, rerun item) pairs.
+
+    One pass in start order over a key-indexed map of the latest available airing, so it stays linear
+    after the sort however dense the schedule is.
+    """
+    latest = {}
+    reruns = []
+
+    for start, key, available, item in sorted(airings, key=lambda airing: airing[0]):
+        if available:
+            latest[key] = (start, item)
+            continue
+
+        original = latest.get(key)
+        if original is not None and start - original[0] <= window:
+            reruns.append((original[1], item))
+
+    return reruns
+
+def check_for_reruns(programs:list[NRKInput]) -> list[tuple[NRKInput, NRKInput]]:
+    return find_reruns((program.start, rerun_key(program), program.availability.status == "available", program) for program in programs)
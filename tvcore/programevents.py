@@ -0,0 +1,58 @@
+import threading
+from typing import Iterator
+
+
+class ProgramEventHub:
+    """
+    Fan-out of "program changed" events from the BroadcastMonitor to any number of listeners.
+
+    Only the latest event per channel is kept. Each channel has its own condition on one shared lock,
+    so an event only wakes the listeners of its channel. Idle listeners cost nothing until the next
+    program boundary or schedule edit; under the gevent worker (see gunicorn_config.py) they are
+    greenlets rather than OS threads.
+    """
+    def __init__(self, keepalive: float = 15):
+        self.keepalive = keepalive #Seconds between keepalive ticks for idle listeners
+        self._lock = threading.Lock()
+        self._conditions: dict[str, threading.Condition] = {}
+        self._events: dict[str, tuple[int, dict]] = {}
+
+    def _condition(self, channel: str) -> threading.Condition:
+        #Called with self._lock held
+        condition = self._conditions.get(channel)
+        if condition is None:
+            condition = self._conditions[channel] = threading.Condition(self._lock)
+        return condition
+
+    def publish(self, channel: str, payload: dict):
+        with self._lock:
+            sequence = self._events.get(channel, (0, None))[0] + 1
+            self._events[channel] = (sequence, payload)
+            self._condition(channel).notify_all()
+
+    def latest(self, channel: str) -> tuple[int, dict | None]:
+        """Returns the sequence number and payload of the last event on a channel"""
+        with self._lock:
+            return self._events.get(channel, (0, None))
+
+    def listen(self, channel: str, last_sequence: int = None) -> Iterator[tuple[int, dict | None]]:
+        """
+        Yields (sequence, payload) for each new event on the channel.
+        Yields (sequence, None) when nothing has happened for `keepalive` seconds.
+        """
+        if last_sequence is None:
+            last_sequence = self.latest(channel)[0]
+
+        while True:
+            with self._lock:
+                changed = self._condition(channel).wait_for(
+                    lambda: self._events.get(channel, (0, None))[0] != last_sequence,
+                    timeout=self.keepalive
+                )
+                sequence, payload = self._events.get(channel, (0, None))
+
+            if changed:
+                last_sequence = sequence
+                yield sequence, payload
+            else:
+                yield sequence, None
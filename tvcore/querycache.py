@@ -0,0 +1,44 @@
+from collections import OrderedDict
+from typing import Any, Hashable
+import threading
+
+MISS = object()
+
+
+class QueryCache:
+    """
+    LRU cache of query results, each stored with the versions of the tables it was read from.
+    An entry is only returned while those versions are unchanged, so a write to any of its
+    tables invalidates it.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+
+        self._entries: OrderedDict[Hashable, tuple[tuple, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, versions: tuple) -> Any:
+        """Returns the cached result, or MISS if there is none for these table versions"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISS
+
+            if entry[0] != versions:
+                del self._entries[key]
+                return MISS
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Hashable, versions: tuple, result: Any):
+        with self._lock:
+            self._entries[key] = (versions, result)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,154 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+import threading
+import logging
+import time
+import sys
+import re
+
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+DATABASE_MODULES = ("tvdatabase.py", "asyncdatabase.py")
+
+_PARAMETER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_ROW_LIST = re.compile(r"(\(\?(?:\.\.\.)?\))(?:\s*,\s*\(\?(?:\.\.\.)?\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_sql(statement: str) -> str:
+    """Collapses whitespace, IN lists and multi-row VALUES so statements differing only in list length share an entry"""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _PARAMETER_LIST.sub("?...", statement)
+    return _ROW_LIST.sub(r"\1, ...", statement)
+
+
+@dataclass
+class StatementStats:
+    count: int = 0
+    total_ms: float = 0
+    max_ms: float = 0
+    rows: int = 0 #Rows affected by writes; SQLite has no count for SELECT until its rows are fetched
+    slow: int = 0
+    histogram: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    callers: Counter = field(default_factory=Counter)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0,
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "slow": self.slow,
+            "histogram": dict(zip([f"<={bucket}ms" for bucket in LATENCY_BUCKETS_MS] + ["slower"], self.histogram)),
+            "callers": dict(self.callers.most_common(5)),
+        }
+
+
+class QueryMetrics:
+    """
+    Per-statement timings for the engines it is attached to, keyed by normalized SQL, with the
+    TVDatabase method that ran each statement. Statements slower than `slow_query_ms` are logged
+    with their query plan.
+
+    Nothing is hooked into an engine until attach() is called, so when metrics are off they cost nothing.
+    """
+    def __init__(self, slow_query_ms: float = None):
+        self.slow_query_ms = slow_query_ms
+        self.started = time.time()
+
+        self._stats: dict[str, StatementStats] = {}
+        self._engines: list[Engine] = []
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._engines)
+
+    def attach(self, engine: Engine):
+        if engine in self._engines:
+            return
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        self._engines.append(engine)
+
+    def detach(self, engine: Engine):
+        if engine not in self._engines:
+            return
+        event.remove(engine, "before_cursor_execute", self._before)
+        event.remove(engine, "after_cursor_execute", self._after)
+        self._engines.remove(engine)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        """Statistics per statement, the ones with the most total time first"""
+        with self._lock:
+            statements = sorted(self._stats.items(), key=lambda item: item[1].total_ms, reverse=True)
+            return {
+                "since": self.started,
+                "slow_query_ms": self.slow_query_ms,
+                "buckets_ms": list(LATENCY_BUCKETS_MS),
+                "statements": [{"sql": sql, **stats.to_dict()} for sql, stats in statements],
+            }
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        sql = normalize_sql(statement)
+        caller = self._caller()
+        is_slow = self.slow_query_ms is not None and elapsed_ms >= self.slow_query_ms
+
+        with self._lock:
+            stats = self._stats.setdefault(sql, StatementStats())
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.histogram[self._bucket(elapsed_ms)] += 1
+            stats.callers[caller] += 1
+            if cursor.rowcount > 0:
+                stats.rows += cursor.rowcount
+            if is_slow:
+                stats.slow += 1
+
+        if is_slow:
+            logging.warning(
+                "Slow query (%.1f ms) from %s: %s\n%s",
+                elapsed_ms, caller, sql, self._query_plan(cursor, statement, parameters, executemany)
+            )
+
+    @staticmethod
+    def _bucket(elapsed_ms: float) -> int:
+        for i, bucket in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bucket:
+                return i
+        return len(LATENCY_BUCKETS_MS)
+
+    @staticmethod
+    def _caller() -> str:
+        """Name of the innermost public TVDatabase method on the stack"""
+        frame = sys._getframe(3)
+        while frame is not None:
+            code = frame.f_code
+            if Path(code.co_filename).name in DATABASE_MODULES and not code.co_name.startswith("_") and code.co_name != "wrapper":
+                return code.co_name
+            frame = frame.f_back
+        return "?"
+
+    @staticmethod
+    def _query_plan(cursor, statement: str, parameters, executemany: bool) -> str:
+        if executemany:
+            return "(no plan for executemany)"
+        try:
+            rows = cursor.connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        except Exception as e:
+            return f"(no plan: {e})"
+        return "\n".join(f"  {row[-1]}" for row in rows)
@@ -0,0 +1,44 @@
+from urllib.parse import urlsplit
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token bucket: allows bursts of up to `capacity` requests, refilled at `rate` tokens per second.
+    acquire() waits until a token is free, so callers are spread out instead of rejected.
+    """
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """One TokenBucket per host, so requests to different APIs don't hold each other back"""
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: dict[str, TokenBucket] = {}
+
+    async def acquire(self, url: str):
+        host = urlsplit(url).netloc
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rate, self.capacity)
+        await self._buckets[host].acquire()
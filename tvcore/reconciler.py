@@ -0,0 +1,162 @@
+from .tvdatabase import TVDatabase, Schedule
+from .mediapathmanager import MediaPathManager
+from .tvconstants import *
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from slugify import slugify
+import logging
+import time
+import os
+
+FILE_COLUMNS = ("status", "filepath", "file_size", "download_date")
+MEDIA_EXTENSIONS = (".mp4", ".m4v", ".mkv", ".webm")
+
+
+@dataclass
+class FileState:
+    size: int
+    ctime: float
+
+
+@dataclass
+class ReconcileReport:
+    checked: int = 0
+    available: list[int] = field(default_factory=list) #Schedule ids whose file turned up
+    missing: list[int] = field(default_factory=list) #Schedule ids whose file is gone
+    deleted: list[int] = field(default_factory=list) #Schedule ids whose file was removed by cleanup
+    updated: list[int] = field(default_factory=list) #Schedule ids with any column changed
+    elapsed_ms: float = 0
+
+    def __str__(self):
+        return (
+            f"{self.checked} checked, {len(self.updated)} updated "
+            f"({len(self.available)} available, {len(self.missing)} missing, {len(self.deleted)} deleted) "
+            f"in {self.elapsed_ms:.1f} ms"
+        )
+
+
+class ScheduleReconciler:
+    """
+    Brings the file columns of the schedule in line with the download tree. The tree is listed once,
+    diffed against the schedule rows in memory, and only the rows that differ are written, in a single transaction.
+    """
+    def __init__(self, database: TVDatabase = None, paths: MediaPathManager = None):
+        self.database = database or TVDatabase()
+        self.paths = paths or MediaPathManager()
+
+    def snapshot(self) -> dict[str, FileState]:
+        """
+        Relative path -> size and ctime of every media file under the series, movies and ads folders.
+        HLS segment folders and index sidecars are skipped, they hold far more entries than the programs do.
+        """
+        files = {}
+        roots = (self.paths.series_path, self.paths.movies_path, self.paths.download_path / "ads")
+        stack = [root for root in roots if root.is_dir()]
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError as e:
+                logging.warning("Could not list %s: %s", e.filename, e)
+                continue
+
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.endswith("_hls"):
+                            stack.append(entry.path)
+                    elif entry.name.endswith(MEDIA_EXTENSIONS) and entry.is_file():
+                        stats = entry.stat()
+                        files[os.path.relpath(entry.path, self.paths.download_path)] = FileState(stats.st_size, stats.st_ctime)
+
+        return files
+
+    def expected_path(self, row: dict) -> str | None:
+        """
+        Where the file of a program is, relative to the download tree, by the same names the downloader uses.
+        Reruns play their original's file.
+        """
+        filepath = row.get("original_filepath") or row["filepath"]
+        if filepath:
+            return str(Path(filepath))
+
+        if row["episode_id"] and row["series_id"]:
+            slug = row["series_slug"] or slugify(row["series_title"])
+            filename = self.paths.create_episode_file_name(row["series_id"], row["episode_id"])
+            return str(self.paths.get_relative_episode_path(slug, filename))
+
+        if row["movie_id"]:
+            slug = row["movie_slug"] or slugify(row["movie_title"])
+            filename = self.paths.create_movie_file_name(row["movie_id"])
+            return str(self.paths.get_relative_movie_path(slug, filename))
+
+        return None
+
+    def verify(self, start: date = None, days=3) -> ReconcileReport:
+        """Marks the programs starting in the next `days` days available or missing depending on their files"""
+        started = time.perf_counter()
+        start = datetime.combine(start or date.today(), datetime.min.time())
+
+        files = self.snapshot()
+        rows = self.database.get_file_states(start, start + timedelta(days=days))
+
+        report = ReconcileReport(checked=len(rows))
+        changes = []
+        for row in rows:
+            path = self.expected_path(row)
+            state = files.get(path) if path else None
+
+            if state is not None:
+                wanted = {
+                    "status": STATUS_AVAILABLE,
+                    "filepath": path,
+                    "file_size": state.size,
+                    "download_date": date.fromtimestamp(state.ctime),
+                }
+            elif row["status"] == STATUS_DOWNLOADING:
+                continue #The file shows up when the download finishes
+            else:
+                wanted = {"status": STATUS_MISSING, "filepath": None, "file_size": None, "download_date": None}
+
+            if all(row[column] == wanted[column] for column in FILE_COLUMNS):
+                continue
+
+            changes.append({"id": row["id"], **wanted})
+            report.updated.append(row["id"])
+            if wanted["status"] != row["status"]:
+                (report.available if state is not None else report.missing).append(row["id"])
+
+        self.database.update_many(Schedule, changes)
+
+        report.elapsed_ms = (time.perf_counter() - started) * 1000
+        return report
+
+    def cleanup(self, programs: list) -> ReconcileReport:
+        """Deletes the files of the given programs and clears their file columns in one transaction"""
+        started = time.perf_counter()
+        files = self.snapshot()
+
+        report = ReconcileReport(checked=len(programs))
+        removed = set()
+        changes = []
+        for program in programs:
+            path = str(Path(program.filepath)) if program.filepath else None
+
+            if path in files and path not in removed:
+                try:
+                    self.paths.get_full_path(path).unlink()
+                    removed.add(path)
+                except OSError as e:
+                    logging.error("Error deleting %s: %s", path, e)
+                    continue
+
+            #Reruns can share a file, so the later ones count as deleted too
+            status = STATUS_DELETED if path in removed else STATUS_MISSING
+            changes.append({"id": program.id, "status": status, "filepath": None, "file_size": None, "download_date": None})
+            report.updated.append(program.id)
+            (report.deleted if status == STATUS_DELETED else report.missing).append(program.id)
+
+        self.database.update_many(Schedule, changes)
+
+        report.elapsed_ms = (time.perf_counter() - started) * 1000
+        return report
@@ -1,5 +1,5 @@
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator, AliasChoices
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator, AliasChoices, TypeAdapter
 from datetime import datetime, time, date, timedelta
 import json
 import isodate
@@ -8,7 +8,6 @@ from .helper import parse_aspnet_date, same_iso_week_this_year
 import math
 
 from typing import Literal
-Channel = Literal["nrk1", "nrk2"]
 
 class NRKInputCategory(BaseModel):
     display_value: str = Field(alias="displayValue")
@@ -33,7 +32,7 @@ class NRKInput(BaseModel):
     category: NRKInputCategory
     availability: NRKInputStatus
 
-    channel: Channel = None
+    channel: str | None = None #Name of the registered channel
 
     source_url: str | None = None
 
@@ -204,6 +203,7 @@ class ScheduleOutput(BaseModel):
     start: datetime
     end: datetime | None
     rerun: bool
+    rerun_of: int | None = None
     channel: str
     
     filepath: str | None
@@ -216,6 +216,45 @@ class ScheduleOutput(BaseModel):
     episode: EpisodeOutput | None
     movie: MovieOutput | None
 
+class ChannelOutput(BaseModel):
+    model_config = {"from_attributes": True}
+
+    id: int
+    name: str
+    display_name: str
+    epg_source: str | None
+    source_channel: str | None
+    position: int
+    enabled: bool
+
+class ScheduleSlim(BaseModel):
+    """What a channel strip or now/next listing needs"""
+    id: int
+    channel: str
+    title: str | None
+    start: datetime
+    end: datetime | None
+    status: str
+    rerun: bool
+
+class ScheduleGuide(ScheduleSlim):
+    """What the TV guide shows for each program"""
+    episode_id: int | None
+    movie_id: int | None
+    series_title: str | None
+    season_number: int | None
+    episode_number: int | None
+    description: str | None
+    duration: float | None
+
+ScheduleProfile = Literal["slim", "guide", "full"]
+
+#Validate whole result sets in one call instead of one model_validate per row
+SCHEDULE_PROFILE_ADAPTERS = {
+    "slim": TypeAdapter(list[ScheduleSlim]),
+    "guide": TypeAdapter(list[ScheduleGuide]),
+}
+
 
 class YTDLPInput(BaseModel):
     program_id: str | None = Field(None, alias="id")
@@ -288,12 +327,54 @@ class UpdateConfig(BaseModel):
 class VideoConfig(BaseModel):
     quality: str | int
 
+class StreamingConfig(BaseModel):
+    playout: Literal["mp4", "hls"] = "mp4"
+    hls_segment_seconds: int = 6
+    hls_window_segments: int = 6
+    offload: Literal["x-accel", "x-sendfile"] | None = None
+    offload_prefix: str = "/protected-media/"
+    media_cache_mb: int = 256
+    media_cache_head_mb: int = 8
+    live_max_clients: int = 32 #Each /live client holds a worker thread
+
+class DatabaseConfig(BaseModel):
+    metrics: bool = False #Record per-statement timings, served on /admin/metrics/db
+    slow_query_ms: float | None = None #Log the query plan of statements slower than this
+
+class EPGConfig(BaseModel):
+    requests_per_second: float = 2 #Per host
+    burst: int = 4
+    concurrency: int = 8 #Requests in flight at once
+    retries: int = 3
+    backoff_seconds: float = 1 #Doubled on every retry
+    timeout_seconds: float = 30
+    sources: dict[str, dict] = {} #Overrides of the limits above per EPG source, e.g. {"nrk": {"concurrency": 4}}
+    cache_dir: str | None = "cache/epg" #Relative to the repository. None turns the response cache off.
+    cache_max_age_days: float = 30 #Cached days are used without asking upstream until this old, then revalidated
+    offline: bool = False #Only replay cached responses
+
+    @field_validator("sources")
+    @classmethod
+    def known_settings(cls, sources: dict[str, dict]) -> dict[str, dict]:
+        for source, overrides in sources.items():
+            unknown = set(overrides) - set(cls.model_fields)
+            if unknown:
+                raise ValueError(f"Unknown EPG settings for {source}: {', '.join(sorted(unknown))}")
+        return sources
+
+    def for_source(self, source: str) -> "EPGConfig":
+        """This config with the overrides of one source applied, validated like the config itself"""
+        return EPGConfig.model_validate({**self.model_dump(), **self.sources.get(source, {})})
+
 class TVConfig(BaseModel):
     language: str = "en"
     schedule: ScheduleConfig
     paths: PathsConfig
     updates: UpdateConfig
     video: VideoConfig
+    streaming: StreamingConfig = StreamingConfig()
+    database: DatabaseConfig = DatabaseConfig()
+    epg: EPGConfig = EPGConfig()
     genres: list[str]
     
     @classmethod
@@ -1,17 +1,32 @@
 import logging
-from sqlalchemy import Column, Integer, String, Boolean, Float, Date, Time, DateTime, ForeignKey, Text, JSON, create_engine, and_, or_, case, func, desc, text, inspect
-from sqlalchemy.orm import relationship, sessionmaker, Session, DeclarativeBase, joinedload, Mapped
+import threading
+import functools
+import sqlite3
+import time
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError: #Windows
+    fcntl = None
+    import msvcrt
+from sqlalchemy import Column, Integer, String, Boolean, Float, Date, Time, DateTime, ForeignKey, Text, JSON, create_engine, event, Index, and_, or_, case, func, desc, text, inspect, literal, literal_column, cast, tuple_
+from sqlalchemy.engine import Engine
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy.orm import relationship, sessionmaker, Session, DeclarativeBase, joinedload, Mapped, aliased
 from sqlalchemy.sql import select, update, delete, exists, not_
 from sqlalchemy.dialects.sqlite import insert
 from pathlib import Path
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from typing import Optional, List, Dict, Union
+from pydantic import BaseModel
 from pydantic_core import ValidationError
-import math
 
 from .tvconstants import *
-from .schemas import ScheduleOutput, SeriesOutput, EpisodeOutput, MovieOutput
+from .schemas import ChannelOutput, ScheduleOutput, SeriesOutput, EpisodeOutput, MovieOutput, ScheduleSlim, ScheduleGuide, ScheduleProfile, SCHEDULE_PROFILE_ADAPTERS
 from .metadatafetcher import MetaDataFetcher
+from .querycache import QueryCache, MISS
 
 class Base(DeclarativeBase):
     pass
@@ -58,7 +73,7 @@ class Episode(Base):
 
     #ID's
     id: Mapped[int] = Column(Integer, primary_key=True)
-    series_id: Mapped[int] = Column(Integer, ForeignKey('series.id'), nullable=False)
+    series_id: Mapped[int] = Column(Integer, ForeignKey('series.id'), nullable=False, index=True)
     program_id: Mapped[str] = Column(Text, unique=True)
     tmdb_id: Mapped[int] = Column(Integer, unique=True)
 
@@ -76,6 +91,12 @@ class Episode(Base):
 
 class Schedule(Base):
     __tablename__ = 'schedule'
+    __table_args__ = (
+        Index("ix_schedule_channel_status_start", "channel", "status", "start"),
+        Index("ix_schedule_status_start", "status", "start"),
+        Index("ix_schedule_start", "start"),
+        Index("ix_schedule_end_stale", "id", sqlite_where=text("end_stale")),
+    )
 
     #ID's    
     id: Mapped[int] = Column(Integer, primary_key=True)
@@ -89,6 +110,7 @@ class Schedule(Base):
     start: Mapped[datetime] = Column(DateTime, nullable=False)
     end: Mapped[datetime] = Column(DateTime, nullable=False)
     rerun: Mapped[bool] = Column(Boolean, default=False, nullable=False)
+    rerun_of: Mapped[int] = Column(Integer, ForeignKey('schedule.id', ondelete="SET NULL"), index=True) #The airing this one repeats, sharing its file
     channel: Mapped[str] = Column(Text)
     
     filepath: Mapped[str] = Column(Text)
@@ -97,6 +119,7 @@ class Schedule(Base):
     status: Mapped[str] = Column(Text, default=STATUS_PENDING, nullable=False)
     last_aired: Mapped[date] = Column(Date)
     views: Mapped[int] = Column(Integer)
+    end_stale: Mapped[bool] = Column(Boolean, nullable=False, server_default=text("1")) #Set by triggers when the linked duration changes
     
     # Relationships
     episode = relationship("Episode", back_populates="schedule_entries", lazy="selectin")
@@ -107,11 +130,19 @@ Media = Union[Series, Episode, Movie, Schedule]
   
 class Channels(Base):
     __tablename__ = 'channels'
+    __table_args__ = (
+        Index("ux_channels_name", "name", unique=True),
+    )
 
     id: Mapped[int] = Column(Integer, primary_key=True)
     name: Mapped[str] = Column(Text, nullable=False)
     display_name: Mapped[str] = Column(Text, nullable=False)
 
+    epg_source: Mapped[str] = Column(Text) #Name of the EPG source adapter, see epgsources.py. None for channels scheduled by hand.
+    source_channel: Mapped[str] = Column(Text) #The channel's id at its EPG source
+    position: Mapped[int] = Column(Integer, nullable=False, server_default="0")
+    enabled: Mapped[bool] = Column(Boolean, nullable=False, server_default=text("1"))
+
 class Genres(Base):
     __tablename__ = 'genres'
 
@@ -119,9 +150,192 @@ class Genres(Base):
     name: Mapped[str] = Column(Text, nullable=False)
     display_name: Mapped[str] = Column(Text, nullable=False)
 
+class ScheduleArchive(Base):
+    """Weekly aggregate of schedule rows moved out of the schedule table (see archive_schedule)"""
+    __tablename__ = 'schedule_archive'
+
+    id: Mapped[int] = Column(Integer, primary_key=True)
+    week: Mapped[date] = Column(Date, nullable=False) #Monday of the ISO week
+    channel: Mapped[str] = Column(Text)
+    title: Mapped[str] = Column(Text, nullable=False)
+
+    series_id: Mapped[int] = Column(Integer)
+    episode_id: Mapped[int] = Column(Integer)
+    movie_id: Mapped[int] = Column(Integer)
+
+    airings: Mapped[int] = Column(Integer, nullable=False)
+    reruns: Mapped[int] = Column(Integer, nullable=False)
+    first_start: Mapped[datetime] = Column(DateTime, nullable=False)
+    last_start: Mapped[datetime] = Column(DateTime, nullable=False)
+
+ARCHIVE_KEY = (
+    ScheduleArchive.week,
+    ScheduleArchive.channel,
+    ScheduleArchive.title,
+    func.coalesce(ScheduleArchive.episode_id, literal_column("0")),
+    func.coalesce(ScheduleArchive.movie_id, literal_column("0")),
+)
+Index("ux_schedule_archive_program", *ARCHIVE_KEY, unique=True)
+
+class PlayoutState(Base):
+    """Where the live HLS playlist of a channel last started, and its discontinuity sequence there (see HLSPlayout)"""
+    __tablename__ = 'playout_state'
+
+    channel: Mapped[str] = Column(Text, primary_key=True)
+    first_slot: Mapped[int] = Column(Integer, nullable=False)
+    discontinuity_sequence: Mapped[int] = Column(Integer, nullable=False)
+
+class TableVersion(Base):
+    """Write counter per table, bumped once per committed transaction that wrote the table (see _bump_written_versions)"""
+    __tablename__ = 'table_versions'
+
+    table_name: Mapped[str] = Column(Text, primary_key=True)
+    version: Mapped[int] = Column(Integer, nullable=False)
+    modified: Mapped[datetime] = Column(DateTime, nullable=False)
+
+
+
+# Applied to every new SQLite connection. WAL lets readers (streaming) and a writer (the preparer)
+# work at the same time, and busy_timeout makes a blocked writer wait instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": 5000, #ms
+    "cache_size": -64000, #KiB when negative
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+#Bound parameters allowed per statement, raised from 999 in SQLite 3.32
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+MIGRATIONS_PATH = Path(__file__).parent / "migrations"
+BASELINE_REVISION = "0001" #The schema create_all made before migrations existed
+
+@contextmanager
+def _migration_lock(db_path: Path):
+    """
+    Exclusive lock on a file next to the database. Several workers starting at once would otherwise
+    race on the Alembic stamp and upgrade, and fail with SQLITE_BUSY or a duplicate stamp.
+    """
+    with open(db_path.with_name(f"{db_path.name}.migrate.lock"), "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _run_migrations(engine: Engine):
+    """
+    Brings a database up to the latest migration, one process at a time. Databases made before
+    migrations existed are stamped at the baseline first.
+    """
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_PATH))
+    config.attributes["target_metadata"] = Base.metadata
+
+    with _migration_lock(Path(engine.url.database)), engine.begin() as connection:
+        config.attributes["connection"] = connection
+
+        if MigrationContext.configure(connection).get_current_revision() is None and inspect(connection).has_table(Schedule.__tablename__):
+            command.stamp(config, BASELINE_REVISION)
+
+        command.upgrade(config, "head")
+
+def _track_flushed_tables(session: Session, flush_context):
+    written = session.info.setdefault("written_tables", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        written.add(obj.__table__.name)
+
+def _track_statement_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info.setdefault("written_tables", set()).add(orm_execute_state.statement.table.name)
+
+def _bump_written_versions(session: Session):
+    """
+    Bumps the version of every table the transaction wrote, with one UPDATE when it commits.
+    Writes that bypass TVDatabase sessions (e.g. the sqlite3 shell) have to bump table_versions themselves.
+    """
+    session.flush()
+    written = session.info.pop("written_tables", set()) - {TableVersion.__tablename__}
+    if written:
+        session.execute(
+            update(TableVersion).where(
+                TableVersion.table_name.in_(sorted(written))
+            ).values(
+                version=TableVersion.version + 1,
+                modified=func.current_timestamp()
+            )
+        )
+        session.info.pop("written_tables", None)
+
+def _forget_written_tables(session: Session):
+    session.info.pop("written_tables", None)
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+VERSION_CHECK_INTERVAL = 1 #Seconds a snapshot of table_versions is trusted before it is read again
+
+def cached_query(*tables: str):
+    """
+    Caches the results of a read method per database and arguments, until one of the tables it
+    reads from is written. Callers get their own list, with copies of any models or dicts in it;
+    ORM rows are shared and must not be modified.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (self._db_key, method.__name__, args, tuple(sorted(kwargs.items())))
+            versions = tuple(self.get_table_version(table) for table in tables)
+
+            try:
+                result = self._query_cache.get(key, versions)
+            except TypeError: #Unhashable arguments
+                return method(self, *args, **kwargs)
+
+            if result is MISS:
+                result = method(self, *args, **kwargs)
+                self._query_cache.put(key, versions, result)
+
+            return _copy_result(result)
+        return wrapper
+    return decorator
+
+
+def _copy_result(result):
+    if isinstance(result, list):
+        return [_copy_result(item) for item in result]
+    if isinstance(result, BaseModel):
+        return result.model_copy()
+    if isinstance(result, dict):
+        return dict(result)
+    return result
 
 
 class TVDatabase:
+    # One engine and session factory per database file, shared by every TVDatabase in the process
+    _engines: Dict[Path, tuple[Engine, sessionmaker]] = {}
+    _engine_lock = threading.Lock()
+
+    # Snapshot of the table_versions table per database file: (monotonic time read, {table: (version, modified)}).
+    # Readers such as the BroadcastMonitor timeline and the query cache compare versions to know when cached data is stale.
+    _version_snapshots: Dict[Path, tuple[float, Dict[str, tuple[int, datetime]]]] = {}
+    _query_cache = QueryCache(max_entries=256)
+
     def __init__(self, test_time=None, db_path=""):
         if db_path:
             self.db_path = Path(db_path)
@@ -130,26 +344,76 @@ class TVDatabase:
         
         self.test_time = test_time
         
-        # Create engine and session factory
-        self.engine = create_engine(f'sqlite:///{self.db_path}', echo=False)
-        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.engine, self.SessionLocal = self._get_engine(self.db_path)
+        self._db_key = self.db_path.resolve()
         
         self.metadatafetcher = MetaDataFetcher()
-        
-        # Setup database if it doesn't exist
-        if not self.db_path.exists():
-            self.db_path.parent.mkdir(parents=True, exist_ok=True)
-            self.setup_database()
+
+    @classmethod
+    def _get_engine(cls, db_path: Path) -> tuple[Engine, sessionmaker]:
+        """Returns the shared engine and session factory for a database file, creating or migrating the schema on first use"""
+        key = db_path.resolve()
+
+        with cls._engine_lock:
+            if key not in cls._engines:
+                key.parent.mkdir(parents=True, exist_ok=True)
+
+                engine = create_engine(f'sqlite:///{key}', echo=False)
+                event.listen(engine, "connect", _apply_pragmas)
+                _run_migrations(engine)
+
+                session_factory = sessionmaker(bind=engine)
+                event.listen(session_factory, "after_flush", _track_flushed_tables)
+                event.listen(session_factory, "do_orm_execute", _track_statement_tables)
+                event.listen(session_factory, "before_commit", _bump_written_versions)
+                event.listen(session_factory, "after_rollback", _forget_written_tables)
+
+                cls._engines[key] = (engine, session_factory)
+
+            return cls._engines[key]
     
     def get_session(self) -> Session:
         """Create and return a new database session"""
         return self.SessionLocal()
+
+    # VERSIONING
+
+    def get_table_version(self, table: str) -> int:
+        """Returns the number of committed transactions that wrote to a table, by any process"""
+        return self._get_versions().get(table, (0, None))[0]
+
+    def get_table_modified(self, table: str) -> datetime:
+        """Returns when a table was last written (UTC)"""
+        modified = self._get_versions().get(table, (0, None))[1]
+        if modified is None:
+            return datetime.fromtimestamp(0, timezone.utc)
+        return modified.replace(tzinfo=timezone.utc)
+
+    def _get_versions(self) -> Dict[str, tuple[int, datetime]]:
+        """
+        Returns the table versions, read from the database at most every VERSION_CHECK_INTERVAL seconds.
+        Writes by this process are seen at once, writes by other processes within the interval.
+        """
+        snapshot = self._version_snapshots.get(self._db_key)
+        if snapshot is not None and time.monotonic() - snapshot[0] < VERSION_CHECK_INTERVAL:
+            return snapshot[1]
+
+        with self.get_session() as session:
+            rows = session.execute(select(TableVersion.table_name, TableVersion.version, TableVersion.modified)).all()
+
+        versions = {table: (version, modified) for table, version, modified in rows}
+        self._version_snapshots[self._db_key] = (time.monotonic(), versions)
+        return versions
+
+    def _bump_version(self, *models: type[Base]):
+        """Called after writes. The commit has already counted them, so this only drops the stale snapshot."""
+        self._version_snapshots.pop(self._db_key, None)
     
     # SETUP
     
     def setup_database(self):
-        """Sets up database tables if they don't already exist."""
-        Base.metadata.create_all(self.engine)
+        """Sets up database tables if they don't already exist, by applying any pending migrations."""
+        _run_migrations(self.engine)
     
     def reset_database(self):
         """
@@ -175,6 +439,8 @@ class TVDatabase:
             
             session.commit()
 
+        self._bump_version(Schedule)
+
 
     #GENERAL CRUD OPERATIONS
 
@@ -197,16 +463,20 @@ class TVDatabase:
             if model is None:
                 return results
 
-            validated = []
-            for row in results:
-                try:
-                    validated.append(model.model_validate(row))
-                except ValidationError as e:
-                    logging.warning(f"Skipping invalid row {getattr(row, 'id', '?')}: {e}")
-                except Exception as e:
-                    logging.error(f"Unexpected error validating row: {e}")
+            return self._validate(results, model)
 
-            return validated
+    @staticmethod
+    def _validate(rows, model: type[BaseModel]) -> list:
+        validated = []
+        for row in rows:
+            try:
+                validated.append(model.model_validate(row))
+            except ValidationError as e:
+                logging.warning(f"Skipping invalid row {getattr(row, 'id', '?')}: {e}")
+            except Exception as e:
+                logging.error(f"Unexpected error validating row: {e}")
+
+        return validated
         
     def get(self, obj: Media) -> Media:
         with self.get_session() as session:
@@ -233,6 +503,7 @@ class TVDatabase:
             session.add(obj)
             session.commit()
             session.refresh(obj)
+            self._bump_version(type(obj))
 
             return obj.id
     
@@ -248,17 +519,188 @@ class TVDatabase:
             session.merge(obj)
             session.commit()
 
+        self._bump_version(type(obj))
+
     def upsert_on_column(self, obj: Media, index_elements):
-        """Adds or updates an entry in the database based on the presence of a primary ID."""
+        """Adds or updates an entry in the database based on the values of the index_elements columns."""
         with self.get_session() as session:
             model, data = self._to_model(obj)
-            update_dict = {col: getattr(stmt.excluded, col) for col in data.keys() if col not in index_elements}
 
             stmt = insert(model).values(**data)
-            stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=update_dict)
+            update_dict = {col: getattr(stmt.excluded, col) for col in data.keys() if col not in index_elements}
+            if update_dict:
+                stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=update_dict)
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+
             session.execute(stmt)
             session.commit()
 
+        self._bump_version(type(obj))
+
+    # BULK OPERATIONS
+
+    def _group_rows(self, objs: list[Media]) -> dict[tuple[type, tuple[str, ...]], list[tuple[int, dict]]]:
+        """Groups objects by table and set of non-empty columns, since one multi-row INSERT needs the same columns in every row"""
+        groups = {}
+        for i, obj in enumerate(objs):
+            model, data = self._to_model(obj)
+            groups.setdefault((model, tuple(sorted(data))), []).append((i, data))
+        return groups
+
+    @staticmethod
+    def _chunks(rows: list, columns: int):
+        """Splits rows so that no statement goes over SQLite's limit on bound parameters"""
+        size = max(1, SQLITE_MAX_VARIABLES // max(columns, 1))
+        for start in range(0, len(rows), size):
+            yield rows[start:start + size]
+
+    @contextmanager
+    def transaction(self):
+        """Session committed when the block ends, for bulk writes to several tables that must land together"""
+        with self.get_session() as session:
+            yield session
+            session.commit()
+
+        self._bump_version()
+
+    def add_many(self, objs: list[Media], session: Session = None) -> list[int]:
+        """
+        Inserts many rows in one transaction, with one multi-row INSERT per table (and column set).
+        Returns the ids of the new rows in the order of objs. Pass a session from transaction() to
+        make the insert part of a larger transaction.
+        """
+        ids = [None] * len(objs)
+        if not objs:
+            return ids
+
+        if session is None:
+            with self.transaction() as session:
+                return self.add_many(objs, session)
+
+        for (model, columns), rows in self._group_rows(objs).items():
+            for chunk in self._chunks(rows, len(columns)):
+                stmt = insert(model).values([data for _, data in chunk]).returning(model.id)
+                new_ids = session.execute(stmt).scalars().all()
+
+                if "id" not in columns:
+                    #Autoincrement ids are handed out in the order of the VALUES rows, while RETURNING order isn't guaranteed
+                    new_ids = sorted(new_ids)
+                else:
+                    new_ids = [data["id"] for _, data in chunk]
+
+                for (i, _), new_id in zip(chunk, new_ids):
+                    ids[i] = new_id
+
+        return ids
+
+    def add_missing(self, objs: list[Media], unique_on: list[str], session: Session = None) -> list[int]:
+        """
+        Bulk version of add() with unique_on: objects whose unique_on values match an existing row, or an
+        earlier object in the list, get that row's id, and the rest are inserted with add_many.
+        Existing rows are looked up with a few IN queries. Returns an id for every object, in order.
+        """
+        ids = [None] * len(objs)
+        if not objs:
+            return ids
+
+        if session is None:
+            with self.transaction() as session:
+                return self.add_missing(objs, unique_on, session)
+
+        model = type(objs[0])
+        columns = [getattr(model, col) for col in unique_on]
+        keys = [self._unique_key(getattr(obj, col) for col in unique_on) for obj in objs]
+
+        known = {}
+        lookup = list(dict.fromkeys(key for key in keys if None not in key))
+        for chunk in self._chunks(lookup, len(columns)):
+            if len(columns) == 1:
+                condition = columns[0].in_([key[0] for key in chunk])
+            else:
+                condition = tuple_(*columns).in_(chunk)
+
+            for row in session.execute(select(model.id, *columns).where(condition).order_by(model.id)):
+                known.setdefault(self._unique_key(row[1:]), row[0])
+
+        #Insert the first object of every unknown key. Objects missing a unique value can't be matched, so they are always inserted.
+        seen = set()
+        inserted = []
+        for i, key in enumerate(keys):
+            if key in known or key in seen:
+                continue
+            if None not in key:
+                seen.add(key)
+            inserted.append(i)
+
+        new_ids = dict(zip(inserted, self.add_many([objs[i] for i in inserted], session)))
+        for i in inserted:
+            known.setdefault(keys[i], new_ids[i])
+
+        return [new_ids[i] if i in new_ids else known[key] for i, key in enumerate(keys)]
+
+    @staticmethod
+    def _unique_key(values) -> tuple:
+        """Values as SQLite stores them, which drops the timezone of datetimes"""
+        return tuple(value.replace(tzinfo=None) if isinstance(value, datetime) else value for value in values)
+
+    def upsert_many(self, objs: list[Media], index_elements: list[str] = ("id",), update_columns: list[str] = None) -> list[int]:
+        """
+        Adds or updates many rows in one transaction, with one multi-row INSERT ... ON CONFLICT DO UPDATE
+        per table (and column set). Rows conflicting on index_elements get the columns they set updated,
+        or only update_columns if given. Every object needs values for index_elements. Of objects with
+        the same key, the last one is written.
+
+        Returns the id of each row, new or existing, in the order of objs.
+        """
+        ids = [None] * len(objs)
+        if not objs:
+            return ids
+
+        index_elements = list(index_elements)
+
+        with self.get_session() as session:
+            for (model, columns), rows in self._group_rows(objs).items():
+                missing = [col for col in index_elements if col not in columns]
+                if missing:
+                    raise ValueError(f"upsert_many on {model.__tablename__} needs values for {missing}")
+
+                to_update = [col for col in (update_columns or columns) if col in columns and col not in index_elements]
+                key_columns = [getattr(model, col) for col in index_elements]
+
+                #One statement can't update the same row twice, so only the last object per key is sent
+                keys = [self._unique_key(data[col] for col in index_elements) for _, data in rows]
+                latest = dict(zip(keys, rows))
+
+                returned = {}
+                for chunk in self._chunks(list(latest.values()), len(columns)):
+                    stmt = insert(model).values([data for _, data in chunk])
+                    #Updating a key column to itself is a no-op that still returns the id of existing rows
+                    set_ = {col: getattr(stmt.excluded, col) for col in (to_update or index_elements[:1])}
+                    stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+                    stmt = stmt.returning(model.id, *key_columns)
+
+                    returned.update((self._unique_key(row[1:]), row[0]) for row in session.execute(stmt))
+
+                for (i, _), key in zip(rows, keys):
+                    ids[i] = returned.get(key)
+
+            session.commit()
+
+        self._bump_version(*{type(obj) for obj in objs})
+        return ids
+
+    def update_many(self, model: type[Base], rows: list[dict]):
+        """Updates many rows by primary key in one transaction. Every dict needs an "id" and the columns to set."""
+        if not rows:
+            return
+
+        with self.get_session() as session:
+            session.execute(update(model), rows)
+            session.commit()
+
+        self._bump_version(model)
+
     def delete(self, obj: Media):
         """
         Deletes an entry from any table 
@@ -274,6 +716,7 @@ class TVDatabase:
             if db_obj :
                 session.delete(db_obj)
                 session.commit()
+                self._bump_version(type(obj))
 
                 return True
             return False
@@ -293,7 +736,8 @@ class TVDatabase:
                 db_obj  = session.get(type(obj), obj.id)
                 if db_obj :
                     session.delete(db_obj)
-                    session.commit()        
+                    session.commit()
+                    self._bump_version(type(obj))
 
     def delete2(self, obj: Media):
         """
@@ -310,11 +754,14 @@ class TVDatabase:
             stmt = delete(model).where(model.id == obj.id)
             session.execute(stmt)
             session.commit()
+
+        self._bump_version(model)
     
 
     # MEDIA CRUD OPERATIONS
         
     
+    @cached_query("series")
     def get_series(self, missing=False, series_id=None) -> List[Series]:
         """Returns series from the series-table. Defaults to all"""
         q = select(
@@ -338,6 +785,7 @@ class TVDatabase:
 
         return self._execute(q)
         
+    @cached_query("episodes", "series")
     def get_episodes(self, episode_id=None, series_id=None, missing=False) -> List[EpisodeOutput]:
         """
         Returns episodes from the series-table. Defaults to all
@@ -369,6 +817,7 @@ class TVDatabase:
 
         return self._execute(q, EpisodeOutput)
     
+    @cached_query("movies")
     def get_movies(self, movie_id=None, missing=False) -> List[MovieOutput]:
         """Returns movies from the movies-table. Defaults to all. """
         q = select(
@@ -402,9 +851,15 @@ class TVDatabase:
             local: Whether to filter for local programs only
             schedule: Whether to return pending episodes only from programs in the weekly schedule
         """
-        
+        return self._execute(self._pending_programs_query(strict, date), ScheduleOutput)
+
+    @classmethod
+    def _pending_programs_query(cls, strict:bool = False, date:date = None):
+        #Reruns play their original's file, which is downloaded for the original
         q = select(
             Schedule
+        ).where(
+            Schedule.rerun_of.is_(None)
         )
         
         if strict:
@@ -416,9 +871,9 @@ class TVDatabase:
             ]))
 
         if date:
-            q = q.where(func.date(Schedule.start) == date)
+            q = q.where(*cls._on_day(Schedule.start, date))
 
-        return self._execute(q, ScheduleOutput)      
+        return q
             
     def get_obsolete_programs(self) -> list[ScheduleOutput]:
         return self.get_obsolete_episodes() + self.get_obsolete_movies()
@@ -432,25 +887,122 @@ class TVDatabase:
         return self._obsolete_filter(Schedule.movie_id)
 
     def _obsolete_filter(self, id_column: Column[int]):
+        return self._execute(self._obsolete_query(id_column), ScheduleOutput)
+
+    @staticmethod
+    def _obsolete_query(id_column: Column[int]):
+        now = datetime.now()
         future_episode_ids = (
             select(id_column)
             .where(
-                Schedule.start > datetime.now(),
+                Schedule.start > now,
                 id_column.isnot(None)
             )
             .scalar_subquery()
         )
 
+        #A file is kept while any airing linked to it by rerun_of is still to come
+        linked = aliased(Schedule)
+        upcoming_link = (
+            select(linked.id)
+            .where(
+                or_(linked.rerun_of == Schedule.id, linked.id == Schedule.rerun_of),
+                linked.start > now
+            )
+            .exists()
+        )
+
         q = (
             select(Schedule)
             .where(
-                Schedule.start < datetime.now(),
+                Schedule.start < now,
                 Schedule.filepath.isnot(None),
-                id_column.not_in(future_episode_ids)
+                id_column.isnot(None), #NULL NOT IN an empty subquery is true, which listed episodes as obsolete movies too
+                id_column.not_in(future_episode_ids),
+                ~upcoming_link
             )
         )
 
-        return self._execute(q, ScheduleOutput)          
+        return q          
+
+    def get_file_states(self, start: datetime, end: datetime) -> list[dict]:
+        """
+        Returns the file columns of every program starting in the window, with the ids and slugs
+        needed to work out where its file should be, in one query. Reruns come with their original's filepath.
+        """
+        original = aliased(Schedule)
+        q = select(
+            Schedule.id,
+            Schedule.status,
+            Schedule.filepath,
+            original.filepath.label("original_filepath"),
+            Schedule.file_size,
+            Schedule.download_date,
+            Schedule.episode_id,
+            Schedule.movie_id,
+            Episode.series_id,
+            Series.slug.label("series_slug"),
+            Series.title.label("series_title"),
+            Movie.slug.label("movie_slug"),
+            Movie.title.label("movie_title")
+        ).select_from(
+            Schedule
+        ).where(
+            Schedule.start >= start,
+            Schedule.start < end
+        ).outerjoin(
+            Episode, Schedule.episode_id == Episode.id
+        ).outerjoin(
+            Movie, Schedule.movie_id == Movie.id
+        ).outerjoin(
+            Series, Episode.series_id == Series.id
+        ).outerjoin(
+            original, Schedule.rerun_of == original.id
+        ).order_by(
+            Schedule.start
+        )
+
+        with self.get_session() as session:
+            return [dict(row) for row in session.execute(q).mappings().all()]
+
+    def get_rerun_ids(self, schedule_id: int) -> list[int]:
+        """Returns the ids of the airings that rerun a program"""
+        with self.get_session() as session:
+            return list(session.scalars(select(Schedule.id).where(Schedule.rerun_of == schedule_id)))
+
+    def get_rerun_originals(self, start: datetime, end: datetime) -> list[dict]:
+        """
+        Returns the airings starting in the window that reruns can be linked to: linked to media, and not reruns themselves.
+        Each comes with the slug of its series and the program id of its episode or movie, which a rerun has to match.
+        """
+        q = select(
+            Schedule.id,
+            Schedule.title,
+            Schedule.start,
+            Schedule.channel,
+            Schedule.episode_id,
+            Schedule.movie_id,
+            Series.slug.label("series_slug"),
+            func.coalesce(Episode.program_id, Movie.program_id).label("program_id")
+        ).select_from(
+            Schedule
+        ).outerjoin(
+            Episode, Schedule.episode_id == Episode.id
+        ).outerjoin(
+            Series, Episode.series_id == Series.id
+        ).outerjoin(
+            Movie, Schedule.movie_id == Movie.id
+        ).where(
+            Schedule.start >= start,
+            Schedule.start < end,
+            Schedule.rerun_of.is_(None),
+            or_(Schedule.episode_id.isnot(None), Schedule.movie_id.isnot(None))
+        ).order_by(
+            Schedule.start
+        )
+
+        with self.get_session() as session:
+            return [dict(row) for row in session.execute(q).mappings().all()]
 
     def get_episode_by_details(self, series_id: int, season: int, episode: int) -> Optional[Dict]:
         """
@@ -466,8 +1018,63 @@ class TVDatabase:
             return self._to_dict(ep) if ep else None
         
         
-    def get_current_week_schedule(self, channel:str=None, date:datetime=None, full_week:bool=False) -> List[ScheduleOutput]:
-        """Returns all scheduled programs in the current week"""
+    @staticmethod
+    def _schedule_select(profile: ScheduleProfile):
+        """Select for schedule rows in an output profile. "full" loads ORM rows with their episode, series and movie."""
+        if profile == "full":
+            return select(Schedule)
+
+        columns = [
+            Schedule.id,
+            Schedule.channel,
+            Schedule.title,
+            Schedule.start,
+            Schedule.end,
+            Schedule.status,
+            Schedule.rerun,
+        ]
+
+        if profile == "guide":
+            columns += [
+                Schedule.episode_id,
+                Schedule.movie_id,
+                Series.title.label("series_title"),
+                Episode.season_number,
+                Episode.episode_number,
+                func.coalesce(Episode.description, Movie.description).label("description"),
+                func.coalesce(Episode.duration, Movie.duration).label("duration"),
+            ]
+
+        return select(*columns).select_from(Schedule)
+
+    def _execute_profile(self, query, profile: ScheduleProfile) -> List[ScheduleOutput] | List[ScheduleSlim] | List[ScheduleGuide]:
+        if profile == "full":
+            return self._execute(query, ScheduleOutput)
+
+        with self.get_session() as session:
+            try:
+                rows = session.execute(query).mappings().all()
+            except Exception as e:
+                logging.error(f"Database query failed: {e}")
+                return []
+
+        return self._validate_profile(rows, profile)
+
+    @classmethod
+    def _validate_profile(cls, rows, profile: ScheduleProfile) -> List[ScheduleSlim] | List[ScheduleGuide]:
+        try:
+            return SCHEDULE_PROFILE_ADAPTERS[profile].validate_python(rows)
+        except ValidationError as e:
+            logging.warning(f"Falling back to per-row validation: {e}")
+
+        return cls._validate(rows, ScheduleSlim if profile == "slim" else ScheduleGuide)
+
+    def get_current_week_schedule(self, channel:str=None, date:datetime=None, full_week:bool=False, profile: ScheduleProfile = "full") -> List[ScheduleOutput] | List[ScheduleSlim] | List[ScheduleGuide]:
+        """Returns all scheduled programs in the current week, in the given output profile"""
+        return self._execute_profile(self._current_week_query(channel, date, full_week, profile), profile)
+
+    @classmethod
+    def _current_week_query(cls, channel:str=None, date:datetime=None, full_week:bool=False, profile: ScheduleProfile = "full"):
         offset = timedelta(hours=4) #Marks the end of the air day, to include programs that starts late at night and ends after midnight
 
         if not date:
@@ -481,9 +1088,8 @@ class TVDatabase:
             start = date + offset
             end = start + timedelta(days=1)
 
-        q = select(
-                Schedule
-                #func.coalesce(Episode.description, Movie.description).label("description")
+        q = cls._schedule_select(
+                profile
             ).where(
                 Schedule.start.between(start,end),
                 Schedule.status.in_([STATUS_PENDING, STATUS_AVAILABLE, STATUS_DELETED])
@@ -495,30 +1101,46 @@ class TVDatabase:
                 Schedule.start
             )
 
+        if profile == "guide":
+            q = q.outerjoin(Series, Episode.series_id == Series.id)
+
         if channel:
             q = q.where(Schedule.channel == channel)
         
-        return self._execute(q, ScheduleOutput)
+        return q
             
-    def get_schedule(self, schedule_id = None, date: datetime = None, channel: str = None) -> List[ScheduleOutput]:
+    def get_schedule(self, schedule_id = None, date: datetime = None, channel: str = None, profile: ScheduleProfile = "full") -> List[ScheduleOutput] | List[ScheduleSlim] | List[ScheduleGuide]:
         """Get all programs that are in the weekly schedule"""
-        q = select(
-            Schedule
+        q = self._schedule_query(schedule_id, date, channel, profile)
+
+        if schedule_id:
+            if profile == "full":
+                return self._execute(q, ScheduleOutput, first=True)
+            return next(iter(self._execute_profile(q, profile)), None)
+
+        return self._execute_profile(q, profile)
+
+    @classmethod
+    def _schedule_query(cls, schedule_id = None, date: datetime = None, channel: str = None, profile: ScheduleProfile = "full"):
+        q = cls._schedule_select(
+            profile
         ).order_by(
             Schedule.start
         )
 
+        if profile == "guide":
+            q = q.outerjoin(Episode).outerjoin(Movie).outerjoin(Series, Episode.series_id == Series.id)
+
         if schedule_id:
-            q = q.where(Schedule.id == schedule_id)
-            return self._execute(q, ScheduleOutput, first=True)
+            return q.where(Schedule.id == schedule_id)
 
         if date:
-            q = q.where(func.date(Schedule.start) == date)
+            q = q.where(*cls._on_day(Schedule.start, date))
 
         if channel:
             q = q.where(Schedule.channel == channel)
         
-        return self._execute(q, ScheduleOutput)
+        return q
     
     def get_schedule_conflict(self, channel: str, start: datetime) -> List[ScheduleOutput]:
         """Get all programs that are in the weekly schedule"""
@@ -532,79 +1154,105 @@ class TVDatabase:
         
         return self._execute(q, ScheduleOutput, first=True)
     
-    def get_current_program_by_channel(self, channel: str, time=None) -> list[dict]:
-        if time is None:
-            time = datetime.now()
+    @staticmethod
+    def _program_columns():
+        """Columns needed to play out a scheduled program"""
+        return (
+            Schedule.id,
+            Schedule.channel,
+            Schedule.start,
+            Schedule.end,
+            Schedule.filepath,
+            Schedule.rerun,
+            Schedule.status,
+            Schedule.title,
+            func.coalesce(Episode.description, Movie.description).label("description"),
+            func.coalesce(Episode.duration, Movie.duration).label("duration")
+        )
 
+    def get_current_program_by_channel(self, channel: str, time=None) -> list[dict]:
         with self.get_session() as session:
-            q = select(
-                Schedule.id,
-                Schedule.channel,
-                Schedule.start,
-                Schedule.end,
-                Schedule.filepath,
-                Schedule.rerun,
-                Schedule.status,
-                Schedule.title,
-                func.coalesce(Episode.description, Movie.description).label("description"),
-                func.coalesce(Episode.duration, Movie.duration).label("duration")
-            ).where(
-                Schedule.start <= time,
-                Schedule.end >= time,
-                Schedule.status == STATUS_AVAILABLE,
-                Schedule.channel == channel
-            ).outerjoin(
-                Episode
-            ).outerjoin(
-                Movie
-            ).order_by(
-                Schedule.start
-            )
-
-            result = session.execute(q).mappings().first()
+            result = session.execute(self._current_program_query(channel, time)).mappings().first()
             if result:
                 return dict(result)
             else:
                 return None
             
     def get_next_program_by_channel(self, channel:str, time:datetime=None, limit=1) -> list[dict]:
-        if time is None:
-            time = datetime.now()
-
         with self.get_session() as session:
-            q = select(
-                Schedule.id,
-                Schedule.channel,
-                Schedule.start,
-                Schedule.end,
-                Schedule.filepath,
-                Schedule.rerun,
-                Schedule.status,
-                Schedule.title,
-                func.coalesce(Episode.description, Movie.description).label("description"),
-                func.coalesce(Episode.duration, Movie.duration).label("duration")
-            ).where(
-                Schedule.start >= time,
-                Schedule.status == STATUS_AVAILABLE,
-                Schedule.channel == channel
-            ).outerjoin(
-                Episode
-            ).outerjoin(
-                Movie
-            ).order_by(
-                Schedule.start
-            )
-
-            if limit:
-                end_time = time + timedelta(days=1)
-                q = q.where(Schedule.start < end_time)
-        
-            result = session.execute(q).mappings().first()
+            result = session.execute(self._next_program_query(channel, time, limit)).mappings().first()
             if result:
                 return dict(result)
             else:
                 return None
             
+    def get_programs_in_window(self, start: datetime, end: datetime) -> list[dict]:
+        """Returns available programs on all channels that overlap the window, ordered by channel and start"""
+        with self.get_session() as session:
+            return [dict(row) for row in session.execute(self._programs_in_window_query(start, end)).mappings().all()]
+
+    @classmethod
+    def _current_program_query(cls, channel: str, time=None):
+        if time is None:
+            time = datetime.now()
+
+        return select(
+            *cls._program_columns()
+        ).where(
+            Schedule.start <= time,
+            Schedule.end >= time,
+            Schedule.status == STATUS_AVAILABLE,
+            Schedule.channel == channel
+        ).outerjoin(
+            Episode
+        ).outerjoin(
+            Movie
+        ).order_by(
+            Schedule.start
+        )
+
+    @classmethod
+    def _next_program_query(cls, channel:str, time:datetime=None, limit=1):
+        if time is None:
+            time = datetime.now()
+
+        q = select(
+            *cls._program_columns()
+        ).where(
+            Schedule.start >= time,
+            Schedule.status == STATUS_AVAILABLE,
+            Schedule.channel == channel
+        ).outerjoin(
+            Episode
+        ).outerjoin(
+            Movie
+        ).order_by(
+            Schedule.start
+        )
+
+        if limit:
+            end_time = time + timedelta(days=1)
+            q = q.where(Schedule.start < end_time)
+
+        return q
+
+    @classmethod
+    def _programs_in_window_query(cls, start: datetime, end: datetime):
+        return select(
+            *cls._program_columns()
+        ).where(
+            Schedule.start < end,
+            Schedule.end >= start,
+            Schedule.status == STATUS_AVAILABLE
+        ).outerjoin(
+            Episode
+        ).outerjoin(
+            Movie
+        ).order_by(
+            Schedule.channel,
+            Schedule.start
+        )
+
     # AIRING OPERATIONS
         
     def get_new_this_week(self, lookback_weeks: int = 3) -> list[ScheduleOutput]:
@@ -631,6 +1279,15 @@ class TVDatabase:
                     Episode, Schedule.episode_id == Episode.id
                 ).where(
                     Schedule.start.between(start, end)
+                ).union_all(
+                    #Archived weeks with an airing in the period
+                    select(
+                        ScheduleArchive.series_id,
+                        ScheduleArchive.movie_id
+                    ).where(
+                        ScheduleArchive.first_start <= end,
+                        ScheduleArchive.last_start >= start
+                    )
                 )
                 results = session.execute(q).all()
                 series_ids = {r.series_id for r in results if r.series_id}
@@ -657,38 +1314,224 @@ class TVDatabase:
 
             return self._execute(q, ScheduleOutput)
 
+    def get_airings(self, start: date, end: date) -> list[dict]:
+        """
+        Returns how often each program aired per channel from `start` up to `end`, counting both the
+        schedule and the archive. Archived weeks count whole, by the Monday of their week.
+        """
+        start = datetime.combine(start, datetime.min.time())
+        end = datetime.combine(end, datetime.min.time())
+
+        airings = select(
+            Schedule.channel,
+            Schedule.title,
+            Episode.series_id,
+            Schedule.episode_id,
+            Schedule.movie_id,
+            literal(1).label("airings"),
+            case((Schedule.rerun, 1), else_=0).label("reruns")
+        ).outerjoin(
+            Episode, Schedule.episode_id == Episode.id
+        ).where(
+            Schedule.start >= start,
+            Schedule.start < end
+        ).union_all(
+            select(
+                ScheduleArchive.channel,
+                ScheduleArchive.title,
+                ScheduleArchive.series_id,
+                ScheduleArchive.episode_id,
+                ScheduleArchive.movie_id,
+                ScheduleArchive.airings,
+                ScheduleArchive.reruns
+            ).where(
+                ScheduleArchive.week >= start.date(),
+                ScheduleArchive.week < end.date()
+            )
+        ).subquery()
+
+        q = select(
+            airings.c.channel,
+            airings.c.title,
+            airings.c.series_id,
+            airings.c.episode_id,
+            airings.c.movie_id,
+            func.sum(airings.c.airings).label("airings"),
+            func.sum(airings.c.reruns).label("reruns")
+        ).group_by(
+            airings.c.channel,
+            airings.c.title,
+            airings.c.episode_id,
+            airings.c.movie_id
+        ).order_by(
+            airings.c.channel,
+            desc("airings")
+        )
+
+        with self.get_session() as session:
+            return [dict(row) for row in session.execute(q).mappings().all()]
+
     #Bulk update table values
 
-    def update_end_time(self):
+    def archive_schedule(self, keep_weeks: int = 4) -> int:
+        """
+        Moves schedule rows from before the last `keep_weeks` whole weeks into the weekly aggregates of
+        schedule_archive, in one transaction, and returns how many rows were moved. Rows that still
+        have a file stay until cleanup has deleted it.
+        """
+        week_start = datetime.combine(date.today(), datetime.min.time())
+        week_start -= timedelta(days=week_start.weekday())
+        cutoff = week_start - timedelta(weeks=keep_weeks)
+
+        archived = (Schedule.start < cutoff, Schedule.filepath.is_(None))
+        week = func.date(Schedule.start, literal_column("'weekday 0'"), literal_column("'-6 days'")) #Monday of the ISO week
+
+        rows = select(
+            week,
+            Schedule.channel,
+            Schedule.title,
+            Episode.series_id,
+            Schedule.episode_id,
+            Schedule.movie_id,
+            func.count(),
+            func.sum(case((Schedule.rerun, 1), else_=0)),
+            func.min(Schedule.start),
+            func.max(Schedule.start)
+        ).outerjoin(
+            Episode, Schedule.episode_id == Episode.id
+        ).where(
+            *archived
+        ).group_by(
+            week,
+            Schedule.channel,
+            Schedule.title,
+            Schedule.episode_id,
+            Schedule.movie_id
+        )
+
+        q = insert(ScheduleArchive).from_select(
+            ["week", "channel", "title", "series_id", "episode_id", "movie_id", "airings", "reruns", "first_start", "last_start"],
+            rows
+        )
+        #Weeks archived in several runs merge into the same aggregate
+        q = q.on_conflict_do_update(
+            index_elements=ARCHIVE_KEY,
+            set_={
+                "airings": ScheduleArchive.airings + q.excluded.airings,
+                "reruns": ScheduleArchive.reruns + q.excluded.reruns,
+                "first_start": func.min(ScheduleArchive.first_start, q.excluded.first_start),
+                "last_start": func.max(ScheduleArchive.last_start, q.excluded.last_start),
+            }
+        )
+
         with self.get_session() as session:
-            schedules = session.execute(
-                select(Schedule)
-                .outerjoin(Episode)
-                .outerjoin(Movie)
-            ).scalars().all()
-
-            for schedule in schedules:
-                if schedule.episode:
-                    duration = schedule.episode.duration
-                elif schedule.movie:
-                    duration = schedule.movie.duration
-                else:
-                    continue
+            session.execute(q)
+            moved = session.execute(delete(Schedule).where(*archived)).rowcount
+            session.commit()
 
-                if duration:
-                    schedule.end = schedule.start + timedelta(minutes=math.ceil(duration/60))
+        self._bump_version(Schedule, ScheduleArchive)
+        return moved
 
+    def update_end_time(self) -> int:
+        """
+        Recomputes the end of the programs whose start, link or linked duration changed since the last run,
+        as start plus the duration rounded up to whole minutes. Returns how many rows were recomputed.
+        """
+        durations = select(
+            Schedule.id,
+            case(
+                (Schedule.episode_id.isnot(None), Episode.duration),
+                else_=Movie.duration
+            ).label("duration")
+        ).outerjoin(
+            Episode, Schedule.episode_id == Episode.id
+        ).outerjoin(
+            Movie, Schedule.movie_id == Movie.id
+        ).where(
+            Schedule.end_stale
+        ).subquery()
+
+        minutes = durations.c.duration / 60
+        whole_minutes = cast(minutes, Integer) + case((minutes > cast(minutes, Integer), 1), else_=0)
+        #Same text format as the datetimes SQLAlchemy writes, so range comparisons stay correct
+        end = func.strftime(
+            "%Y-%m-%d %H:%M:%S", Schedule.start, func.printf("+%d minutes", whole_minutes)
+        ).concat(func.substr(Schedule.start, 20))
+
+        q = update(
+            Schedule
+        ).values(
+            end=case((durations.c.duration > 0, end), else_=Schedule.end),
+            end_stale=False
+        ).where(
+            Schedule.id == durations.c.id
+        )
+
+        with self.get_session() as session:
+            updated = session.execute(q).rowcount
             session.commit()
 
+        if updated:
+            self._bump_version(Schedule)
+        return updated
+
     #CHANNELS
 
+    @cached_query("schedule")
     def get_channels(self):
-        q = select(Schedule.channel.distinct())
+        return self._execute(self._channels_query())
 
-        return self._execute(q)
+    @cached_query("channels")
+    def get_registered_channels(self, enabled_only=True) -> List[ChannelOutput]:
+        """Returns the channel registry in display order"""
+        return self._execute(self._registered_channels_query(enabled_only), ChannelOutput)
+
+    @staticmethod
+    def _registered_channels_query(enabled_only=True):
+        q = select(Channels).order_by(Channels.position, Channels.id)
+        if enabled_only:
+            q = q.where(Channels.enabled)
+
+        return q
+
+    @staticmethod
+    def _channels_query():
+        return select(Schedule.channel.distinct())
+
+    #PLAYOUT
+
+    def get_playout_state(self, channel: str) -> tuple[int, int] | None:
+        """Returns (first slot, discontinuity sequence) of the channel's live playlist, as last stored by any process"""
+        with self.get_session() as session:
+            state = session.get(PlayoutState, channel)
+            return (state.first_slot, state.discontinuity_sequence) if state else None
+
+    def save_playout_state(self, channel: str, first_slot: int, discontinuity_sequence: int):
+        """Stores the position of the channel's live playlist, unless another process already stored a later one"""
+        stmt = insert(PlayoutState).values(channel=channel, first_slot=first_slot, discontinuity_sequence=discontinuity_sequence)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["channel"],
+            set_={"first_slot": stmt.excluded.first_slot, "discontinuity_sequence": stmt.excluded.discontinuity_sequence},
+            where=stmt.excluded.first_slot > PlayoutState.first_slot
+        )
+
+        with self.get_session() as session:
+            session.execute(stmt)
+            session.commit()
     
     
     # UTILITY METHODS
+
+    @staticmethod
+    def _on_day(column: Column, day: date | datetime | str) -> tuple:
+        """Range predicates for a datetime column falling on a day, which unlike func.date(column) can use an index"""
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        if isinstance(day, datetime):
+            day = day.date()
+
+        start = datetime.combine(day, datetime.min.time())
+        return column >= start, column < start + timedelta(days=1)
     
     @staticmethod
     def _to_dict(obj) -> Dict:
@@ -1,20 +1,28 @@
 try: 
     from .tvcore.tvdownloader import TVDownloader
     from .tvcore.metadatafetcher import MetaDataFetcher
-    from .tvcore.tvdatabase import TVDatabase, Episode, Schedule
+    from .tvcore.tvdatabase import TVDatabase, Episode, Movie, Schedule
+    from .tvcore.mediaindex import MediaIndex
     from .tvcore.filehandler import TVFileHandler
+    from .tvcore.reconciler import ScheduleReconciler
     from .tvcore.mediapathmanager import MediaPathManager
-    from .tvcore.nrkmanager import NRKManager, check_for_duplicate_titles
+    from .tvcore.nrkmanager import check_for_reruns
+    from .tvcore.epgsources import ingest_all
     from .tvcore.helper import get_iso_week_span_target_year, get_iso_week_number
+    from .tvcore.schemas import TVConfig
     from .tvcore.tvconstants import *
 except ImportError:
     from tvcore.tvdownloader import TVDownloader
     from tvcore.metadatafetcher import MetaDataFetcher
-    from tvcore.tvdatabase import TVDatabase, Episode, Schedule
+    from tvcore.tvdatabase import TVDatabase, Episode, Movie, Schedule
+    from tvcore.mediaindex import MediaIndex
     from tvcore.filehandler import TVFileHandler
+    from tvcore.reconciler import ScheduleReconciler
     from tvcore.mediapathmanager import MediaPathManager
-    from tvcore.nrkmanager import NRKManager, check_for_duplicate_titles
+    from tvcore.nrkmanager import check_for_reruns
+    from tvcore.epgsources import ingest_all
     from tvcore.helper import get_iso_week_span_target_year, get_iso_week_number
+    from tvcore.schemas import TVConfig
     from tvcore.tvconstants import *
 
 from datetime import datetime, date, timedelta
@@ -46,7 +54,9 @@ class TVPreparer():
         self.database = TVDatabase()
         self.downloader = TVDownloader()
         self.handler = TVFileHandler()
+        self.reconciler = ScheduleReconciler(self.database, self.paths)
         self.metadata = MetaDataFetcher()
+        self.config = TVConfig.from_file()
 
     def cleanup_obsolete_episodes(self):
         obsolete_programs = self.database.get_obsolete_programs()
@@ -55,46 +65,25 @@ class TVPreparer():
             logging.info("No programs to delete")
             return
         
-        for entry in obsolete_programs:
-            #TODO: Implement deletion of metadata
-            try:
-                media_path = self.paths.get_full_path(entry.filepath)
-                self.handler.delete_media(entry.id, media_path)
-                logging.info("Deletion successful: %s", entry.filepath)
-            
-            except Exception as e:
-                logging.error("Error deleting %s: %s", entry.filepath, e)
+        #TODO: Implement deletion of metadata
+        report = self.reconciler.cleanup(obsolete_programs)
+        logging.info("Cleanup: %s", report)
 
-    def fetch_nrk_data(self, buffer_weeks=4):
+    def archive_schedule(self, keep_weeks=4):
+        moved = self.database.archive_schedule(keep_weeks)
+        logging.info("Archived %s schedule entries", moved)
+
+    def fetch_epg_data(self, buffer_weeks=4, offline=False):
+        """Fetches the EPG of every registered channel, all sources in parallel, and stores it"""
         week_number = get_iso_week_number(date.today())
         start_date, end_date = get_iso_week_span_target_year(week_number, week_number + buffer_weeks, 2001)
         
-        nrk1 = NRKManager("nrk1")
-        nrk2 = NRKManager("nrk2")
-
-        nrk1_programs = []
-        nrk2_programs = []
-        current_date = start_date
-        while current_date <= end_date:
-            try:
-                nrk1_programs += nrk1.fetch_programs_by_date(current_date)
-            except Exception as e:
-                logging.error("Failed to fetch NRK1 programs for %s: %s", current_date, e)
-            sleep(1)
-
-            try:
-                nrk2_programs += nrk2.fetch_programs_by_date(current_date)
-            except Exception as e:
-                logging.error("Failed to fetch NRK2 programs for %s: %s", current_date, e)
-            sleep(1)
-            
-            current_date += timedelta(days=1)
+        dates = [start_date + timedelta(days=day) for day in range((end_date - start_date).days + 1)]
+        epg_config = self.config.epg.model_copy(update={"offline": offline or self.config.epg.offline})
+        programs = ingest_all(self.database.get_registered_channels(), dates, epg_config)
 
-        nrk1.insert_programs(nrk1_programs)
-        nrk2.insert_programs(nrk2_programs)
-
-        duplicates = check_for_duplicate_titles(nrk1_programs + nrk2_programs)
-        logging.info("Duplicates between %s and %s:", start_date, end_date)
+        duplicates = check_for_reruns([program for channel_programs in programs.values() for program in channel_programs])
+        logging.info("Reruns between %s and %s:", start_date, end_date)
         for original, rerun in duplicates:
             logging.info("%s: %s %s -> %s %s", original.title, original.channel, original.start, rerun.channel, rerun.start)
 
@@ -196,48 +185,75 @@ class TVPreparer():
             sleep(10)
 
     def verify_scheduled_programs(self, buffer_days=3):
+        report = self.reconciler.verify(days=buffer_days)
+
+        if not report.checked:
+            logging.info("No programs to verify")
+            return
+
+        #TODO Check file integrity series_dl._check_file_integrity()
+
+        logging.info("Verified schedule: %s", report)
+        if report.missing:
+            logging.warning("Files missing for schedule entries: %s", report.missing)
+
+    def index_scheduled_programs(self, buffer_days=3):
+        """
+        Builds the keyframe/duration index of available programs that don't have one, and stores
+        the probed duration on the episode or movie so computed end times match the actual files.
+        """
         now = date.today()
+        episode_durations = {}
+        movie_durations = {}
 
-        scheduled_programs = [
-            entry
-            for day in range(buffer_days)
-            for entry in self.database.get_schedule(date=now + timedelta(days=day))
-        ]
+        for day in range(buffer_days):
+            for entry in self.database.get_schedule(date=now + timedelta(days=day)):
+                if entry.status != STATUS_AVAILABLE or not entry.filepath:
+                    continue
 
-        if not scheduled_programs:
-            logging.info("No programs to verify")
+                media_path = self.paths.get_full_path(entry.filepath)
+                if MediaIndex.sidecar_path(media_path).exists() or not media_path.exists():
+                    continue
 
-        for entry in scheduled_programs:
-            file_path = None
-            if entry.filepath:
-                file_path = self.paths.get_full_path(entry.filepath)
+                index = self.handler.build_media_index(media_path)
+                if index is None:
+                    continue
 
-            elif entry.episode_id: 
-                filename = self.paths.create_episode_file_name(
-                    entry.episode.series.id,
-                    entry.episode.id
-                )
-                file_path = self.paths.get_filepath(TYPE_SERIES, entry.episode.series.slug, filename)
-                        
-            elif entry.movie_id: 
-                filename = self.paths.create_movie_file_name(entry.movie.slug)
-                file_path = self.paths.get_filepath(TYPE_MOVIES, entry.movie.slug, filename)
+                logging.info("Indexed %s: %.0f s, %d keyframes", entry.filepath, index.duration, len(index.keyframes))
 
-            try:
-                file_status = self.handler.verify_local_file(entry.id, file_path)
-            except Exception as e:
-                logging.error("Error veryifing file %s: %s", file_path, e)
+                if entry.episode_id and entry.episode.duration != index.duration:
+                    episode_durations[entry.episode_id] = index.duration
+                elif entry.movie_id and entry.movie.duration != index.duration:
+                    movie_durations[entry.movie_id] = index.duration
 
+        self.database.update_many(Episode, [{"id": id, "duration": duration} for id, duration in episode_durations.items()])
+        self.database.update_many(Movie, [{"id": id, "duration": duration} for id, duration in movie_durations.items()])
 
-            #TODO Check file integrity series_dl._check_file_integrity()
+        if episode_durations or movie_durations:
+            self.database.update_end_time()
 
-            if file_status == STATUS_AVAILABLE:
-                logging.info("File found: %s", file_path)
-            else:
-                logging.warning("File missing: %s", file_path)
+    def segment_scheduled_programs(self, buffer_days=3):
+        """Segments the test card and available programs for HLS playout, skipping files already segmented"""
+        now = date.today()
+        segment_seconds = self.config.streaming.hls_segment_seconds
 
+        targets = {self.paths.get_filler_path(): self.paths.get_filler_hls_dir()}
+        for day in range(buffer_days):
+            for entry in self.database.get_schedule(date=now + timedelta(days=day)):
+                if entry.status == STATUS_AVAILABLE and entry.filepath:
+                    media_path = self.paths.get_full_path(entry.filepath)
+                    targets[media_path] = self.paths.get_hls_dir(media_path)
 
-            self.handler.update_file_info(entry.id, file_path)
+        for media_path, hls_dir in targets.items():
+            if (hls_dir / "index.m3u8").exists():
+                continue
+
+            if not media_path.exists():
+                logging.warning("Cannot segment missing file: %s", media_path)
+                continue
+
+            if self.handler.segment_hls(media_path, hls_dir, segment_seconds):
+                logging.info("Segmented %s", media_path)
 
 def _status_helper(status, level, succes, failure, file_path):
     #Depleted?
@@ -258,8 +274,11 @@ if __name__ == "__main__":
         if operation == "delete":
             prep.cleanup_obsolete_episodes()
 
+        elif operation == "archive":
+            prep.archive_schedule()
+
         elif operation == "fetch":
-            prep.fetch_nrk_data()
+            prep.fetch_epg_data(offline="--offline" in sys.argv)
         
         elif operation == "metadata":
             prep.enrich_metadata()
@@ -270,13 +289,22 @@ if __name__ == "__main__":
         elif operation == "verify":
             prep.verify_scheduled_programs()
 
+        elif operation == "index":
+            prep.index_scheduled_programs()
+
+        elif operation == "segment":
+            prep.segment_scheduled_programs()
+
         elif operation == "daily":
             prep.cleanup_obsolete_episodes()
+            prep.archive_schedule()
             prep.download_weekly_schedule()
             prep.verify_scheduled_programs()
+            prep.index_scheduled_programs()
+            prep.segment_scheduled_programs()
 
         elif operation == "weekly":
-            prep.fetch_nrk_data()
+            prep.fetch_epg_data()
             prep.enrich_metadata()
 
         else: